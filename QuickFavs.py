@@ -1,63 +1,1534 @@
 import sys
+import argparse
 import json
 import os
-import webbrowser
+import time
+
+# Taken before the Qt imports so --profile-startup can report their cost.
+PROCESS_STARTED = time.perf_counter()
+
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from favorites_ipc import (
+    IPC_COMMANDS, InstanceLock, decode_message, encode_message, forward_command_line, instance_running,
+    server_address
+)
+
+if __name__ == '__main__':
+    # A command for an instance that is already running is sent before
+    # paying for the Qt imports below. A startup measurement is not: it
+    # would measure nothing, so it fails while another instance runs.
+    # Only the process holding the instance lock goes on to start the GUI;
+    # it keeps the lock until it exits.
+    instance_lock = InstanceLock()
+    if any(arg.split("=")[0] in ("--startup-budget-ms", "--profile-startup") for arg in sys.argv[1:]):
+        if not instance_lock.acquire():
+            print("QuickFavs is already running here; quit it to measure startup.", file=sys.stderr)
+            sys.exit(1)
+    else:
+        forwarded_status = forward_command_line(sys.argv[1:], lock=instance_lock)
+        if forwarded_status is not None:
+            sys.exit(forwarded_status)
 
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-    QLineEdit, QLabel, QFileDialog, QListWidget, QListWidgetItem,
+    QLineEdit, QLabel, QFileDialog, QListView,
     QMessageBox, QComboBox, QSystemTrayIcon, QMenu, QCheckBox,
-    QInputDialog
+    QInputDialog, QFileIconProvider, QDialog, QDialogButtonBox, QTableWidget, QTableWidgetItem,
+    QHeaderView
 )
-from PyQt6.QtGui import QIcon, QAction, QKeySequence
-from PyQt6.QtCore import Qt, QUrl, QMimeData
-
-FAVORITES_FILE = 'favorites.json'
-SETTINGS_FILE = 'settings.json'
-
-def load_settings():
-    if not os.path.exists(SETTINGS_FILE):
-        return {"start_on_boot": False, "start_in_tray": False}
-    try:
-        with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-            settings = json.load(f)
-            settings.setdefault("start_on_boot", False)
-            settings.setdefault("start_in_tray", False)
-            return settings
-    except json.JSONDecodeError:
-        print(f"Warning: Could not decode {SETTINGS_FILE}. Returning default settings.")
-        return {"start_on_boot": False, "start_in_tray": False}
-    except Exception as e:
-        print(f"Error loading settings: {e}. Returning default settings.")
-        return {"start_on_boot": False, "start_in_tray": False}
-
-def save_settings(settings):
-    try:
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(settings, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving settings: {e}")
+from PyQt6.QtGui import QIcon, QAction, QKeySequence, QColor, QImage, QPixmap
+from PyQt6.QtCore import (
+    Qt, QUrl, QMimeData, QAbstractListModel, QAbstractProxyModel, QModelIndex,
+    QObject, QRunnable, QThreadPool, QTimer, QFileSystemWatcher, QFileInfo, QBuffer, QByteArray,
+    QIODevice, pyqtSignal
+)
+from PyQt6.QtNetwork import QLocalServer
+
+from favorites_browse import DirectoryCache, directory_mtime, list_directory
+from favorites_core import (
+    FAVORITES_FILE, ICON_CACHE_DIR, LINK_CACHE_FILE, FavoritesCore, favorite_from_request, format_favorite, guess_type, save_settings
+)
+from favorites_facets import facet_term, parse_query
+from favorites_health import HEALTH_FOLDER, PathHealth, is_local
+from favorites_icons import HttpFaviconFetcher, IconDiskCache, LruCache, favicon_site, icon_key
+from favorites_links import LinkCache, LinkChecker
+from favorites_trace import HISTOGRAM_BOUNDS_MS, TRACE_SAMPLES, span, tracer
+
+SEARCH_DEBOUNCE_MS = 80
+SEARCH_CHUNK_SIZE = 500
+FRAME_BUDGET_MS = 1000 / 60
+LAUNCH_STATS_SAVE_DELAY_MS = 2000
+SEARCH_PUSHDOWN_MIN_FAVORITES = 20000
+TRAY_PAGE_SIZE = 50
+BATCH_OPEN_CONFIRM = 10
+HEALTH_RESCAN_DELAY_MS = 300
+HEALTH_MAX_WATCHED_DIRS = 4096
+MISSING_COLOR = "#FF6347"
+STARTUP_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 200
+ICON_SIZE = 32
+ICON_MEMORY_BYTES = 4 * 1024 * 1024
+ICON_WORKERS = 4
+DIAGNOSTICS_REFRESH_MS = 1000
+BROWSE_WORKERS = 2
+BROWSE_MAX_WATCHED_DIRS = 64
+BROWSE_RESCAN_DELAY_MS = 500
+LINK_REFRESH_MS = 250
+EXTERNAL_CHANGE_DELAY_MS = 300
+IMPORT_FILE_FILTER = "Bookmarks (*.html *.htm *.json *.csv);;All Files (*)"
+EXPORT_FILE_FILTERS = {
+    "Bookmarks HTML (*.html)": ".html",
+    "Bookmarks JSON (*.json)": ".json",
+    "CSV (*.csv)": ".csv",
+}
+
+class StartupProfiler:
+    # Wall-clock marks for each startup phase, relative to process start.
+
+    def __init__(self, started=PROCESS_STARTED):
+        self.started = started
+        self.last = started
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000, (now - self.started) * 1000))
+        self.last = now
+
+    def elapsed_ms(self, phase):
+        for name, _, total_ms in self.phases:
+            if name == phase:
+                return total_ms
+        return None
+
+    def report(self):
+        print("Startup profile (ms):")
+        print(f"  {'phase':<16}{'took':>10}{'total':>10}")
+        for name, took_ms, total_ms in self.phases:
+            print(f"  {name:<16}{took_ms:>10.1f}{total_ms:>10.1f}")
+
+
+class FavoritesModel(QAbstractListModel):
+    # A view of the core's favorites list. Rows are formatted on demand in
+    # data(), so only the rows the view actually paints cost anything.
+    # Mutations go through the model so the core (list, index, storage) and
+    # the views see the same fine-grained row changes. Favorites whose path
+    # the health monitor found missing, and links the link monitor found
+    # broken, are shown in red. Icons come from the icon loader, which is
+    # asked only for the rows being painted; icons that arrive later are
+    # announced with one dataChanged per event loop pass.
+
+    def __init__(self, core, health=None, icons=None, links=None, parent=None):
+        super().__init__(parent)
+        self.core = core
+        self.health = health
+        self.icons = icons
+        self.links = links
+        self.icon_refresh_timer = QTimer(self)
+        self.icon_refresh_timer.setSingleShot(True)
+        self.icon_refresh_timer.setInterval(0)
+        self.icon_refresh_timer.timeout.connect(self._refresh_icons)
+        if icons is not None:
+            icons.icon_ready.connect(self.icon_refresh_timer.start)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.core.favorites)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        item_data = self.core.favorites[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return format_favorite(item_data)
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.icons.icon_for(item_data) if self.icons is not None else None
+        missing = self.health is not None and is_local(item_data) and self.health.is_missing(item_data['path'])
+        link = self.links.status(item_data) if self.links is not None else None
+        broken = link is not None and link.broken
+        if role == Qt.ItemDataRole.ToolTipRole:
+            if missing:
+                return f"Not found: {item_data['path']}"
+            if broken:
+                return f"Link broken ({link.describe()}): {item_data['path']}"
+            return item_data['path']
+        if role == Qt.ItemDataRole.ForegroundRole and (missing or broken):
+            return QColor(MISSING_COLOR)
+        return None
+
+    def refresh_rows(self, rows):
+        # Only the red colour and tooltip change; the text searched is the same.
+        for row in rows:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.ForegroundRole, Qt.ItemDataRole.ToolTipRole])
+
+    def _refresh_icons(self):
+        if self.core.favorites:
+            self.dataChanged.emit(self.index(0), self.index(len(self.core.favorites) - 1),
+                                  [Qt.ItemDataRole.DecorationRole])
+
+    # The mutators return the records the core made of the given items.
+    def append_favorite(self, item_data):
+        return self.append_favorites([item_data])[0]
+
+    def append_favorites(self, items):
+        if not items:
+            return []
+        first = len(self.core.favorites)
+        self.beginInsertRows(QModelIndex(), first, first + len(items) - 1)
+        records = self.core.add_many(items)
+        self.endInsertRows()
+        return records
+
+    def extend_favorites(self, items):
+        # Already stored favorites, so nothing is queued for saving.
+        if not items:
+            return []
+        first = len(self.core.favorites)
+        self.beginInsertRows(QModelIndex(), first, first + len(items) - 1)
+        records = self.core.extend(items)
+        self.endInsertRows()
+        return records
+
+    def update_favorite(self, record_id, item_data):
+        row, record = self.core.update(record_id, item_data)
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        return record
+
+    def remove_favorite(self, record_id):
+        row = self.core.favorites.row_of(record_id)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        record = self.core.remove(record_id)
+        self.endRemoveRows()
+        return record
+
+    def remove_favorites(self, record_ids):
+        # One block of rows is removed as such; rows spread over the list
+        # take one reset rather than a removal each, which the filter proxy
+        # would answer by walking all its rows every time.
+        if not record_ids:
+            return
+        rows = sorted(self.core.favorites.row_of(record_id) for record_id in record_ids)
+        if rows[-1] - rows[0] + 1 == len(rows):
+            self.beginRemoveRows(QModelIndex(), rows[0], rows[-1])
+            self.core.remove_many(record_ids)
+            self.endRemoveRows()
+        else:
+            self.beginResetModel()
+            self.core.remove_many(record_ids)
+            self.endResetModel()
+
+    def reorder_favorites(self, record_ids):
+        self.beginResetModel()
+        self.core.reorder(record_ids)
+        self.endResetModel()
+
+
+class FavoritesFilterProxy(QAbstractProxyModel):
+    # Keeps the list of source rows matching the search text. A new query
+    # asks the search index for the rows; source inserts, removals and edits
+    # only touch the affected rows instead of refiltering everything. Rows
+    # are in list order, or in rank order when fuzzy results are shown.
+
+    def __init__(self, search_index, parent=None):
+        super().__init__(parent)
+        self.search_index = search_index
+        self.filter_text = ""
+        self.fuzzy = False
+        self._rows = []
+        self._row_of = None
+
+    def setSourceModel(self, source_model):
+        self.beginResetModel()
+        super().setSourceModel(source_model)
+        source_model.modelAboutToBeReset.connect(self.beginResetModel)
+        source_model.modelReset.connect(self._on_model_reset)
+        source_model.rowsInserted.connect(self._on_rows_inserted)
+        source_model.rowsAboutToBeRemoved.connect(self._on_rows_about_to_be_removed)
+        source_model.rowsRemoved.connect(self._on_rows_removed)
+        source_model.dataChanged.connect(self._on_data_changed)
+        self._set_rows(self._search(self.filter_text))
+        self.endResetModel()
+
+    @property
+    def filtered_indices(self):
+        return list(self._rows)
+
+    def source_row(self, proxy_row):
+        if 0 <= proxy_row < len(self._rows):
+            return self._rows[proxy_row]
+        return -1
+
+    def proxy_row(self, source_row):
+        if self._row_of is None:
+            self._row_of = {row: i for i, row in enumerate(self._rows)}
+        return self._row_of.get(source_row, -1)
+
+    def set_filter_text(self, text, fuzzy=None):
+        with span("list.refresh"):
+            self.beginResetModel()
+            self.filter_text = text
+            if fuzzy is not None:
+                self.fuzzy = fuzzy
+            self._set_rows(self._search(text))
+            self.endResetModel()
+
+    def begin_results(self, text, fuzzy, rows):
+        with span("list.refresh"):
+            self.beginResetModel()
+            self.filter_text = text
+            self.fuzzy = fuzzy
+            self._set_rows(list(rows))
+            self.endResetModel()
+
+    def append_results(self, rows):
+        if not rows:
+            return
+        with span("list.append"):
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self._row_of = None
+            self.endInsertRows()
+
+    def _search(self, text):
+        if self.fuzzy:
+            return self.search_index.fuzzy_search(text)
+        return self.search_index.search(text)
+
+    def _set_rows(self, rows):
+        self._rows = rows
+        self._row_of = None
+
+    def _matches(self, source_row):
+        return self.search_index.matches(source_row, self.filter_text, self.fuzzy)
+
+    def _insert_position(self, source_row):
+        # Ranked results have no natural slot for a new row, so it goes last.
+        if self.fuzzy and self.filter_text.strip():
+            return len(self._rows)
+        return bisect_left(self._rows, source_row)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def index(self, row, column=0, parent=QModelIndex()):
+        if parent.isValid() or column != 0 or not 0 <= row < len(self._rows):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid() or self.sourceModel() is None:
+            return QModelIndex()
+        return self.sourceModel().index(self._rows[proxy_index.row()], 0)
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        i = self.proxy_row(source_index.row())
+        return self.index(i, 0) if i >= 0 else QModelIndex()
+
+    def _on_model_reset(self):
+        self._set_rows(self._search(self.filter_text))
+        self.endResetModel()
+
+    def _on_rows_inserted(self, parent, first, last):
+        count = last - first + 1
+        if first == self.sourceModel().rowCount() - count:
+            # Rows appended at the end never shift existing rows, and their
+            # matches always belong at the end, so insert them as one block.
+            self.append_results([row for row in range(first, last + 1) if self._matches(row)])
+            return
+        self._set_rows([row + count if row >= first else row for row in self._rows])
+        for source_row in range(first, last + 1):
+            if self._matches(source_row):
+                i = self._insert_position(source_row)
+                self.beginInsertRows(QModelIndex(), i, i)
+                self._rows.insert(i, source_row)
+                self._row_of = None
+                self.endInsertRows()
+
+    def _on_rows_about_to_be_removed(self, parent, first, last):
+        doomed = [i for i, row in enumerate(self._rows) if first <= row <= last]
+        for i in reversed(doomed):
+            self.beginRemoveRows(QModelIndex(), i, i)
+            del self._rows[i]
+            self._row_of = None
+            self.endRemoveRows()
+
+    def _on_rows_removed(self, parent, first, last):
+        count = last - first + 1
+        self._set_rows([row - count if row > last else row for row in self._rows])
+
+    def _on_data_changed(self, top_left, bottom_right, roles=()):
+        if roles and Qt.ItemDataRole.DisplayRole not in roles:
+            # Nothing the filter looks at changed.
+            if self._rows:
+                self.dataChanged.emit(self.index(0, 0), self.index(len(self._rows) - 1, 0), roles)
+            return
+        for source_row in range(top_left.row(), bottom_right.row() + 1):
+            i = self.proxy_row(source_row)
+            if self._matches(source_row):
+                if i >= 0:
+                    index = self.index(i, 0)
+                    self.dataChanged.emit(index, index)
+                else:
+                    i = self._insert_position(source_row)
+                    self.beginInsertRows(QModelIndex(), i, i)
+                    self._rows.insert(i, source_row)
+                    self._row_of = None
+                    self.endInsertRows()
+            elif i >= 0:
+                self.beginRemoveRows(QModelIndex(), i, i)
+                del self._rows[i]
+                self._row_of = None
+                self.endRemoveRows()
+
+
+class SearchSignals(QObject):
+    chunk_ready = pyqtSignal(int, str, bool, list, bool)
+    finished = pyqtSignal(int, float)
+
+
+class SearchTask(QRunnable):
+    def __init__(self, pipeline, generation, text, fuzzy):
+        super().__init__()
+        self.pipeline = pipeline
+        self.generation = generation
+        self.text = text
+        self.fuzzy = fuzzy
+
+    def run(self):
+        started = time.perf_counter()
+        if self.fuzzy:
+            rows = self.pipeline.search_index.fuzzy_search(self.text)
+        elif self.pipeline.pushdown and not parse_query(self.text).has_facets:
+            rows = self.pipeline.save_queue.storage.search(self.text)
+        else:
+            rows = self.pipeline.search_index.search(self.text)
+        signals = self.pipeline.signals
+        for start in range(0, max(len(rows), 1), SEARCH_CHUNK_SIZE):
+            if self.generation != self.pipeline.generation:
+                return
+            signals.chunk_ready.emit(self.generation, self.text, self.fuzzy,
+                                     rows[start:start + SEARCH_CHUNK_SIZE], start == 0)
+        signals.finished.emit(self.generation, (time.perf_counter() - started) * 1000)
+
+
+class SearchPipeline(QObject):
+    # Debounces search input, runs the index lookup on a worker thread and
+    # streams the matching rows into the proxy in chunks. Every dispatched
+    # query gets a generation number; chunks from older generations are
+    # dropped, so a slow query can never overwrite a newer one.
+    results_applied = pyqtSignal()
+
+    def __init__(self, search_index, list_model, fuzzy=False, save_queue=None, parent=None):
+        super().__init__(parent)
+        self.search_index = search_index
+        self.list_model = list_model
+        self.fuzzy = fuzzy
+        self.save_queue = save_queue
+        self.generation = 0
+        self.pending_text = ""
+        self.in_flight = False
+        self.requested_at = 0.0
+        self.stats = {
+            "last_search_ms": 0.0,
+            "last_first_chunk_ms": 0.0,
+            "last_complete_ms": 0.0,
+            "last_ui_block_ms": 0.0,
+            "max_ui_block_ms": 0.0,
+            "frames_over_budget": 0,
+            "dropped_chunks": 0,
+        }
+
+        self.signals = SearchSignals(self)
+        self.signals.chunk_ready.connect(self._on_chunk_ready)
+        self.signals.finished.connect(self._on_finished)
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self._dispatch)
+
+        source_model = list_model.sourceModel()
+        source_model.rowsInserted.connect(self._on_source_changed)
+        source_model.rowsRemoved.connect(self._on_source_changed)
+        source_model.dataChanged.connect(self._on_source_data_changed)
+        source_model.modelReset.connect(self._on_source_changed)
+
+    @property
+    def pushdown(self):
+        # Large collections on a backend with its own full-text index are
+        # searched there instead of in the in-memory trigram index, as long
+        # as no queued write leaves the backend behind memory.
+        return (self.save_queue is not None and self.save_queue.storage.supports_search
+                and len(self.search_index) >= SEARCH_PUSHDOWN_MIN_FAVORITES
+                and not self.save_queue.has_pending())
+
+    def request(self, text):
+        self.pending_text = text
+        self.requested_at = time.perf_counter()
+        self.debounce_timer.start()
+
+    def set_fuzzy(self, fuzzy):
+        self.fuzzy = fuzzy
+        self.requested_at = time.perf_counter()
+        self.debounce_timer.stop()
+        self._dispatch()
+
+    def latency(self):
+        return dict(self.stats)
+
+    def shutdown(self):
+        self.debounce_timer.stop()
+        self.generation += 1
+        self.thread_pool.clear()
+        self.thread_pool.waitForDone()
+
+    def _dispatch(self):
+        self.generation += 1
+        self.in_flight = True
+        self.thread_pool.clear()
+        self.thread_pool.start(SearchTask(self, self.generation, self.pending_text, self.fuzzy))
+
+    def _on_source_changed(self, *args):
+        # Rows streamed by an in-flight search were computed before this
+        # edit; restart it so stale positions never reach the proxy.
+        if self.in_flight:
+            self._dispatch()
+
+    def _on_source_data_changed(self, top_left, bottom_right, roles=()):
+        # Icons, health and link status do not move or change any match, so
+        # a stream of them cannot keep a long search from finishing.
+        if roles and Qt.ItemDataRole.DisplayRole not in roles:
+            return
+        self._on_source_changed()
+
+    def _on_chunk_ready(self, generation, text, fuzzy, rows, is_first):
+        if generation != self.generation:
+            self.stats["dropped_chunks"] += 1
+            return
+        started = time.perf_counter()
+        if is_first:
+            self.list_model.begin_results(text, fuzzy, rows)
+            self.stats["last_first_chunk_ms"] = (started - self.requested_at) * 1000
+        else:
+            self.list_model.append_results(rows)
+        self.results_applied.emit()
+        blocked = (time.perf_counter() - started) * 1000
+        self.stats["last_ui_block_ms"] = blocked
+        self.stats["max_ui_block_ms"] = max(self.stats["max_ui_block_ms"], blocked)
+        if blocked > FRAME_BUDGET_MS:
+            self.stats["frames_over_budget"] += 1
+
+    def _on_finished(self, generation, search_ms):
+        if generation != self.generation:
+            return
+        self.in_flight = False
+        self.stats["last_search_ms"] = search_ms
+        self.stats["last_complete_ms"] = (time.perf_counter() - self.requested_at) * 1000
+
+
+class FacetBox(QComboBox):
+    # Lists every type and tag with the number of favorites that have it;
+    # picking one asks for its query term (e.g. tag:work) to be searched.
+    # The entries are rebuilt whenever the list opens, so the counts are
+    # always current without following every edit.
+    facet_chosen = pyqtSignal(str)
+
+    def __init__(self, search_index, parent=None):
+        super().__init__(parent)
+        self.search_index = search_index
+        self.setToolTip("Narrow the search to a type or tag")
+        self.addItem("Filter")
+        self.activated.connect(self._on_activated)
+
+    def showPopup(self):
+        self.clear()
+        self.addItem("Filter")
+        for field in ("type", "tag"):
+            counts = self.search_index.facet_counts(field)
+            if counts:
+                self.insertSeparator(self.count())
+            for name, count in counts:
+                self.addItem(f"{field}: {name} ({count})", facet_term(field, name))
+        super().showPopup()
+
+    def _on_activated(self, index):
+        term = self.itemData(index)
+        self.setCurrentIndex(0)
+        if term:
+            self.facet_chosen.emit(term)
+
+
+def tray_groups(item_data):
+    groups = [("type", item_data['type'])]
+    tags = item_data.get('tags')
+    if tags:
+        groups.extend(("tag", tag) for tag in dict.fromkeys(tags))
+    else:
+        groups.append(("tag", None))
+    return groups
+
+
+def in_tray_group(item_data, group):
+    kind, name = group
+    if kind == "type":
+        return item_data['type'] == name
+    if name is None:
+        return not item_data.get('tags')
+    return name in item_data.get('tags', [])
+
+
+class TrayMenuController(QObject):
+    # The tray menu is a fixed root with "By Type" and "By Tag" submenus.
+    # Group listings are built when those submenus open and each group's
+    # favorites only when it is hovered, in pages of TRAY_PAGE_SIZE. Edits
+    # patch counts and already-built actions in place, so opening the tray
+    # costs the same no matter how many favorites there are.
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.menu = QMenu()
+        self.type_menu = self.menu.addMenu("📂 By Type")
+        self.type_menu.aboutToShow.connect(lambda: self._populate_listing("type"))
+        self.tag_menu = self.menu.addMenu("🏷️ By Tag")
+        self.tag_menu.aboutToShow.connect(lambda: self._populate_listing("tag"))
+
+        self.menu.addSeparator()
+
+        restore_action = QAction("🔄 Restore", self.menu)
+        restore_action.triggered.connect(app.showNormal)
+        self.menu.addAction(restore_action)
+
+        self.menu.addSeparator()
+
+        exit_action = QAction("❌ Exit", self.menu)
+        exit_action.triggered.connect(QApplication.quit)
+        self.menu.addAction(exit_action)
+
+        self.counts = Counter()
+        self.group_menus = {}
+        self.group_actions = {}
+        self.built_groups = set()
+        self.dirty_listings = {"type", "tag"}
+
+    def reset(self, favorites):
+        self.counts = Counter(group for item_data in favorites for group in tray_groups(item_data))
+        for menu in self.group_menus.values():
+            menu.deleteLater()
+        self.group_menus = {}
+        self.group_actions = {}
+        self.built_groups = set()
+        self.dirty_listings = {"type", "tag"}
+
+    def items_added(self, items):
+        # Bulk additions only touch counts; affected groups rebuild when opened.
+        added = Counter(group for item_data in items for group in tray_groups(item_data))
+        self.counts.update(added)
+        for group in added:
+            self._invalidate_group(group)
+            if group in self.group_menus:
+                self.group_menus[group].setTitle(self._group_title(group))
+        self.dirty_listings = {"type", "tag"}
+
+    def item_added(self, item_data):
+        for group in tray_groups(item_data):
+            self._add_to_group(group, item_data)
+
+    def item_removed(self, item_data):
+        for group in tray_groups(item_data):
+            self._remove_from_group(group, item_data)
+
+    def item_updated(self, old_item, new_item):
+        old_groups = tray_groups(old_item)
+        new_groups = tray_groups(new_item)
+        for group in old_groups:
+            if group not in new_groups:
+                self._remove_from_group(group, old_item)
+        for group in new_groups:
+            if group not in old_groups:
+                self._add_to_group(group, new_item)
+                continue
+            actions = self.group_actions.get(group)
+            if actions is not None:
+                old_action = actions.pop(id(old_item))
+                new_action = self._favorite_action(self.group_menus[group], new_item)
+                self.group_menus[group].insertAction(old_action, new_action)
+                self.group_menus[group].removeAction(old_action)
+                delete_action(old_action)
+                actions[id(new_item)] = new_action
+            else:
+                self._invalidate_group(group)
+
+    def _add_to_group(self, group, item_data):
+        self._change_count(group, 1)
+        actions = self.group_actions.get(group)
+        if actions is not None and len(actions) < TRAY_PAGE_SIZE:
+            menu = self.group_menus[group]
+            actions[id(item_data)] = self._favorite_action(menu, item_data)
+            menu.addAction(actions[id(item_data)])
+        else:
+            self._invalidate_group(group)
+
+    def _remove_from_group(self, group, item_data):
+        self._change_count(group, -1)
+        actions = self.group_actions.get(group)
+        if actions is not None:
+            action = actions.pop(id(item_data), None)
+            if action is not None:
+                self.group_menus[group].removeAction(action)
+                delete_action(action)
+        else:
+            self._invalidate_group(group)
+
+    def _change_count(self, group, delta):
+        self.counts[group] += delta
+        count = self.counts[group]
+        if count <= 0:
+            del self.counts[group]
+            menu = self.group_menus.pop(group, None)
+            if menu is not None:
+                menu.deleteLater()
+            self.group_actions.pop(group, None)
+            self.built_groups.discard(group)
+            self.dirty_listings.add(group[0])
+        elif count == delta:
+            self.dirty_listings.add(group[0])
+        elif group in self.group_menus:
+            self.group_menus[group].setTitle(self._group_title(group))
+
+    def _invalidate_group(self, group):
+        self.built_groups.discard(group)
+        self.group_actions.pop(group, None)
+
+    def _group_title(self, group):
+        name = group[1] if group[1] is not None else "(untagged)"
+        return f"{name} ({self.counts[group]})"
+
+    def _populate_listing(self, kind):
+        if kind not in self.dirty_listings:
+            return
+        with span("tray.listing"):
+            self._build_listing(kind)
+
+    def _build_listing(self, kind):
+        self.dirty_listings.discard(kind)
+        listing = self.type_menu if kind == "type" else self.tag_menu
+        listing.clear()
+        groups = sorted((group for group in self.counts if group[0] == kind),
+                        key=lambda group: (group[1] is None, (group[1] or "").lower()))
+        if not groups:
+            listing.addAction("(empty)").setEnabled(False)
+        for group in groups:
+            menu = self.group_menus.get(group)
+            if menu is None:
+                menu = QMenu(self._group_title(group), self.menu)
+                menu.aboutToShow.connect(lambda g=group: self._populate_group(g))
+                self.group_menus[group] = menu
+            listing.addMenu(menu)
+
+    def _populate_group(self, group):
+        if group in self.built_groups:
+            return
+        with span("tray.group"):
+            self._build_group(group)
+
+    def _build_group(self, group):
+        # The group's favorites come from the index's facet postings, which
+        # ignore case; the group is only the spelling it is named by.
+        menu = self.group_menus[group]
+        clear_menu(menu)
+        kind, name = group
+        favorites = self.app.favorites
+        rows = self.app.search_index.facet_positions(kind, name.casefold() if name is not None else None)
+        items = [item_data for item_data in favorites.records_at(rows) if in_tray_group(item_data, group)]
+        if group[0] == "tag" and group[1] is not None:
+            open_all_action = QAction("▶ Open All", menu)
+            open_all_action.triggered.connect(lambda checked, tag=group[1]: self.app.open_tagged_favorites(tag))
+            menu.addAction(open_all_action)
+            menu.addSeparator()
+        if len(items) <= TRAY_PAGE_SIZE:
+            self.group_actions[group] = {}
+            for item_data in items:
+                action = self._favorite_action(menu, item_data)
+                menu.addAction(action)
+                self.group_actions[group][id(item_data)] = action
+        else:
+            add_menu_pages(menu, items, self._favorite_action)
+        self.built_groups.add(group)
+
+    def items_reordered(self):
+        # The counts stay; built groups list their favorites in the old
+        # order, so they are rebuilt the next time they open.
+        for group in list(self.built_groups):
+            self._invalidate_group(group)
+
+    def items_changed(self, items):
+        # Built groups are rebuilt the next time they open.
+        for item_data in items:
+            for group in tray_groups(item_data):
+                self._invalidate_group(group)
+
+    def _favorite_action(self, menu, item_data):
+        text = f"{item_data['label']} ({item_data['type']})"
+        if ((is_local(item_data) and self.app.health_monitor.health.is_missing(item_data['path']))
+                or self.app.link_monitor.is_broken(item_data)):
+            text = f"⚠ {text}"
+        if item_data['type'] == 'Folder':
+            # A submenu of the folder's contents, opened from its first entry.
+            browse_menu = BrowseMenu(self.app, item_data, self.app._execute_favorite, menu)
+            browse_menu.setTitle(text)
+            browse_menu.setIcon(self.app.icon_loader.icon_for(item_data))
+            return browse_menu.menuAction()
+        action = QAction(self.app.icon_loader.icon_for(item_data), text, menu)
+        action.triggered.connect(lambda checked, i=item_data: self.app._execute_favorite(i))
+        return action
+
+
+def add_menu_pages(menu, items, make_action):
+    # Nest pages so no menu ever holds more than TRAY_PAGE_SIZE entries. A
+    # page's actions are made with make_action(page_menu, item) when it is
+    # first hovered.
+    chunk = TRAY_PAGE_SIZE
+    while (len(items) + chunk - 1) // chunk > TRAY_PAGE_SIZE:
+        chunk *= TRAY_PAGE_SIZE
+    for start in range(0, len(items), chunk):
+        page = items[start:start + chunk]
+        page_menu = QMenu(f"{start + 1}–{start + len(page)}", menu)
+        page_menu.aboutToShow.connect(lambda m=page_menu, p=page: _populate_menu_page(m, p, make_action))
+        menu.addMenu(page_menu)
+
+
+def _populate_menu_page(menu, items, make_action):
+    if menu.actions():
+        return
+    if len(items) <= TRAY_PAGE_SIZE:
+        for item in items:
+            menu.addAction(make_action(menu, item))
+    else:
+        add_menu_pages(menu, items, make_action)
+
+
+def clear_menu(menu):
+    menu.clear()
+    for child in menu.findChildren(QMenu, options=Qt.FindChildOption.FindDirectChildrenOnly):
+        child.deleteLater()
+
+
+def delete_action(action):
+    # A submenu's action belongs to the submenu and goes with it.
+    submenu = action.menu()
+    (submenu if submenu is not None else action).deleteLater()
+
+
+class FolderBrowser(QObject):
+    # Directory listings for BrowseMenus. Folders are read on worker threads
+    # into a DirectoryCache, so a folder seen before shows at once; its mtime
+    # is then checked in the background and, for the BROWSE_MAX_WATCHED_DIRS
+    # folders listed last, a QFileSystemWatcher reports changes as well. A
+    # changed folder is read again and listing_changed tells the menus.
+    listing_changed = pyqtSignal(str)
+    progress = pyqtSignal(str, int)
+    _listed = pyqtSignal(str, object, object)
+    _mtime_checked = pyqtSignal(str, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cache = DirectoryCache()
+        self.errors = {}
+        self.pending = set()
+        self.checking = set()
+        self._executor = ThreadPoolExecutor(max_workers=BROWSE_WORKERS, thread_name_prefix="favorites-browse")
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_directory_changed)
+        self.watched_dirs = OrderedDict()
+        self.changed_dirs = set()
+        self.rescan_timer = QTimer(self)
+        self.rescan_timer.setSingleShot(True)
+        self.rescan_timer.setInterval(BROWSE_RESCAN_DELAY_MS)
+        self.rescan_timer.timeout.connect(self._rescan_changed_dirs)
+        self._listed.connect(self._on_listed)
+        self._mtime_checked.connect(self._on_mtime_checked)
+
+    def listing(self, path):
+        # The cached listing of path, or None while it is being read.
+        listing = self.cache.get(path)
+        if listing is None:
+            self.request(path)
+        elif path not in self.checking and self.cache.needs_check(listing):
+            self.checking.add(path)
+            self._executor.submit(self._check_mtime, path)
+        return listing
+
+    def request(self, path):
+        if path not in self.pending:
+            self.pending.add(path)
+            self._executor.submit(self._list, path)
+
+    def shutdown(self):
+        self.watcher.directoryChanged.disconnect(self._on_directory_changed)
+        self.rescan_timer.stop()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _list(self, path):
+        try:
+            listing = list_directory(path, lambda count: self.progress.emit(path, count))
+        except OSError as e:
+            self._listed.emit(path, None, e)
+            return
+        self._listed.emit(path, listing, None)
+
+    def _check_mtime(self, path):
+        self._mtime_checked.emit(path, directory_mtime(path))
+
+    def _on_listed(self, path, listing, error):
+        self.pending.discard(path)
+        if listing is None:
+            self.cache.drop(path)
+            self.errors[path] = error
+        else:
+            self.cache.put(listing)
+            self.errors.pop(path, None)
+            self._watch(path)
+        self.listing_changed.emit(path)
+
+    def _on_mtime_checked(self, path, mtime_ns):
+        self.checking.discard(path)
+        listing = self.cache.get(path)
+        if listing is not None and not self.cache.is_current(listing, mtime_ns):
+            # The old listing stays on screen until the new one is read.
+            self.request(path)
+
+    def _watch(self, path):
+        if path in self.watched_dirs:
+            self.watched_dirs.move_to_end(path)
+            return
+        if len(self.watched_dirs) >= BROWSE_MAX_WATCHED_DIRS:
+            oldest, _ = self.watched_dirs.popitem(last=False)
+            self.watcher.removePath(oldest)
+        if self.watcher.addPath(path):
+            self.watched_dirs[path] = True
+
+    def _on_directory_changed(self, directory):
+        self.changed_dirs.add(directory)
+        self.rescan_timer.start()
+
+    def _rescan_changed_dirs(self):
+        for path in self.changed_dirs:
+            if path in self.cache:
+                self.request(path)
+        self.changed_dirs = set()
+
+
+class BrowseMenu(QMenu):
+    # A folder's contents as a submenu, listed by the app's FolderBrowser
+    # when it first opens. Subfolders are BrowseMenus of their own and big
+    # folders are split into pages like the tray's groups, so only entries
+    # that are shown become actions. on_open(item_data) opens the folder
+    # itself from the first entry.
+
+    def __init__(self, app, item_data, on_open, parent=None):
+        super().__init__(item_data['label'].replace("&", "&&"), parent)
+        self.app = app
+        self.browser = app.folder_browser
+        self.item_data = item_data
+        self.path = os.path.normpath(item_data['path'])
+        self.on_open = on_open
+        self.shown_listing = None
+        self.built = False
+        self.placeholder = None
+        self.connected = False
+        self.aboutToShow.connect(self._populate)
+
+    def _populate(self):
+        if not self.connected:
+            self.connected = True
+            self.browser.listing_changed.connect(self._on_listing_changed)
+            self.browser.progress.connect(self._on_progress)
+        listing = self.browser.listing(self.path)
+        if not self.built or listing is not self.shown_listing:
+            self._build(listing)
+
+    def _build(self, listing):
+        clear_menu(self)
+        self.placeholder = None
+        open_action = QAction("📂 Open Folder", self)
+        open_action.triggered.connect(lambda: self.on_open(self.item_data))
+        self.addAction(open_action)
+        self.addSeparator()
+        if listing is None:
+            error = self.browser.errors.get(self.path)
+            if error is not None:
+                # From the last attempt; another one is under way.
+                self.placeholder = self.addAction(f"⚠ {error.strerror or error}")
+            else:
+                self.placeholder = self.addAction("Loading…")
+            self.placeholder.setEnabled(False)
+        elif not listing.entries:
+            self.addAction("(empty)").setEnabled(False)
+        elif len(listing.entries) <= TRAY_PAGE_SIZE:
+            for entry in listing.entries:
+                self.addAction(self._entry_action(self, entry))
+        else:
+            add_menu_pages(self, listing.entries, self._entry_action)
+        self.shown_listing = listing
+        self.built = True
+
+    def _entry_action(self, menu, entry):
+        name, is_dir = entry
+        path = os.path.join(self.path, name)
+        item_data = {"label": name, "path": path, "type": guess_type(path, is_dir), "tags": []}
+        if is_dir:
+            submenu = BrowseMenu(self.app, item_data, self.app._execute_entry, menu)
+            submenu.setIcon(self.app.icon_loader.type_icon("Folder"))
+            return submenu.menuAction()
+        action = QAction(self.app.icon_loader.icon_for(item_data), name.replace("&", "&&"), menu)
+        action.triggered.connect(lambda checked, i=item_data: self.app._execute_entry(i))
+        return action
+
+    def _on_listing_changed(self, path):
+        if path != self.path:
+            return
+        if self.isVisible():
+            self._build(self.browser.cache.get(path))
+        else:
+            self.built = False
+
+    def _on_progress(self, path, count):
+        if path == self.path and self.placeholder is not None:
+            self.placeholder.setText(f"Loading… {count:,} entries")
+
+
+class IpcServer(QObject):
+    # Answers JSON-lines commands from later invocations (see favorites_ipc).
+    # handler(request, reply) may call reply(response) later, e.g. once the
+    # favorites have finished loading.
+
+    def __init__(self, handler, parent=None):
+        super().__init__(parent)
+        self.handler = handler
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+        self.server.newConnection.connect(self._on_new_connection)
+
+    def listen(self, address):
+        # An instance that answers at the address is left alone; listening
+        # with access options would replace its socket. Only a socket nobody
+        # answers on, left behind by an instance that did not shut down
+        # cleanly, is removed. The instance lock keeps two instances that
+        # start together from both getting this far.
+        if instance_running(address):
+            print("Warning: Another QuickFavs is already answering commands here.")
+            return False
+        if self.server.listen(address):
+            return True
+        QLocalServer.removeServer(address)
+        if self.server.listen(address):
+            return True
+        print(f"Warning: Could not listen for commands: {self.server.errorString()}")
+        return False
+
+    def close(self):
+        self.server.close()
+
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            connection.readyRead.connect(lambda c=connection: self._on_ready_read(c))
+            connection.disconnected.connect(connection.deleteLater)
+
+    def _on_ready_read(self, connection):
+        while connection.canReadLine():
+            line = bytes(connection.readLine())
+            try:
+                request = decode_message(line)
+            except ValueError as e:
+                self._reply(connection, {"ok": False, "error": f"Bad request: {e}"})
+                continue
+            self.handler(request, lambda response, c=connection: self._reply(c, response))
+
+    def _reply(self, connection, response):
+        try:
+            connection.write(encode_message(response))
+            connection.flush()
+        except RuntimeError:
+            # The client went away and its socket has been deleted.
+            pass
+
+
+class HealthMonitor(QObject):
+    # Keeps PathHealth current for the local favorites: one full scan on a
+    # worker thread after loading, then QFileSystemWatcher on the directories
+    # holding them, so a change only re-checks the paths in that directory.
+    # Watching directories rather than files keeps the watch count low.
+    health_changed = pyqtSignal(object)
+    scan_finished = pyqtSignal(object)
+    _checked = pyqtSignal(object, object, bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.health = PathHealth()
+        self._scanner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="favorites-health-scan")
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_directory_changed)
+        self.watched_dirs = set()
+        self.changed_dirs = set()
+        self.rescan_timer = QTimer(self)
+        self.rescan_timer.setSingleShot(True)
+        self.rescan_timer.setInterval(HEALTH_RESCAN_DELAY_MS)
+        self.rescan_timer.timeout.connect(self._rescan_changed_dirs)
+        self._checked.connect(self._on_checked)
+
+    def check(self, paths, full_scan=False):
+        paths = list(paths)
+        if paths or full_scan:
+            self._scanner.submit(self._run_check, paths, full_scan)
+
+    def mark_missing(self, path):
+        if self.health.mark_missing(path):
+            self.health_changed.emit({path: self.health.get(path)})
+
+    def shutdown(self):
+        self.watcher.directoryChanged.disconnect(self._on_directory_changed)
+        self.rescan_timer.stop()
+        self._scanner.shutdown(wait=False, cancel_futures=True)
+        self.health.shutdown()
+
+    def _run_check(self, paths, full_scan):
+        try:
+            changed, stats = self.health.check(paths)
+        except Exception as e:
+            print(f"Error checking favorite paths: {e}")
+            return
+        self._checked.emit(changed, stats, full_scan)
+
+    def _on_checked(self, changed, stats, full_scan):
+        new_dirs = self.health.directories() - self.watched_dirs
+        room = HEALTH_MAX_WATCHED_DIRS - len(self.watched_dirs)
+        if new_dirs and room > 0:
+            new_dirs = sorted(new_dirs)[:room]
+            self.watcher.addPaths(new_dirs)
+            self.watched_dirs.update(new_dirs)
+        if changed:
+            self.health_changed.emit(changed)
+        if full_scan:
+            self.scan_finished.emit(stats)
+
+    def _on_directory_changed(self, directory):
+        self.changed_dirs.add(directory)
+        self.rescan_timer.start()
+
+    def _rescan_changed_dirs(self):
+        paths = [path for directory in self.changed_dirs for path in self.health.paths_in(directory)]
+        self.changed_dirs = set()
+        self.check(paths)
+
+
+class LinkMonitor(QObject):
+    # Checks URL favorites with a LinkChecker (see favorites_links) and hands
+    # on changed statuses in batches, at most one per LINK_REFRESH_MS, since
+    # thousands of answers can come in within a second. Without a checker
+    # nothing is checked and no link counts as broken.
+    links_changed = pyqtSignal(object)
+    check_finished = pyqtSignal(object)
+    _checked = pyqtSignal(str, object)
+    _finished = pyqtSignal(object)
+
+    def __init__(self, checker=None, parent=None):
+        super().__init__(parent)
+        self.checker = checker
+        self.changed = {}
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(LINK_REFRESH_MS)
+        self.refresh_timer.timeout.connect(self._flush)
+        self._checked.connect(self._on_checked)
+        self._finished.connect(self._on_finished)
+
+    def check(self, items, full_scan=False):
+        if self.checker is None:
+            return
+        urls = [item_data['path'] for item_data in items if item_data['type'] == 'URL']
+        if urls or full_scan:
+            self.checker.check(urls, self._checked.emit, self._finished.emit if full_scan else None, full_scan)
+
+    def status(self, item_data):
+        if self.checker is None or item_data['type'] != 'URL':
+            return None
+        return self.checker.cache.get(item_data['path'])
+
+    def is_broken(self, item_data):
+        status = self.status(item_data)
+        return status is not None and status.broken
+
+    def shutdown(self):
+        self.refresh_timer.stop()
+        if self.checker is not None:
+            self.checker.shutdown()
+
+    def _on_checked(self, url, status):
+        self.changed[url] = status
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+
+    def _flush(self):
+        if self.changed:
+            changed, self.changed = self.changed, {}
+            self.links_changed.emit(changed)
+
+    def _on_finished(self, stats):
+        self.refresh_timer.stop()
+        self._flush()
+        self.check_finished.emit(stats)
+
+
+class IconLoader(QObject):
+    # Icons for favorites: the file-type icon for local ones and the site's
+    # favicon for URLs. A key not in the memory cache is answered with the
+    # generic icon of its type while workers look it up, first in the disk
+    # cache, then with QFileIconProvider (which, as in QFileSystemModel,
+    # runs off the GUI thread) or the favicon fetcher. Workers only hand
+    # back QImages; they become icons on the GUI thread. Keys with nothing
+    # better keep the generic icon. Without a fetcher, URLs always do.
+    # Rows painted after shutdown() (the window can paint while the app
+    # quits) get the generic icon without asking the stopped workers.
+    icon_ready = pyqtSignal(str)
+    _loaded = pyqtSignal(str, str, object)
+
+    def __init__(self, disk_cache, fetcher=None, parent=None):
+        super().__init__(parent)
+        self.disk_cache = disk_cache
+        self.fetcher = fetcher
+        self.memory_cache = LruCache(ICON_MEMORY_BYTES)
+        self.pending = set()
+        self.type_icons = {}
+        self.closed = False
+        self._executor = ThreadPoolExecutor(max_workers=ICON_WORKERS, thread_name_prefix="favorites-icons")
+        self._loaded.connect(self._on_loaded)
+
+    def icon_for(self, item_data):
+        key = icon_key(item_data)
+        icon = self.memory_cache.get(key)
+        if icon is not None:
+            return icon
+        if key not in self.pending and not self.closed:
+            self.pending.add(key)
+            self._executor.submit(self._load, key, item_data['path'], item_data['type'])
+        return self.type_icon(item_data['type'])
+
+    def type_icon(self, f_type):
+        icon = self.type_icons.get(f_type)
+        if icon is None:
+            kinds = {
+                "Folder": QFileIconProvider.IconType.Folder,
+                "URL": QFileIconProvider.IconType.Network,
+            }
+            icon = QFileIconProvider().icon(kinds.get(f_type, QFileIconProvider.IconType.File))
+            self.type_icons[f_type] = icon
+        return icon
+
+    def shutdown(self):
+        self.closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.disk_cache.save()
+
+    def _load(self, key, path, f_type):
+        try:
+            found, data = self.disk_cache.lookup(key)
+            if found:
+                image = QImage.fromData(data) if data is not None else None
+            else:
+                with span("icon.resolve"):
+                    image, cacheable = self._resolve(path, f_type)
+                if cacheable:
+                    self.disk_cache.store(key, encode_png(image) if image is not None else None)
+        except Exception as e:
+            print(f"Error loading icon for '{path}': {e}")
+            image = None
+        self._loaded.emit(key, f_type, image if image is not None and not image.isNull() else None)
+
+    def _resolve(self, path, f_type):
+        # Returns (image or None, whether to remember the result on disk).
+        # Missing paths and failed downloads are not remembered for good.
+        if f_type == 'URL':
+            site = favicon_site(path)
+            if site is None or self.fetcher is None:
+                return None, False
+            data = self.fetcher.fetch(site)
+            image = QImage.fromData(data) if data else None
+            if image is None or image.isNull():
+                return None, True
+        else:
+            if not os.path.exists(path):
+                return None, False
+            icon = QFileIconProvider().icon(QFileInfo(path))
+            if icon.isNull():
+                return None, True
+            image = icon.pixmap(ICON_SIZE, ICON_SIZE).toImage()
+        if image.width() > ICON_SIZE or image.height() > ICON_SIZE:
+            image = image.scaled(ICON_SIZE, ICON_SIZE, Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+        return image, True
+
+    def _on_loaded(self, key, f_type, image):
+        self.pending.discard(key)
+        if image is None:
+            # Remember the miss so painting the row does not ask again.
+            self.memory_cache.put(key, self.type_icon(f_type), ICON_SIZE * ICON_SIZE * 4)
+            return
+        self.memory_cache.put(key, QIcon(QPixmap.fromImage(image)), image.sizeInBytes())
+        self.icon_ready.emit(key)
+
+
+def encode_png(image):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    buffer.close()
+    return bytes(data)
+
+
+class CoreSignals(QObject):
+    # Carries the core's callbacks from its worker threads to the GUI thread.
+    state_changed = pyqtSignal(int, object, object)
+    favorites_loaded = pyqtSignal(object, object)
+    launch_finished = pyqtSignal(object, object, object)
+    import_progress = pyqtSignal(object)
+    import_finished = pyqtSignal(str, object, object, object)
+    export_finished = pyqtSignal(str, object, object, object)
+    drop_classified = pyqtSignal(object, object)
+    external_change = pyqtSignal(object)
+
+
+class DropPreviewDialog(QDialog):
+    # Lists the favorites a multi-item drop would add. Each row can be left
+    # out, renamed and given its own tags; "Tag all" adds tags to the
+    # selected rows, or to every row when none is selected.
+    NAME, TYPE, TAGS, PATH = range(4)
+
+    def __init__(self, favorites, stats, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Add Dropped Items")
+        self.resize(720, 420)
+        layout = QVBoxLayout(self)
+
+        summary = f"{len(favorites)} new favorite(s)"
+        if stats['duplicates']:
+            summary += f"; {stats['duplicates']} already in your favorites will be skipped"
+        layout.addWidget(QLabel(summary + "."))
+
+        self.table = QTableWidget(len(favorites), 4)
+        self.table.setHorizontalHeaderLabels(["Name", "Type", "Tags", "Path"])
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(self.PATH, QHeaderView.ResizeMode.Stretch)
+        for row, item_data in enumerate(favorites):
+            name = QTableWidgetItem(item_data['label'])
+            name.setCheckState(Qt.CheckState.Checked)
+            self.table.setItem(row, self.NAME, name)
+            for column, text in ((self.TYPE, item_data['type']), (self.PATH, item_data['path'])):
+                cell = QTableWidgetItem(text)
+                cell.setFlags(cell.flags() & ~Qt.ItemFlag.ItemIsEditable)
+                self.table.setItem(row, column, cell)
+            self.table.setItem(row, self.TAGS, QTableWidgetItem(""))
+        self.table.resizeColumnToContents(self.NAME)
+        self.table.resizeColumnToContents(self.TYPE)
+        layout.addWidget(self.table)
+
+        tag_layout = QHBoxLayout()
+        self.tag_all_input = QLineEdit()
+        self.tag_all_input.setPlaceholderText("Tags (comma-separated)")
+        tag_all_button = QPushButton("Tag all")
+        tag_all_button.setToolTip("Add these tags to the selected rows, or to every row if none is selected")
+        tag_all_button.clicked.connect(self.tag_all)
+        tag_layout.addWidget(self.tag_all_input)
+        tag_layout.addWidget(tag_all_button)
+        layout.addLayout(tag_layout)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.button(QDialogButtonBox.StandardButton.Ok).setText("Add")
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def tag_all(self):
+        new_tags = split_tag_text(self.tag_all_input.text())
+        rows = sorted({index.row() for index in self.table.selectedIndexes()}) or range(self.table.rowCount())
+        for row in rows:
+            cell = self.table.item(row, self.TAGS)
+            tags = split_tag_text(cell.text())
+            cell.setText(", ".join(tags + [tag for tag in new_tags if tag not in tags]))
+
+    def favorites(self):
+        favorites = []
+        for row in range(self.table.rowCount()):
+            name = self.table.item(row, self.NAME)
+            if name.checkState() != Qt.CheckState.Checked:
+                continue
+            path = self.table.item(row, self.PATH).text()
+            favorites.append({"label": name.text().strip() or os.path.basename(path) or path, "path": path,
+                              "type": self.table.item(row, self.TYPE).text(),
+                              "tags": split_tag_text(self.table.item(row, self.TAGS).text())})
+        return favorites
+
+
+def split_tag_text(text):
+    return [tag.strip() for tag in text.split(',') if tag.strip()]
+
+
+class DiagnosticsPanel(QDialog):
+    # Hidden panel (Ctrl+Shift+D) with the tracer's numbers, refreshed while
+    # it is open. Opening it turns the tracer on, so everything from then on
+    # is measured.
+    COLUMNS = ("Span", "Count", "Mean ms", "p50 ms", "p90 ms", "p99 ms", "Max ms", "Distribution")
+    BARS = " ▁▂▃▄▅▆▇█"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+        self.resize(760, 360)
+        layout = QVBoxLayout(self)
+
+        scale = "  ".join(f"{bound:g}" for bound in HISTOGRAM_BOUNDS_MS)
+        layout.addWidget(QLabel(f"Last {TRACE_SAMPLES} samples per span; distribution buckets "
+                                f"(ms): {scale}, slower"))
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(len(self.COLUMNS) - 1, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+        self.counters_label = QLabel()
+        self.counters_label.setWordWrap(True)
+        layout.addWidget(self.counters_label)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Reset | QDialogButtonBox.StandardButton.Close)
+        buttons.button(QDialogButtonBox.StandardButton.Reset).clicked.connect(self.reset)
+        buttons.rejected.connect(self.close)
+        layout.addWidget(buttons)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(DIAGNOSTICS_REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        tracer.enable()
+        self.refresh()
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def reset(self):
+        tracer.reset()
+        self.refresh()
+
+    def refresh(self):
+        snapshot = tracer.snapshot()
+        spans = snapshot["spans"]
+        self.table.setRowCount(len(spans))
+        for row, (name, summary) in enumerate(spans.items()):
+            values = (name, str(summary["count"]),
+                      *(f"{summary[key]:.2f}" for key in ("mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")),
+                      self._bars(summary["buckets"]))
+            for column, text in enumerate(values):
+                cell = self.table.item(row, column)
+                if cell is None:
+                    self.table.setItem(row, column, QTableWidgetItem(text))
+                else:
+                    cell.setText(text)
+        counters = snapshot["counters"]
+        self.counters_label.setText("Counters: " + (", ".join(f"{name} {value}" for name, value in counters.items())
+                                                    or "none yet"))
+
+    def _bars(self, buckets):
+        top = max(buckets) or 1
+        return "".join(self.BARS[-(-count * (len(self.BARS) - 1) // top)] for count in buckets)
+
 
 class FavoritesApp(QWidget):
-    def __init__(self):
+    startup_finished = pyqtSignal()
+
+    def __init__(self, profiler=None):
         super().__init__()
-        self.settings = load_settings()
-        self.favorites = self.load_favorites()
-        self.current_edit_index = -1
+        # Startup is staged: the window and tray icon come up first with an
+        # empty list, then favorites are read on the writer thread and added
+        # to the list in slices that each fit in one frame.
+        self.profiler = profiler or StartupProfiler()
+        self.first_painted = False
+        self.core_signals = CoreSignals(self)
+        self.core = FavoritesCore(on_save_state_changed=self.core_signals.state_changed.emit,
+                                  on_launch_finished=self.core_signals.launch_finished.emit)
+        self.launch_batches = []
+        self.health_monitor = HealthMonitor(self)
+        self.health_monitor.health_changed.connect(self.on_health_changed)
+        self.health_monitor.scan_finished.connect(self.on_health_scan_finished)
+        fetcher = HttpFaviconFetcher() if self.core.settings.get("fetch_favicons", False) else None
+        self.icon_loader = IconLoader(IconDiskCache(ICON_CACHE_DIR), fetcher, self)
+        self.folder_browser = FolderBrowser(self)
+        checker = LinkChecker(LinkCache(LINK_CACHE_FILE)) if self.core.settings.get("check_links", False) else None
+        self.link_monitor = LinkMonitor(checker, self)
+        self.link_monitor.links_changed.connect(self.on_links_changed)
+        self.link_monitor.check_finished.connect(self.on_link_check_finished)
+        self.settings = self.core.settings
+        self.save_queue = self.core.save_queue
+        self.favorites = self.core.favorites
+        self.search_index = self.core.search_index
+        self.launch_stats = self.core.launch_stats
+        self.status_message = "Ready."
+        self.status_is_error = False
+        self.save_state = ""
+        self.save_state_is_error = False
+        self.loading = True
+        self.pending_favorites = []
+        self.pending_position = 0
+        self.importing = False
+        self.imported_favorites = []
+        self.imported_position = 0
+        self.file_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="favorites-files")
+        self.current_edit_id = None
+        self.profiler.mark("settings")
 
         self.setWindowTitle("Favorites")
         self.setWindowIcon(QIcon("C:/Users/User/Desktop/icon.ico"))
         self.resize(600, 500)
 
         self.init_ui()
+        self.profiler.mark("ui")
 
         self.tray_icon = QSystemTrayIcon(self)
         self.tray_icon.setIcon(QIcon("C:/Users/User/Desktop/icon.ico"))
         self.tray_icon.setToolTip("Favorites - Running in background")
         self.tray_icon.activated.connect(self.on_tray_icon_activated)
+        self.tray_menu = TrayMenuController(self)
+        self.tray_icon.setContextMenu(self.tray_menu.menu)
 
         self.update_tray_menu()
         self.tray_icon.show()
+        self.profiler.mark("tray")
+
+        self.setAcceptDrops(True)
 
         if self.settings.get("start_in_tray", False):
             self.hide()
@@ -67,18 +1538,46 @@ class FavoritesApp(QWidget):
                 QSystemTrayIcon.MessageIcon.Information,
                 3000
             )
+            self.first_painted = True
+            self.profiler.mark("first paint")
         else:
             self.showNormal()
 
-        self.setAcceptDrops(True)
+        self.pending_ipc_requests = []
+        self.ipc_server = IpcServer(self.handle_ipc_request, self)
+        self.ipc_server.listen(server_address())
+        QApplication.instance().aboutToQuit.connect(self.ipc_server.close)
+
+        self.load_favorites()
+
+    def paintEvent(self, event):
+        if not self.first_painted:
+            self.first_painted = True
+            self.profiler.mark("first paint")
+        super().paintEvent(event)
 
     def init_ui(self):
         main_layout = QVBoxLayout()
 
+        search_layout = QHBoxLayout()
+
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Search favorites by name, type, or tags...")
+        self.search_input.setPlaceholderText("Search favorites by name, type, or tags... (tag:work type:url -tag:old)")
         self.search_input.textChanged.connect(self.filter_favorites)
-        main_layout.addWidget(self.search_input)
+        self.search_input.returnPressed.connect(self.open_top_result)
+
+        self.fuzzy_checkbox = QCheckBox("Fuzzy")
+        self.fuzzy_checkbox.setToolTip("Match characters in order anywhere and rank by relevance and usage")
+        self.fuzzy_checkbox.setChecked(self.settings.get("search_mode") == "fuzzy")
+        self.fuzzy_checkbox.toggled.connect(self.toggle_fuzzy_search)
+
+        self.facet_box = FacetBox(self.search_index)
+        self.facet_box.facet_chosen.connect(self.add_search_term)
+
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.facet_box)
+        search_layout.addWidget(self.fuzzy_checkbox)
+        main_layout.addLayout(search_layout)
 
         input_layout = QHBoxLayout()
 
@@ -126,16 +1625,74 @@ class FavoritesApp(QWidget):
         buttons_layout.addWidget(self.cancel_edit_button)
         main_layout.addLayout(buttons_layout)
 
-        main_layout.addWidget(QLabel("📌 Favorites"))
-        self.list_widget = QListWidget()
-        self.update_list()
-        self.list_widget.itemDoubleClicked.connect(self.open_favorite_from_list)
-        self.list_widget.currentRowChanged.connect(self.update_button_states)
-        self.list_widget.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.list_widget.customContextMenuRequested.connect(self.show_list_context_menu)
-        main_layout.addWidget(self.list_widget)
-
-        self.status_label = QLabel("Ready.")
+        favorites_header_layout = QHBoxLayout()
+        favorites_header_layout.addWidget(QLabel("📌 Favorites"))
+        favorites_header_layout.addStretch()
+        self.import_button = QPushButton("Import...")
+        self.import_button.setToolTip("Add bookmarks from a browser export (HTML or JSON) or a CSV file")
+        self.import_button.clicked.connect(lambda: self.import_bookmarks())
+        self.export_button = QPushButton("Export...")
+        self.export_button.setToolTip("Save all favorites as browser bookmarks (HTML or JSON) or CSV")
+        self.export_button.clicked.connect(lambda: self.export_bookmarks())
+        favorites_header_layout.addWidget(self.import_button)
+        favorites_header_layout.addWidget(self.export_button)
+        main_layout.addLayout(favorites_header_layout)
+        self.favorites_model = FavoritesModel(self.core, self.health_monitor.health, self.icon_loader,
+                                              self.link_monitor, self)
+        self.list_model = FavoritesFilterProxy(self.search_index, self)
+        self.list_model.fuzzy = self.fuzzy_checkbox.isChecked()
+        self.list_model.setSourceModel(self.favorites_model)
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setSelectionMode(QListView.SelectionMode.ExtendedSelection)
+        # Batched layout keeps inserting rows cheap on very long lists.
+        self.list_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.list_view.setModel(self.list_model)
+        self.list_view.doubleClicked.connect(self.open_favorite_from_list)
+        self.list_view.selectionModel().currentRowChanged.connect(self.update_button_states)
+        self.list_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.list_view.customContextMenuRequested.connect(self.show_list_context_menu)
+        main_layout.addWidget(self.list_view)
+
+        self.search_pipeline = SearchPipeline(self.search_index, self.list_model,
+                                              self.fuzzy_checkbox.isChecked(), self.save_queue, self)
+        self.search_pipeline.results_applied.connect(self.on_search_results_applied)
+        QApplication.instance().aboutToQuit.connect(self.search_pipeline.shutdown)
+
+        self.launch_stats_timer = QTimer(self)
+        self.launch_stats_timer.setSingleShot(True)
+        self.launch_stats_timer.setInterval(LAUNCH_STATS_SAVE_DELAY_MS)
+        self.launch_stats_timer.timeout.connect(self.launch_stats.save)
+        QApplication.instance().aboutToQuit.connect(self.launch_stats.save)
+        QApplication.instance().aboutToQuit.connect(self.merge_external_change_on_quit)
+        QApplication.instance().aboutToQuit.connect(self.save_queue.close)
+        QApplication.instance().aboutToQuit.connect(self.core.write_cache)
+        self.core_signals.state_changed.connect(self.on_save_state_changed)
+        self.core_signals.favorites_loaded.connect(self.on_favorites_loaded)
+        self.core_signals.launch_finished.connect(self.on_launch_finished)
+        self.core_signals.import_progress.connect(self.on_import_progress)
+        self.core_signals.import_finished.connect(self.on_import_finished)
+        self.core_signals.export_finished.connect(self.on_export_finished)
+        self.core_signals.drop_classified.connect(self.on_drop_classified)
+        self.core_signals.external_change.connect(self.on_external_change)
+
+        # Watches the favorites file once loaded (see watch_storage_file).
+        self.storage_watcher = QFileSystemWatcher(self)
+        self.storage_watcher.fileChanged.connect(self.on_storage_file_changed)
+        self.storage_watcher.directoryChanged.connect(self.on_storage_file_changed)
+        self.external_change_timer = QTimer(self)
+        self.external_change_timer.setSingleShot(True)
+        self.external_change_timer.setInterval(EXTERNAL_CHANGE_DELAY_MS)
+        self.external_change_timer.timeout.connect(self.check_external_change)
+        QApplication.instance().aboutToQuit.connect(
+            lambda: self.file_executor.shutdown(wait=False, cancel_futures=True))
+        QApplication.instance().aboutToQuit.connect(self.core.launcher.shutdown)
+        QApplication.instance().aboutToQuit.connect(self.health_monitor.shutdown)
+        QApplication.instance().aboutToQuit.connect(self.icon_loader.shutdown)
+        QApplication.instance().aboutToQuit.connect(self.folder_browser.shutdown)
+        QApplication.instance().aboutToQuit.connect(self.link_monitor.shutdown)
+
+        self.status_label = QLabel("Loading favorites...")
         self.status_label.setStyleSheet("color: #bbbbbb; padding: 5px; font-size: 12px;")
         main_layout.addWidget(self.status_label)
 
@@ -178,74 +1735,305 @@ class FavoritesApp(QWidget):
         QAction("Edit", self, shortcut=QKeySequence("Ctrl+E"), triggered=self.edit_selected_favorite)
         QAction("Delete", self, shortcut=QKeySequence(Qt.Key.Key_Delete), triggered=self.confirm_delete_selected)
         QAction("Cancel Edit", self, shortcut=QKeySequence(Qt.Key.Key_Escape), triggered=self.cancel_edit)
+        self.diagnostics_panel = None
+        self.addAction(QAction("Diagnostics", self, shortcut=QKeySequence("Ctrl+Shift+D"),
+                               triggered=self.toggle_diagnostics))
+
 
+    def toggle_diagnostics(self):
+        if self.diagnostics_panel is None:
+            self.diagnostics_panel = DiagnosticsPanel(self)
+        self.diagnostics_panel.setVisible(not self.diagnostics_panel.isVisible())
 
     def show_status_message(self, message, is_error=False):
-        if is_error:
+        self.status_message = message
+        self.status_is_error = is_error
+        self.refresh_status_label()
+
+    def on_save_state_changed(self, pending, last_flushed, error):
+        self.save_state_is_error = error is not None
+        if error is not None:
+            self.save_state = f"Error saving favorites: {error}"
+        elif pending:
+            self.save_state = f"{pending} change(s) pending"
+        elif last_flushed is not None:
+            self.save_state = f"Saved at {time.strftime('%H:%M:%S', time.localtime(last_flushed))}"
+        self.refresh_status_label()
+
+    def refresh_status_label(self):
+        if self.status_is_error or self.save_state_is_error:
             self.status_label.setStyleSheet("color: #FF6347; padding: 5px; font-size: 12px;")
         else:
             self.status_label.setStyleSheet("color: #bbbbbb; padding: 5px; font-size: 12px;")
-        self.status_label.setText(message)
+        if self.save_state:
+            self.status_label.setText(f"{self.status_message}  ·  {self.save_state}")
+        else:
+            self.status_label.setText(self.status_message)
 
     def load_favorites(self):
-        if not os.path.exists(FAVORITES_FILE):
-            return []
-        try:
-            with open(FAVORITES_FILE, 'r', encoding='utf-8') as f:
-                favorites_data = json.load(f)
-                for item in favorites_data:
-                    item.setdefault('tags', [])
-                return favorites_data
-        except json.JSONDecodeError:
+        # Read on the writer thread, so a quit during startup cannot close
+        # (and compact) the storage before it has been loaded.
+        self.status_message = "Loading favorites..."
+        self.load_started = time.perf_counter()
+        self.core.load_async().add_done_callback(self._emit_favorites_loaded)
+
+    def _emit_favorites_loaded(self, future):
+        error = future.exception()
+        self.core_signals.favorites_loaded.emit(None if error else future.result(), error)
+
+    def on_favorites_loaded(self, favorites, error):
+        self.profiler.mark("load")
+        if isinstance(error, json.JSONDecodeError):
             print(f"Warning: Could not decode {FAVORITES_FILE}. Returning empty favorites list.")
             self.show_status_message(f"Warning: Could not load favorites file.", is_error=True)
-            return []
-        except Exception as e:
-            print(f"Error loading favorites: {e}. Returning empty favorites list.")
-            self.show_status_message(f"Error loading favorites: {e}", is_error=True)
-            return []
+        elif error is not None:
+            print(f"Error loading favorites: {error}. Returning empty favorites list.")
+            self.show_status_message(f"Error loading favorites: {error}", is_error=True)
+        self.launch_stats.load()
+        self.pending_favorites = favorites or []
+        self.pending_position = 0
+        self.add_loaded_favorites()
+
+    def add_loaded_favorites(self):
+        deadline = time.perf_counter() + FRAME_BUDGET_MS / 1000
+        while self.pending_position < len(self.pending_favorites) and time.perf_counter() < deadline:
+            batch = self.pending_favorites[self.pending_position:self.pending_position + STARTUP_BATCH_SIZE]
+            self.pending_position += len(batch)
+            self.tray_menu.items_added(self.favorites_model.extend_favorites(batch))
+        if self.pending_position < len(self.pending_favorites):
+            QTimer.singleShot(0, self.add_loaded_favorites)
+            return
 
-    def save_favorites(self):
+        self.pending_favorites = []
+        self.loading = False
+        self.core.finish_load()
+        self.core.refresh_cache()
+        self.profiler.mark("list")
+        self.health_monitor.check((item_data['path'] for item_data in self.favorites if is_local(item_data)),
+                                  full_scan=True)
+        self.link_monitor.check(self.favorites, full_scan=True)
+        self.watch_storage_file()
+        self.update_button_states()
+        if self.status_message == "Loading favorites...":
+            self.show_status_message("Ready.")
+        self.profiler.mark("ready")
+        if tracer.enabled:
+            tracer.record("load", self.load_started, time.perf_counter())
+        for request, reply in self.pending_ipc_requests:
+            self.handle_ipc_request(request, reply)
+        self.pending_ipc_requests = []
+        self.startup_finished.emit()
+
+    def handle_ipc_request(self, request, reply):
+        if self.loading:
+            self.pending_ipc_requests.append((request, reply))
+            return
+        command = request.get("command")
+        args = request.get("args", [])
+        options = request.get("options", {})
+        # Commands that change the list or the window go through the GUI so
+        # the model, the tray menu and the status bar follow along.
         try:
-            with open(FAVORITES_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.favorites, f, indent=4, ensure_ascii=False)
-            self.show_status_message("Favorites saved successfully.")
-        except Exception as e:
-            print(f"Error saving favorites: {e}")
-            self.show_status_message(f"Error saving favorites: {e}", is_error=True)
+            if command == "show":
+                self.showNormal()
+                self.raise_()
+                self.activateWindow()
+                result = None
+            elif command == "open":
+                text = " ".join(str(arg) for arg in args)
+                row = self.core.find(text)
+                if row < 0:
+                    raise ValueError(f"No favorite matches '{text}'.")
+                # Answered once the launch is under way; how it went shows up
+                # in the status bar like any other launch.
+                result = self.favorites[row]
+                self._execute_favorite(result)
+            elif command == "add":
+                result = self.add_favorite(favorite_from_request(args, options))
+                self.show_status_message(f"Favorite '{result['label']}' added.")
+            elif command == "remove":
+                result = self.core.record_with_label(" ".join(str(arg) for arg in args))
+                self.remove_favorite(result.id)
+                self.show_status_message(f"Favorite '{result['label']}' deleted.")
+            elif command in ("import", "export"):
+                # Answered once the file has been read or written.
+                path = " ".join(str(arg) for arg in args)
+                if command == "import":
+                    self.import_bookmarks(path, options.get("format"), reply)
+                else:
+                    self.export_bookmarks(path, options.get("format"), reply)
+                return
+            elif command in IPC_COMMANDS:
+                result = self.core.run_command(command, args, options)
+            else:
+                raise ValueError(f"Unknown command '{command}'. Expected one of: {', '.join(IPC_COMMANDS)}.")
+        except ValueError as e:
+            reply({"ok": False, "error": str(e)})
+            return
+        reply({"ok": True, "result": result})
+
+    def import_bookmarks(self, path=None, fmt=None, reply=None):
+        # The file is parsed on a worker thread; the new favorites are then
+        # added in slices that each fit in one frame. The storage queue
+        # writes them all in one go.
+        if self.loading or self.importing:
+            message = "Please wait until the favorites have finished loading." if self.loading \
+                else "An import is already running."
+            self.show_status_message(message, is_error=True)
+            if reply is not None:
+                reply({"ok": False, "error": message})
+            return
+        if path is None:
+            path, _ = QFileDialog.getOpenFileName(self, "Import Bookmarks", "", IMPORT_FILE_FILTER)
+            if not path:
+                return
+        from favorites_import import import_file
+
+        self.importing = True
+        self.import_button.setEnabled(False)
+        self.show_status_message(f"Importing '{os.path.basename(path)}'...")
+        existing_paths = [item_data['path'] for item_data in self.favorites]
+        future = self.file_executor.submit(import_file, path, existing_paths, fmt,
+                                           self.core_signals.import_progress.emit)
+        future.add_done_callback(lambda f: self._emit_file_task_finished(
+            f, self.core_signals.import_finished, path, reply))
+
+    def export_bookmarks(self, path=None, fmt=None, reply=None):
+        if self.loading:
+            message = "Please wait until the favorites have finished loading."
+            self.show_status_message(message, is_error=True)
+            if reply is not None:
+                reply({"ok": False, "error": message})
+            return
+        if path is None:
+            path, selected_filter = QFileDialog.getSaveFileName(self, "Export Favorites", "favorites.html",
+                                                                ";;".join(EXPORT_FILE_FILTERS))
+            if not path:
+                return
+            if not os.path.splitext(path)[1]:
+                path += EXPORT_FILE_FILTERS.get(selected_filter, ".html")
+        from favorites_import import export_file
+
+        self.show_status_message(f"Exporting to '{os.path.basename(path)}'...")
+        # Edits replace items rather than changing them, so a copy of the
+        # list is a consistent snapshot for the worker.
+        future = self.file_executor.submit(export_file, list(self.favorites), path, fmt)
+        future.add_done_callback(lambda f: self._emit_file_task_finished(
+            f, self.core_signals.export_finished, path, reply))
+
+    def _emit_file_task_finished(self, future, signal, path, reply):
+        if future.cancelled():
+            return
+        error = future.exception()
+        signal.emit(path, None if error else future.result(), error, reply)
+
+    def on_import_progress(self, stats):
+        percent = 100 * stats['bytes'] // stats['total_bytes'] if stats['total_bytes'] else 100
+        self.show_status_message(f"Importing... {percent}% ({stats['added']} new, "
+                                 f"{stats['duplicates']} duplicates)")
+
+    def on_import_finished(self, path, result, error, reply):
+        if error is not None:
+            self.importing = False
+            self.import_button.setEnabled(True)
+            message = f"Could not import '{os.path.basename(path)}': {error}"
+            self.show_status_message(message, is_error=True)
+            if reply is not None:
+                reply({"ok": False, "error": message})
+            return
+        self.imported_favorites, stats = result
+        self.imported_position = 0
+        self.add_imported_favorites(path, stats, reply)
+
+    def add_imported_favorites(self, path, stats, reply):
+        deadline = time.perf_counter() + FRAME_BUDGET_MS / 1000
+        while self.imported_position < len(self.imported_favorites) and time.perf_counter() < deadline:
+            batch = self.imported_favorites[self.imported_position:self.imported_position + IMPORT_BATCH_SIZE]
+            self.imported_position += len(batch)
+            self.tray_menu.items_added(self.favorites_model.append_favorites(batch))
+        if self.imported_position < len(self.imported_favorites):
+            self.show_status_message(f"Adding imported favorites... "
+                                     f"{self.imported_position}/{len(self.imported_favorites)}")
+            QTimer.singleShot(0, lambda: self.add_imported_favorites(path, stats, reply))
+            return
+
+        self.health_monitor.check(item_data['path'] for item_data in self.imported_favorites if is_local(item_data))
+        self.link_monitor.check(self.imported_favorites)
+        self.imported_favorites = []
+        self.importing = False
+        self.import_button.setEnabled(True)
+        print(f"Imported {stats['added']} of {stats['read']} bookmarks from {path} in {stats['seconds']:.2f} s.")
+        self.show_status_message(f"Imported {stats['added']} favorite(s) from '{os.path.basename(path)}'; "
+                                 f"{stats['duplicates']} duplicate(s) and {stats['skipped']} unsupported skipped.")
+        if reply is not None:
+            reply({"ok": True, "result": stats})
+
+    def on_export_finished(self, path, count, error, reply):
+        if error is not None:
+            message = f"Could not export to '{os.path.basename(path)}': {error}"
+            self.show_status_message(message, is_error=True)
+            if reply is not None:
+                reply({"ok": False, "error": message})
+            return
+        self.show_status_message(f"Exported {count} favorite(s) to '{os.path.basename(path)}'.")
+        if reply is not None:
+            reply({"ok": True, "result": {"exported": count, "path": path}})
+
+    def add_favorite(self, fav_item):
+        record = self.favorites_model.append_favorite(fav_item)
+        self.tray_menu.item_added(record)
+        if is_local(record):
+            self.health_monitor.check([record['path']])
+        self.link_monitor.check([record])
+        return record
+
+    def remove_favorite(self, record_id):
+        if record_id == self.current_edit_id:
+            self.cancel_edit()
+        self.tray_menu.item_removed(self.favorites.get(record_id))
+        self.favorites_model.remove_favorite(record_id)
 
     def add_or_update_favorite(self):
         label = self.label_input.text().strip()
         path = self.path_input.text().strip()
         f_type = self.type_box.currentText()
         tags_raw = self.tag_input.text().strip()
-        tags = [tag.strip() for tag in tags_raw.split(',') if tag.strip()]
+        tags = split_tag_text(tags_raw)
 
         if not label or not path:
             self.show_status_message("Warning: Please fill in 'Name' and 'Path or URL' fields.", is_error=True)
             return
+        if self.loading:
+            self.show_status_message("Favorites are still loading, please try again.", is_error=True)
+            return
 
-        if self.current_edit_index == -1:
-            self.favorites.append({"label": label, "path": path, "type": f_type, "tags": tags})
+        fav_item = {"label": label, "path": path, "type": f_type, "tags": tags}
+        if self.current_edit_id is None:
+            self.add_favorite(fav_item)
             self.show_status_message(f"Favorite '{label}' added.")
         else:
-            self.favorites[self.current_edit_index] = {"label": label, "path": path, "type": f_type, "tags": tags}
-            self.show_status_message(f"Favorite '{label}' updated.")
+            old_item = self.favorites.get(self.current_edit_id)
+            self.tray_menu.item_updated(old_item, self.favorites_model.update_favorite(self.current_edit_id, fav_item))
+            if is_local(fav_item):
+                self.health_monitor.check([fav_item['path']])
+            self.link_monitor.check([fav_item])
             self.cancel_edit()
+            self.show_status_message(f"Favorite '{label}' updated.")
 
-        self.save_favorites()
-        self.filter_favorites(self.search_input.text())
-        self.update_tray_menu()
         self.label_input.clear()
         self.path_input.clear()
         self.tag_input.clear()
         self.update_button_states()
 
+    def current_list_row(self):
+        index = self.list_view.currentIndex()
+        return index.row() if index.isValid() else -1
+
     def edit_selected_favorite(self):
-        selected_row = self.list_widget.currentRow()
+        selected_row = self.list_model.source_row(self.current_list_row())
         if selected_row >= 0:
-            self.current_edit_index = selected_row
             fav_item = self.favorites[selected_row]
+            self.current_edit_id = fav_item.id
             self.label_input.setText(fav_item['label'])
             self.path_input.setText(fav_item['path'])
             self.type_box.setCurrentText(fav_item['type'])
@@ -255,14 +2043,14 @@ class FavoritesApp(QWidget):
             self.cancel_edit_button.setVisible(True)
             self.edit_button.setEnabled(False)
             self.delete_button.setEnabled(False)
-            self.list_widget.setEnabled(False)
+            self.list_view.setEnabled(False)
 
             self.show_status_message(f"Editing: '{fav_item['label']}'")
         else:
             self.show_status_message("Please select an item to edit.", is_error=True)
 
     def cancel_edit(self):
-        self.current_edit_index = -1
+        self.current_edit_id = None
         self.label_input.clear()
         self.path_input.clear()
         self.tag_input.clear()
@@ -270,26 +2058,15 @@ class FavoritesApp(QWidget):
 
         self.add_update_button.setText("Add")
         self.cancel_edit_button.setVisible(False)
-        self.list_widget.setEnabled(True)
+        self.list_view.setEnabled(True)
         self.show_status_message("Edit cancelled.")
         self.update_button_states()
 
-    def update_list(self):
-        self.list_widget.clear()
-        for item_data in self.favorites:
-            tags_str = f" [{', '.join(item_data['tags'])}]" if item_data.get('tags') else ""
-            list_item = QListWidgetItem(f"{item_data['label']} ({item_data['type']}){tags_str}")
-            self.list_widget.addItem(list_item)
-        self.update_button_states()
-
     def confirm_delete_selected(self):
-        selected_row = self.list_widget.currentRow()
+        selected_row = self.current_list_row()
         if selected_row >= 0:
-            if hasattr(self.list_widget, 'filtered_indices') and self.list_widget.filtered_indices:
-                original_index = self.list_widget.filtered_indices[selected_row]
-                item_to_delete_label = self.favorites[original_index]['label']
-            else:
-                item_to_delete_label = self.favorites[selected_row]['label']
+            original_index = self.list_model.source_row(selected_row)
+            item_to_delete_label = self.favorites[original_index]['label']
 
             reply = QMessageBox.question(self, 'Confirm Deletion',
                                          f"Are you sure you want to delete '{item_to_delete_label}'?",
@@ -305,21 +2082,17 @@ class FavoritesApp(QWidget):
 
     def delete_selected_favorite(self, list_row_index=None):
         if list_row_index is None:
-            selected_row = self.list_widget.currentRow()
+            selected_row = self.current_list_row()
         else:
             selected_row = list_row_index
 
-        if selected_row >= 0:
-            if hasattr(self.list_widget, 'filtered_indices') and self.list_widget.filtered_indices:
-                original_index = self.list_widget.filtered_indices[selected_row]
-            else:
-                original_index = selected_row
+        if self.loading:
+            self.show_status_message("Favorites are still loading, please try again.", is_error=True)
+        elif selected_row >= 0:
+            original_index = self.list_model.source_row(selected_row)
 
             if 0 <= original_index < len(self.favorites):
-                del self.favorites[original_index]
-                self.save_favorites()
-                self.filter_favorites(self.search_input.text())
-                self.update_tray_menu()
+                self.remove_favorite(self.favorites[original_index].id)
                 self.update_button_states()
             else:
                 self.show_status_message("Error: Item to delete not found in original list.", is_error=True)
@@ -328,61 +2101,128 @@ class FavoritesApp(QWidget):
 
 
     def filter_favorites(self, text):
-        search_text = text.lower()
-        self.list_widget.clear()
-        filtered_favorites_indices = []
-        for i, item_data in enumerate(self.favorites):
-            tags_lower = " ".join([t.lower() for t in item_data.get('tags', [])])
-            display_text_for_search = f"{item_data['label'].lower()} {item_data['type'].lower()} {tags_lower}"
-
-            if search_text in display_text_for_search:
-                tags_str = f" [{', '.join(item_data['tags'])}]" if item_data.get('tags') else ""
-                list_item = QListWidgetItem(f"{item_data['label']} ({item_data['type']}){tags_str}")
-                self.list_widget.addItem(list_item)
-                filtered_favorites_indices.append(i)
-        self.list_widget.filtered_indices = filtered_favorites_indices
+        self.search_pipeline.request(text)
+
+    def add_search_term(self, term):
+        text = self.search_input.text()
+        if term not in text:
+            self.search_input.setText(f"{text.rstrip()} {term}".lstrip())
+        self.search_input.setFocus()
+
+    def toggle_fuzzy_search(self, enabled):
+        self.settings["search_mode"] = "fuzzy" if enabled else "substring"
+        save_settings(self.settings)
+        self.search_pipeline.set_fuzzy(enabled)
+
+    def on_search_results_applied(self):
+        if self.list_model.fuzzy and self.list_model.rowCount() > 0 and self.current_list_row() < 0:
+            self.list_view.setCurrentIndex(self.list_model.index(0))
         self.update_button_states()
 
+    def open_top_result(self):
+        if self.list_model.rowCount() == 0:
+            self.show_status_message("No matching favorites.", is_error=True)
+            return
+        current_row = self.current_list_row()
+        self.open_favorite_from_list(current_row if current_row >= 0 else 0)
+
     def open_favorite_from_list(self, list_item_or_index=None):
-        if isinstance(list_item_or_index, QListWidgetItem):
-            current_row = self.list_widget.row(list_item_or_index)
+        if isinstance(list_item_or_index, QModelIndex):
+            current_row = list_item_or_index.row()
         elif isinstance(list_item_or_index, int):
             current_row = list_item_or_index
         else:
-            current_row = self.list_widget.currentRow()
+            current_row = self.current_list_row()
 
         if current_row >= 0:
-            if hasattr(self.list_widget, 'filtered_indices') and self.list_widget.filtered_indices:
-                if 0 <= current_row < len(self.list_widget.filtered_indices):
-                    original_index = self.list_widget.filtered_indices[current_row]
-                else:
-                    self.show_status_message("Error: Could not determine item to open (filtered).", is_error=True)
-                    return
-            else:
-                original_index = current_row
+            original_index = self.list_model.source_row(current_row)
+            if original_index < 0:
+                self.show_status_message("Error: Could not determine item to open (filtered).", is_error=True)
+                return
 
             if 0 <= original_index < len(self.favorites):
-                fav_item = self.favorites[original_index]
-                self._execute_favorite(fav_item)
-                self.show_status_message(f"Opened: '{fav_item['label']}'")
+                self._execute_favorite(self.favorites[original_index])
             else:
                 self.show_status_message("Error: Item not found to open (original list).", is_error=True)
         else:
             self.show_status_message("Please select an item to open.", is_error=True)
 
     def _execute_favorite(self, fav_item):
-        path = fav_item['path']
-        f_type = fav_item['type']
+        # Opened on the core's launcher threads; on_launch_finished reports
+        # the outcome.
+        self.show_status_message(f"Opening '{fav_item['label']}'...")
+        self.core.launch(fav_item)
+        self.launch_stats_timer.start()
+
+    def _execute_entry(self, item_data):
+        # A file or folder inside a browsed folder; not a favorite, so it
+        # has no launch statistics.
+        self.show_status_message(f"Opening '{item_data['label']}'...")
+        self.core.launch_entry(item_data)
+
+    def open_favorites(self, items):
+        if not items:
+            self.show_status_message("No favorites to open.", is_error=True)
+            return
+        if len(items) == 1:
+            self._execute_favorite(items[0])
+            return
+        if len(items) > BATCH_OPEN_CONFIRM:
+            reply = QMessageBox.question(self, 'Confirm Open',
+                                         f"Open {len(items)} favorites at once?",
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                                         QMessageBox.StandardButton.No)
+            if reply != QMessageBox.StandardButton.Yes:
+                self.show_status_message("Open cancelled.")
+                return
+        self.show_status_message(f"Opening {len(items)} favorites...")
+        # Results arrive through queued signals, after this returns.
+        futures = self.core.launch_many(items)
+        self.launch_batches.append({"futures": set(futures), "total": len(items), "opened": 0, "failed": []})
+        self.launch_stats_timer.start()
+
+    def open_selected_favorites(self):
+        rows = sorted(index.row() for index in self.list_view.selectionModel().selectedRows())
+        self.open_favorites([self.favorites[self.list_model.source_row(row)] for row in rows])
+
+    def open_tagged_favorites(self, tag=None):
+        if tag is None:
+            tags = self.core.tags()
+            if not tags:
+                self.show_status_message("No favorites have tags yet.", is_error=True)
+                return
+            tag, ok = QInputDialog.getItem(self, "Open All Tagged", "Tag:", tags, 0, False)
+            if not ok:
+                return
+        self.open_favorites(self.favorites.records_at(self.core.rows_with_tag(tag)))
+
+    def on_launch_finished(self, fav_item, error, future):
+        if isinstance(error, FileNotFoundError) and is_local(fav_item):
+            self.health_monitor.mark_missing(fav_item['path'])
+        for batch in self.launch_batches:
+            if future in batch["futures"]:
+                batch["futures"].discard(future)
+                if error is None:
+                    batch["opened"] += 1
+                else:
+                    reason = "target not found" if isinstance(error, FileNotFoundError) else error
+                    batch["failed"].append(f"{fav_item['label']}: {reason}")
+                if not batch["futures"]:
+                    self.launch_batches.remove(batch)
+                    if batch["failed"]:
+                        self.show_status_message(f"Opened {batch['opened']} of {batch['total']} favorites. "
+                                                 f"Failed: {'; '.join(batch['failed'])}", is_error=True)
+                    else:
+                        self.show_status_message(f"Opened {batch['total']} favorites.")
+                return
 
-        if f_type == 'URL':
-            webbrowser.open(path)
-        elif f_type in ['File', 'Folder', 'App']:
-            try:
-                os.startfile(path)
-            except FileNotFoundError:
-                self.show_status_message(f"Error: Target not found: '{path}'", is_error=True)
-            except Exception as e:
-                self.show_status_message(f"Error occurred while opening '{path}': {e}", is_error=True)
+        path = fav_item['path']
+        if error is None:
+            self.show_status_message(f"Opened: '{fav_item['label']}'")
+        elif isinstance(error, FileNotFoundError):
+            self.show_status_message(f"Error: Target not found: '{path}'", is_error=True)
+        else:
+            self.show_status_message(f"Error occurred while opening '{path}': {error}", is_error=True)
 
     def browse_path_or_url(self):
         f_type = self.type_box.currentText()
@@ -409,19 +2249,20 @@ class FavoritesApp(QWidget):
 
     def dropEvent(self, event):
         urls = event.mimeData().urls()
-        if urls:
+        if len(urls) > 1:
+            self.classify_drop([(url.toLocalFile(), True) if url.isLocalFile() else (url.toString(), False)
+                                for url in urls])
+            event.acceptProposedAction()
+        elif urls:
             for url in urls:
                 if url.isLocalFile():
                     path = url.toLocalFile()
-                    if os.path.isdir(path):
-                        f_type = "Folder"
-                    elif os.path.isfile(path):
-                        if path.lower().endswith(('.exe', '.lnk', '.bat', '.cmd')):
-                            f_type = "App"
-                        else:
-                            f_type = "File"
-                    else:
-                        f_type = "File"
+                    # Whether it is a folder is known from the health cache
+                    # or looked up off the GUI thread (see on_health_changed).
+                    status = self.health_monitor.health.get(path)
+                    f_type = guess_type(path, is_dir=status == HEALTH_FOLDER)
+                    if status is None:
+                        self.health_monitor.check([path])
 
                     label = os.path.basename(path)
                     self.label_input.setText(label)
@@ -440,6 +2281,160 @@ class FavoritesApp(QWidget):
             event.ignore()
 
 
+    def classify_drop(self, targets):
+        # Several items are typed on a worker thread, previewed, and then
+        # added together: one insert into the list, one tray update and one
+        # storage write.
+        from favorites_import import classify_dropped
+
+        self.show_status_message(f"Checking {len(targets)} dropped items...")
+        existing_paths = [item_data['path'] for item_data in self.favorites]
+        future = self.file_executor.submit(classify_dropped, targets, existing_paths)
+        future.add_done_callback(self._emit_drop_classified)
+
+    def _emit_drop_classified(self, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        self.core_signals.drop_classified.emit(None if error else future.result(), error)
+
+    def on_drop_classified(self, result, error):
+        if error is not None:
+            self.show_status_message(f"Could not add the dropped items: {error}", is_error=True)
+            return
+        favorites, stats = result
+        if not favorites:
+            self.show_status_message(f"All {stats['read']} dropped items are already favorites.")
+            return
+        dialog = DropPreviewDialog(favorites, stats, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            self.show_status_message("Drop cancelled.")
+            return
+        self.add_dropped_favorites(dialog.favorites())
+
+    def add_dropped_favorites(self, favorites):
+        if self.loading:
+            self.show_status_message("Favorites are still loading, please try again.", is_error=True)
+            return
+        from favorites_import import normalize_target
+
+        # Anything added while the preview was open is not added twice.
+        existing = {normalize_target(item_data['path']) for item_data in self.favorites}
+        new_favorites = [item_data for item_data in favorites if normalize_target(item_data['path']) not in existing]
+        records = self.favorites_model.append_favorites(new_favorites)
+        self.tray_menu.items_added(records)
+        self.health_monitor.check(record['path'] for record in records if is_local(record))
+        self.link_monitor.check(records)
+        skipped = len(favorites) - len(records)
+        self.show_status_message(f"Added {len(records)} dropped favorite(s)."
+                                 + (f" {skipped} already in your favorites skipped." if skipped else ""))
+
+    def on_health_changed(self, changed):
+        rows = [(row, item_data) for row, item_data in self.favorites.rows_with_paths(changed)
+                if is_local(item_data)]
+        self.favorites_model.refresh_rows([row for row, _ in rows])
+        self.tray_menu.items_changed(item_data for _, item_data in rows)
+        dropped_path = self.path_input.text()
+        if (changed.get(dropped_path) == HEALTH_FOLDER and self.current_edit_id is None
+                and self.type_box.currentText() in ("File", "App")):
+            self.type_box.setCurrentText("Folder")
+
+    def on_health_scan_finished(self, stats):
+        print(f"Checked {stats['paths']} favorite paths in {stats['seconds']:.2f} s "
+              f"({stats['per_second']:.0f} paths/s), {stats['missing']} missing.")
+        if stats['missing'] and not self.status_is_error:
+            self.show_status_message(f"{stats['missing']} favorite(s) point to missing files or folders.",
+                                     is_error=True)
+
+    def on_links_changed(self, changed):
+        rows = [(row, item_data) for row, item_data in self.favorites.rows_with_paths(changed)
+                if item_data['type'] == 'URL']
+        self.favorites_model.refresh_rows([row for row, _ in rows])
+        self.tray_menu.items_changed(item_data for _, item_data in rows)
+
+    def on_link_check_finished(self, stats):
+        print(f"Checked {stats['checked']} of {stats['links']} links in {stats['seconds']:.2f} s "
+              f"({stats['per_second']:.0f} links/s), {stats['broken']} broken.")
+        if stats['broken'] and not self.status_is_error:
+            self.show_status_message(f"{stats['broken']} link(s) are broken or unreachable.", is_error=True)
+
+    def watch_storage_file(self):
+        # Editors and sync clients usually replace the file rather than
+        # write to it, which ends a watch on the file itself, so its folder
+        # is watched as well. Our own writes are told apart on the writer
+        # thread, by the file's size, mtime and hash.
+        path = self.core.storage.watch_path
+        if path is None:
+            return
+        path = os.path.abspath(path)
+        self.storage_watcher.addPath(os.path.dirname(path))
+        if os.path.exists(path):
+            self.storage_watcher.addPath(path)
+
+    def on_storage_file_changed(self, changed_path):
+        self.external_change_timer.start()
+
+    def check_external_change(self):
+        path = os.path.abspath(self.core.storage.watch_path)
+        if path not in self.storage_watcher.files() and os.path.exists(path):
+            self.storage_watcher.addPath(path)
+        self.core.check_external_change().add_done_callback(self._emit_external_change)
+
+    def _emit_external_change(self, future):
+        if future.exception() is not None:
+            print(f"Error reading changed favorites: {future.exception()}")
+            return
+        if future.result():
+            self.core_signals.external_change.emit(future.result())
+
+    def merge_external_change_on_quit(self):
+        # A change that came in just before quitting is merged now; the save
+        # on the way out would not write over it unmerged.
+        self.storage_watcher.blockSignals(True)
+        self.external_change_timer.stop()
+        if self.loading or self.core.storage.watch_path is None:
+            return
+        try:
+            diff = self.core.check_external_change().result()
+        except Exception as e:
+            print(f"Error reading changed favorites: {e}")
+            return
+        if diff:
+            self.on_external_change(diff)
+
+    def on_external_change(self, diff):
+        # Only the favorites the other program touched change here, through
+        # the same row and tray updates as edits made in the window.
+        plan = self.core.plan_external_merge(diff)
+        if self.current_edit_id in plan.removed:
+            self.cancel_edit()
+        for record_id in plan.removed:
+            self.tray_menu.item_removed(self.favorites.get(record_id))
+        self.favorites_model.remove_favorites(plan.removed)
+        updated = []
+        for record_id, item_data in plan.updated.items():
+            old_item = self.favorites.get(record_id)
+            record = self.favorites_model.update_favorite(record_id, item_data)
+            self.tray_menu.item_updated(old_item, record)
+            updated.append(record)
+        added = self.favorites_model.append_favorites(plan.added)
+        self.tray_menu.items_added(added)
+        order = self.core.external_order(plan)
+        if order is not None:
+            self.favorites_model.reorder_favorites(order)
+            self.tray_menu.items_reordered()
+        changed = updated + added
+        self.health_monitor.check(record['path'] for record in changed if is_local(record))
+        self.link_monitor.check(changed)
+        self.core.save_external_merge()
+        if plan or order is not None:
+            message = (f"{os.path.basename(self.core.storage.watch_path)} was changed by another program: "
+                       f"{len(plan.added)} added, {len(updated)} updated, {len(plan.removed)} removed"
+                       f"{', reordered' if order is not None else ''}.")
+            if plan.conflicts:
+                message += f" {plan.conflicts} favorite(s) edited here as well kept your changes."
+            self.show_status_message(message)
+
     def on_tray_icon_activated(self, reason):
         if reason == QSystemTrayIcon.ActivationReason.Trigger:
             if self.isHidden():
@@ -457,26 +2452,7 @@ class FavoritesApp(QWidget):
         )
 
     def update_tray_menu(self):
-        tray_menu = QMenu()
-
-        for item_data in self.favorites:
-            action = QAction(f"{item_data['label']} ({item_data['type']})", self)
-            action.triggered.connect(lambda checked, i=item_data: self._execute_favorite(i))
-            tray_menu.addAction(action)
-
-        tray_menu.addSeparator()
-
-        restore_action = QAction("🔄 Restore", self)
-        restore_action.triggered.connect(self.showNormal)
-        tray_menu.addAction(restore_action)
-
-        tray_menu.addSeparator()
-
-        exit_action = QAction("❌ Exit", self)
-        exit_action.triggered.connect(QApplication.quit)
-        tray_menu.addAction(exit_action)
-
-        self.tray_icon.setContextMenu(tray_menu)
+        self.tray_menu.reset(self.favorites)
 
     def toggle_autorun(self, state):
         enabled = (state == Qt.CheckState.Checked)
@@ -532,21 +2508,37 @@ class FavoritesApp(QWidget):
 
 
     def update_button_states(self):
-        has_selection = self.list_widget.currentRow() >= 0
-        is_editing = self.current_edit_index != -1
+        has_selection = self.current_list_row() >= 0
+        is_editing = self.current_edit_id is not None
 
         self.edit_button.setEnabled(has_selection and not is_editing)
         self.delete_button.setEnabled(has_selection and not is_editing)
 
     def show_list_context_menu(self, position):
-        item = self.list_widget.itemAt(position)
-        if item:
+        index = self.list_view.indexAt(position)
+        if index.isValid():
             context_menu = QMenu(self)
 
             open_action = QAction("Open", self)
-            open_action.triggered.connect(lambda: self.open_favorite_from_list(item))
+            open_action.triggered.connect(lambda: self.open_favorite_from_list(index))
             context_menu.addAction(open_action)
 
+            selected_count = len(self.list_view.selectionModel().selectedRows())
+            if selected_count > 1:
+                open_selected_action = QAction(f"Open Selected ({selected_count})", self)
+                open_selected_action.triggered.connect(self.open_selected_favorites)
+                context_menu.addAction(open_selected_action)
+
+            source_row = self.list_model.source_row(index.row())
+            if source_row >= 0 and self.favorites[source_row]['type'] == 'Folder':
+                browse_menu = BrowseMenu(self, self.favorites[source_row], self._execute_favorite, context_menu)
+                browse_menu.setTitle("Browse")
+                context_menu.addMenu(browse_menu)
+
+            open_tagged_action = QAction("Open All Tagged...", self)
+            open_tagged_action.triggered.connect(lambda: self.open_tagged_favorites())
+            context_menu.addAction(open_tagged_action)
+
             edit_action = QAction("Edit", self)
             edit_action.triggered.connect(self.edit_selected_favorite)
             context_menu.addAction(edit_action)
@@ -555,68 +2547,115 @@ class FavoritesApp(QWidget):
             delete_action.triggered.connect(self.confirm_delete_selected)
             context_menu.addAction(delete_action)
 
-            context_menu.exec(self.list_widget.mapToGlobal(position))
+            context_menu.exec(self.list_view.mapToGlobal(position))
+            context_menu.deleteLater()
+
+
+DARK_STYLESHEET = """
+QWidget {
+    background-color: #2b2b2b;
+    color: #f0f0f0;
+    font-family: "Segoe UI", sans-serif;
+    font-size: 14px;
+}
+QLineEdit, QComboBox, QListView {
+    background-color: #3c3f41;
+    border: 1px solid #555;
+    border-radius: 5px;
+    padding: 5px;
+    selection-background-color: #4CAF50;
+}
+QPushButton {
+    background-color: #5c5c5c;
+    border: none;
+    border-radius: 5px;
+    padding: 6px 12px;
+    color: #f0f0f0;
+}
+QPushButton:hover {
+    background-color: #6d6d6d;
+}
+QPushButton:pressed {
+    background-color: #4d4d4d;
+}
+QListView::item {
+    padding: 6px;
+    margin: 2px;
+}
+QListView::item:selected {
+    background-color: #505050;
+    color: #ffffff;
+}
+QLabel {
+    color: #bbbbbb;
+    padding: 2px;
+}
+QCheckBox::indicator {
+    width: 16px;
+    height: 16px;
+    border: 1px solid #777;
+    border-radius: 3px;
+    background-color: #444;
+}
+QCheckBox::indicator:unchecked {
+}
+QCheckBox::indicator:checked {
+    background-color: #4CAF50;
+    border: 1px solid #4CAF50;
+    image: url(data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0cDovL3d3dy53My5vcmcvMjAwMC9zdmciIHZpZXdCb3g9IjAgMCAyNCAyNCI+PHBhdGggZmlsbD0id2hpdGUiIGQ9Ik05IDE2LjIwNkw1LjQxNCAxMi42MkEwLjg1NyAwLjg1NyAwIDAwNC4yNjkgMTMuMjk0TDUuNDIgMTQuNjQ5TCA4LjgxMiAxOC4xODZMMTkuNzI1IDcuOTY0QTAuODY3IDAuODY3IDAgMDAxOS43NzQgNy45MDhBMS4wMzEgMS4wMzEgMCAwMDAyMC45MzUgOC43NUwyMS4wNzUgNy43NjRMMTkuOTUyIDYuODc3QTIuNzUgMi43NSAwIDAwMTkuOTQxIDYuODM2TDE3LjcwMyAzLjg2MkExLjYwMiAwIDAwMTUuNTY1IDMuNjM0TDEwLjI0MiA1LjE5TDkgNS42MzdMOSA2LjA3NUwxNS43NjQgMTQuMTIzTDEzLjA4IDE4LjExOEwxMC4zMDYgMTQuOTc1TDkgMTYuMjA2eiIvPjwvc3ZnPg==);
+}
+"""
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-
-    dark_stylesheet = """
-    QWidget {
-        background-color: #2b2b2b;
-        color: #f0f0f0;
-        font-family: "Segoe UI", sans-serif;
-        font-size: 14px;
-    }
-    QLineEdit, QComboBox, QListWidget {
-        background-color: #3c3f41;
-        border: 1px solid #555;
-        border-radius: 5px;
-        padding: 5px;
-        selection-background-color: #4CAF50;
-    }
-    QPushButton {
-        background-color: #5c5c5c;
-        border: none;
-        border-radius: 5px;
-        padding: 6px 12px;
-        color: #f0f0f0;
-    }
-    QPushButton:hover {
-        background-color: #6d6d6d;
-    }
-    QPushButton:pressed {
-        background-color: #4d4d4d;
-    }
-    QListWidget::item {
-        padding: 6px;
-        margin: 2px;
-    }
-    QListWidget::item:selected {
-        background-color: #505050;
-        color: #ffffff;
-    }
-    QLabel {
-        color: #bbbbbb;
-        padding: 2px;
-    }
-    QCheckBox::indicator {
-        width: 16px;
-        height: 16px;
-        border: 1px solid #777;
-        border-radius: 3px;
-        background-color: #444;
-    }
-    QCheckBox::indicator:unchecked {
-    }
-    QCheckBox::indicator:checked {
-        background-color: #4CAF50;
-        border: 1px solid #4CAF50;
-        image: url(data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0cDovL3d3dy53My5vcmcvMjAwMC9zdmciIHZpZXdCb3g9IjAgMCAyNCAyNCI+PHBhdGggZmlsbD0id2hpdGUiIGQ9Ik05IDE2LjIwNkw1LjQxNCAxMi42MkEwLjg1NyAwLjg1NyAwIDAwNC4yNjkgMTMuMjk0TDUuNDIgMTQuNjQ5TCA4LjgxMiAxOC4xODZMMTkuNzI1IDcuOTY0QTAuODY3IDAuODY3IDAgMDAxOS43NzQgNy45MDhBMS4wMzEgMS4wMzEgMCAwMDAyMC45MzUgOC43NUwyMS4wNzUgNy43NjRMMTkuOTUyIDYuODc3QTIuNzUgMi43NSAwIDAwMTkuOTQxIDYuODM2TDE3LjcwMyAzLjg2MkExLjYwMiAwIDAwMTUuNTY1IDMuNjM0TDEwLjI0MiA1LjE5TDkgNS42MzdMOSA2LjA3NUwxNS43NjQgMTQuMTIzTDEzLjA4IDE4LjExOEwxMC4zMDYgMTQuOTc1TDkgMTYuMjA2eiIvPjwvc3ZnPg==);
-    }
-    """
-    app.setStyleSheet(dark_stylesheet)
-
-    window = FavoritesApp()
+    parser = argparse.ArgumentParser(
+        description="QuickFavs",
+        epilog="While QuickFavs is running, 'open NAME', 'search TEXT' and 'list' are answered by that "
+               "instance, and starting it again just shows its window.")
+    parser.add_argument("command", nargs="?", choices=["show"], help="show the window (the default)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long each startup phase took")
+    parser.add_argument("--startup-budget-ms", type=float,
+                        help="quit once started; exit with status 1 if the first paint took longer than this")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="time the hot paths and write them to FILE on exit, for chrome://tracing or Perfetto")
+    args, qt_args = parser.parse_known_args()
+    if args.trace:
+        args.trace = os.path.abspath(args.trace)
+        tracer.enable(events=True)
+
+    profiler = StartupProfiler()
+    profiler.mark("imports")
+    app = QApplication(sys.argv[:1] + qt_args)
+    app.setStyleSheet(DARK_STYLESHEET)
+    profiler.mark("application")
+
+    window = FavoritesApp(profiler)
+
+    def on_startup_finished():
+        if args.profile_startup or args.startup_budget_ms is not None:
+            profiler.report()
+        if args.startup_budget_ms is not None:
+            first_paint_ms = profiler.elapsed_ms("first paint")
+            if first_paint_ms is None:
+                print("The window was not painted during startup.")
+                app.exit(1)
+            elif first_paint_ms > args.startup_budget_ms:
+                print(f"Time to first paint {first_paint_ms:.1f} ms is over the {args.startup_budget_ms:g} ms budget.")
+                app.exit(1)
+            else:
+                print(f"Time to first paint {first_paint_ms:.1f} ms is within the {args.startup_budget_ms:g} ms budget.")
+                app.quit()
+
+    window.startup_finished.connect(on_startup_finished)
+
+    def write_trace():
+        try:
+            tracer.write_chrome_trace(args.trace)
+        except OSError as e:
+            print(f"Error writing trace to {args.trace}: {e}")
+
+    if args.trace:
+        app.aboutToQuit.connect(write_trace)
 
     sys.exit(app.exec())
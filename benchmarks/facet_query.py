@@ -0,0 +1,58 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from favorites_facets import parse_query
+from favorites_index import SearchIndex
+
+TYPES = ("File", "Folder", "URL", "App")
+TAGS = ("work", "urgent", "old", "home", "docs", "media", "dev", "travel")
+QUERIES = (
+    "tag:work tag:urgent",
+    "tag:work tag:urgent type:url -tag:old",
+    "tag:work tag:urgent tag:dev -tag:old",
+    "tag:work tag:urgent type:url -tag:old docs",
+)
+
+
+def sample_favorites(count, seed=1):
+    # Up to three of eight tags each, so every tag is on about a fifth of
+    # the favorites: broad tags are the slow case for intersections.
+    rng = random.Random(seed)
+    return [{"label": f"Favorite {i}{' docs' if i % 7 == 0 else ''}", "path": f"/data/{i}",
+             "type": rng.choice(TYPES), "tags": rng.sample(TAGS, rng.randint(0, 3))}
+            for i in range(count)]
+
+
+def best_ms(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time facet queries on the search index.")
+    parser.add_argument("count", nargs="?", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    index = SearchIndex(sample_favorites(args.count))
+    print(f"{args.count} favorites")
+    for text in QUERIES:
+        query = parse_query(text)
+        select_ms, keys = best_ms(lambda: index.facets.select(query, index._keys), args.repeat)
+        search_ms, rows = best_ms(lambda: index.search(text), args.repeat)
+        # select is the facet evaluation alone; search also turns the keys
+        # into list rows and applies any remaining text.
+        print(f"  {text:45} {len(rows):6} rows  select {select_ms:6.3f} ms  search {search_ms:6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
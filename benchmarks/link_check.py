@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from favorites_links import LINK_BROKEN, LINK_OK, LINK_UNREACHABLE, HttpLinkChecker
+from standin import StandInServer
+
+# Each link's path says how the stand-in server answers it and what the
+# checker should make of that.
+KINDS = (
+    ("ok", LINK_OK),
+    ("missing", LINK_BROKEN),
+    ("no-head", LINK_OK),
+    ("redirect", LINK_OK),
+    ("gone-after-redirect", LINK_BROKEN),
+    ("forbidden", LINK_OK),
+    ("drop", LINK_UNREACHABLE),
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check links against local stand-in servers and report the time taken and any wrong answers.")
+    parser.add_argument("count", nargs="?", type=int, default=2000)
+    parser.add_argument("--hosts", type=int, default=20, help="stand-in servers, each a host of its own")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--host-connections", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    servers = [StandInServer(args.latency_ms / 1000, args.fail_rate, seed=i).start() for i in range(args.hosts)]
+    expected = {}
+    for i in range(args.count):
+        kind, state = KINDS[i % len(KINDS)]
+        expected[servers[i % len(servers)].url(f"/{kind}/{i}")] = state
+    results = {}
+
+    async def run():
+        checker = HttpLinkChecker(concurrency=args.concurrency, host_connections=args.host_connections, timeout=5.0)
+        await checker.check_many(list(expected), lambda url, status: results.__setitem__(url, status))
+        checker.close()
+    started = time.perf_counter()
+    asyncio.run(run())
+    seconds = time.perf_counter() - started
+
+    wrong = [(url, status) for url, status in results.items() if status.state != expected[url]]
+    states = {}
+    for status in results.values():
+        states[status.state] = states.get(status.state, 0) + 1
+    print(f"{len(results)} links on {args.hosts} hosts in {seconds:.2f} s ({len(results) / seconds:.0f} links/s), "
+          f"{sum(server.connections for server in servers)} connections; {states}")
+    if args.fail_rate:
+        print(f"{len(wrong)} answers differ from the kind of link, as expected with --fail-rate.")
+    else:
+        for url, status in wrong[:10]:
+            print(f"  expected {expected[url]}: {url} -> {status.state} {status.describe()}")
+        print(f"{len(wrong)} wrong answers.")
+    for server in servers:
+        server.stop()
+    return 1 if wrong and not args.fail_rate else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
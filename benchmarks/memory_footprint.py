@@ -0,0 +1,73 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from favorites_records import FavoriteRecord, FavoritesStore
+
+TYPES = ("File", "Folder", "URL", "App")
+TAGS = ("work", "home", "docs", "media", "dev", "mail", "news", "travel")
+
+
+def sample_file(count):
+    # favorites.json contents shaped like real favorites: distinct labels
+    # and paths, a few types and a small vocabulary of tags.
+    favorites = []
+    for i in range(count):
+        f_type = TYPES[i % len(TYPES)]
+        if f_type == "URL":
+            path = f"https://site{i % 5000}.example.com/page/{i}"
+        else:
+            path = f"C:\\Users\\User\\Documents\\folder{i % 300}\\item{i}.txt"
+        tags = [TAGS[(i + k) % len(TAGS)] for k in range(i % 3)]
+        favorites.append({"label": f"Favorite {i}", "path": path, "type": f_type, "tags": tags})
+    return json.dumps(favorites)
+
+
+def measure(build):
+    # Bytes still allocated once build() has returned.
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def load_dicts(data):
+    return json.loads(data)
+
+
+def load_store(data):
+    store = FavoritesStore()
+    store.extend([FavoriteRecord.from_dict(item_data, store.new_id()) for item_data in json.loads(data)])
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory used per favorite: list of dicts vs. record store.")
+    parser.add_argument("count", nargs="?", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    data = sample_file(args.count)
+    dicts, dict_bytes = measure(lambda: load_dicts(data))
+    del dicts
+    store, store_bytes = measure(lambda: load_store(data))
+    del store
+
+    # Both hold the same label and path strings; the difference is the
+    # container around them and the shared type and tag strings.
+    print(f"{args.count} favorites")
+    print(f"  list of dicts:  {dict_bytes / 2**20:8.1f} MiB  {dict_bytes / args.count:6.0f} B/favorite")
+    print(f"  record store:   {store_bytes / 2**20:8.1f} MiB  {store_bytes / args.count:6.0f} B/favorite")
+    print(f"  saved:          {(dict_bytes - store_bytes) / args.count:6.0f} B/favorite "
+          f"({1 - store_bytes / dict_bytes:.0%})")
+
+
+if __name__ == "__main__":
+    main()
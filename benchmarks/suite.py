@@ -0,0 +1,262 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+THRESHOLDS_FILE = os.path.join(ROOT, "benchmarks", "thresholds.json")
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+SIZE_TIMEOUT = 1800
+MUTATIONS = 50
+KEYSTROKE_REPEAT = 3
+QUERY = "favorite 4242"
+FACET_QUERY = "tag:work tag:urgent -tag:old docs"
+TYPES = ("File", "Folder", "URL", "App")
+TAGS = ("work", "urgent", "old", "home", "docs", "media", "dev", "travel")
+
+
+def sample_favorites(count, seed=1):
+    # The same collection for the same size on every run: mostly links, a
+    # quarter local paths (which do not exist, so the health check finds
+    # them missing), up to three of eight tags each.
+    rng = random.Random(seed)
+    favorites = []
+    for i in range(count):
+        f_type = TYPES[i % len(TYPES)]
+        if f_type == "URL":
+            path = f"https://site{i % 5000}.example.com/page/{i}"
+        else:
+            path = os.path.join(tempfile.gettempdir(), "quickfavs-benchmark-missing", f"folder{i % 300}", f"item{i}")
+        favorites.append({"label": f"Favorite {i}", "path": path, "type": f_type,
+                          "tags": rng.sample(TAGS, rng.randint(0, 3))})
+    return favorites
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak / (2**20 if sys.platform == 'darwin' else 2**10)
+
+
+def timed_ms(function):
+    started = time.perf_counter()
+    function()
+    return (time.perf_counter() - started) * 1000
+
+
+def summarize(name, samples):
+    return {f"{name}_mean_ms": sum(samples) / len(samples), f"{name}_max_ms": max(samples)}
+
+
+def run_size(count, backend):
+    # Runs in its own process (see main), in a scratch directory, so every
+    # size starts cold and its peak memory is its own.
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    scratch = tempfile.mkdtemp(prefix="quickfavs-benchmark-")
+    os.chdir(scratch)
+    sys.path.insert(0, ROOT)
+    settings = {"storage_backend": backend, "fetch_favicons": False, "check_links": False, "search_mode": "substring"}
+    with open("settings.json", "w", encoding="utf-8") as f:
+        json.dump(settings, f)
+    with open("favorites.json", "w", encoding="utf-8") as f:
+        json.dump(sample_favorites(count), f)
+    results = {}
+
+    from favorites_core import FavoritesCore
+
+    core = FavoritesCore(dict(settings))
+    results["core_load_ms"] = timed_ms(core.load)
+    core.close()
+    # Closing wrote the snapshot cache; the window starts without it, so
+    # load_ms stays the time of a cold start.
+    os.remove("favorites.json.cache")
+
+    from PyQt6.QtWidgets import QApplication
+
+    import QuickFavs
+
+    app = QApplication(sys.argv[:1])
+    started = time.perf_counter()
+    window = QuickFavs.FavoritesApp()
+    while window.loading:
+        app.processEvents()
+    results["load_ms"] = (time.perf_counter() - started) * 1000
+    results["load_peak_rss_mb"] = peak_rss_mb()
+
+    # Keystrokes: each prefix of the query, searched and applied to the
+    # list the way the search pipeline applies its first chunk. The query
+    # is typed KEYSTROKE_REPEAT times and each prefix keeps its best time,
+    # which keeps one-off stalls out of the comparison.
+    proxy = window.list_model
+    for name, text, fuzzy in (("keystroke", QUERY, False), ("fuzzy_keystroke", QUERY, True),
+                              ("facet_keystroke", FACET_QUERY, False)):
+        samples = [float("inf")] * len(text)
+        for _ in range(KEYSTROKE_REPEAT):
+            for end in range(1, len(text) + 1):
+                samples[end - 1] = min(samples[end - 1],
+                                       timed_ms(lambda: proxy.set_filter_text(text[:end], fuzzy)))
+        results.update(summarize(name, samples))
+    proxy.set_filter_text("1", False)
+
+    # Mutations, with a filter active so the proxy has work to do. The
+    # storage writes happen behind them and are timed by the flush below.
+    rng = random.Random(2)
+    added = []
+    samples = []
+    for i in range(MUTATIONS):
+        item_data = {"label": f"Added {i}", "path": f"https://added{i}.example.com", "type": "URL", "tags": ["work"]}
+        samples.append(timed_ms(lambda: added.append(window.add_favorite(item_data))))
+    results.update(summarize("add", samples))
+
+    samples = []
+    for record in added:
+        item_data = dict(record, label=record['label'] + " edited", tags=[rng.choice(TAGS)])
+
+        def update():
+            window.tray_menu.item_updated(record, window.favorites_model.update_favorite(record.id, item_data))
+        samples.append(timed_ms(update))
+    results.update(summarize("update", samples))
+
+    samples = [timed_ms(lambda: window.remove_favorite(window.favorites[rng.randrange(len(window.favorites))].id))
+               for _ in range(MUTATIONS)]
+    results.update(summarize("remove", samples))
+    results["flush_ms"] = timed_ms(lambda: window.save_queue.flush(wait=True))
+
+    # Saving everything at once, as after a load that assigned ids.
+    window.save_queue.submit_snapshot(list(window.favorites))
+    results["save_all_ms"] = timed_ms(lambda: window.save_queue.flush(wait=True))
+
+    # Opening the tray's tag listing and its biggest group from scratch.
+    tray = window.tray_menu
+
+    def open_tray():
+        tray.dirty_listings = {"type", "tag"}
+        tray.built_groups.clear()
+        tray._populate_listing("tag")
+        tray._populate_group(max((group for group in tray.counts if group[0] == "tag"), key=tray.counts.get))
+    results["tray_open_ms"] = timed_ms(open_tray)
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    app.aboutToQuit.emit()
+
+    # The window wrote the cache again on its way out; a load from it.
+    core = FavoritesCore(dict(settings))
+    results["warm_core_load_ms"] = timed_ms(core.load)
+    core.close()
+    os.chdir(ROOT)
+    shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_thresholds(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(baseline, current, thresholds):
+    # A metric regresses when it grew by more than its max_ratio and by more
+    # than min_delta, so that tiny timings do not trip on noise. Returns the
+    # list of regressions.
+    default = thresholds.get("default", {})
+    regressions = []
+    for size, metrics in current["results"].items():
+        old_metrics = baseline["results"].get(size)
+        if not old_metrics:
+            continue
+        for metric, value in sorted(metrics.items()):
+            old = old_metrics.get(metric)
+            if value is None or not old:
+                continue
+            limit = dict(default, **thresholds.get("metrics", {}).get(metric, {}))
+            ratio = value / old
+            regressed = ratio > limit.get("max_ratio", 1.2) and value - old > limit.get("min_delta", 0)
+            print(f"{size:>8} {metric:28} {old:10.2f} -> {value:10.2f}  x{ratio:5.2f}"
+                  f"{'  REGRESSION' if regressed else ''}")
+            if regressed:
+                regressions.append((size, metric, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the hot paths of QuickFavs on synthetic collections and compare runs.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated collection sizes (1000000 takes several minutes)")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--output", help=f"where to write the results (default: {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument("--baseline", help="results to compare this run against")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="only compare two stored results")
+    parser.add_argument("--thresholds", default=THRESHOLDS_FILE)
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        print(json.dumps(run_size(args.worker, args.backend)))
+        return 0
+
+    thresholds = load_thresholds(args.thresholds)
+    if args.compare:
+        with open(args.compare[0], 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.compare[1], 'r', encoding='utf-8') as f:
+            current = json.load(f)
+        return 1 if compare(baseline, current, thresholds) else 0
+
+    commit = git_commit()
+    current = {
+        "commit": commit,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "results": {},
+    }
+    for size in (int(size) for size in args.sizes.split(",")):
+        print(f"Running {size} favorites...", flush=True)
+        worker = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", str(size),
+                                 "--backend", args.backend],
+                                capture_output=True, text=True, timeout=SIZE_TIMEOUT)
+        if worker.returncode != 0:
+            print(worker.stderr)
+            print(f"The run with {size} favorites failed.")
+            return 2
+        # Qt and the app print to stdout as well; the results are the last line.
+        current["results"][str(size)] = results = json.loads(worker.stdout.strip().splitlines()[-1])
+        for metric, value in sorted(results.items()):
+            print(f"  {metric:28} {value:10.2f}" if value is not None else f"  {metric:28} {'-':>10}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=4)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        return 1 if compare(baseline, current, thresholds) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import os
+import time
+
+from favorites_icons import LruCache
+from favorites_trace import span
+
+BROWSE_CACHE_ENTRIES = 200_000
+BROWSE_PROGRESS_EVERY = 2000
+BROWSE_RECHECK_SECONDS = 2.0
+
+
+class DirectoryListing:
+    # One directory's entries as (name, is_dir), folders first and then by
+    # name ignoring case, with the directory's mtime from before it was read
+    # and the last time that mtime was confirmed.
+    __slots__ = ("path", "mtime_ns", "entries", "checked")
+
+    def __init__(self, path, mtime_ns, entries):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.entries = entries
+        self.checked = time.monotonic()
+
+    def entry_path(self, name):
+        return os.path.join(self.path, name)
+
+
+def list_directory(path, on_progress=None):
+    # Reads path with os.scandir; d_type answers is_dir() without a stat on
+    # most systems. The mtime is taken first, so a change made while reading
+    # leaves the listing looking stale rather than current. on_progress(count)
+    # is called every BROWSE_PROGRESS_EVERY entries. Raises OSError.
+    with span("browse.list"):
+        mtime_ns = os.stat(path).st_mtime_ns
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                entries.append((entry.name, is_dir))
+                if on_progress is not None and len(entries) % BROWSE_PROGRESS_EVERY == 0:
+                    on_progress(len(entries))
+        entries.sort(key=_entry_order)
+    return DirectoryListing(path, mtime_ns, entries)
+
+
+def _entry_order(entry):
+    return (not entry[1], entry[0].casefold(), entry[0])
+
+
+def directory_mtime(path):
+    # None when the directory cannot be read any more.
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class DirectoryCache:
+    # Listings by directory, bounded by their total number of entries so a
+    # few huge folders cannot crowd out memory. A listing stays good while
+    # its directory's mtime does not move: needs_check() says when to look
+    # again (the stat belongs on a worker thread), is_current() judges the
+    # answer. Not thread-safe.
+
+    def __init__(self, max_entries=BROWSE_CACHE_ENTRIES, recheck_seconds=BROWSE_RECHECK_SECONDS):
+        self.listings = LruCache(max_entries)
+        self.recheck_seconds = recheck_seconds
+
+    def __len__(self):
+        return len(self.listings)
+
+    def __contains__(self, path):
+        return _cache_key(path) in self.listings
+
+    def get(self, path):
+        return self.listings.get(_cache_key(path))
+
+    def put(self, listing):
+        self.listings.put(_cache_key(listing.path), listing, len(listing.entries) + 1)
+
+    def drop(self, path):
+        return self.listings.pop(_cache_key(path))
+
+    def needs_check(self, listing):
+        return time.monotonic() - listing.checked >= self.recheck_seconds
+
+    def is_current(self, listing, mtime_ns):
+        listing.checked = time.monotonic()
+        return mtime_ns is not None and mtime_ns == listing.mtime_ns
+
+
+def _cache_key(path):
+    return os.path.normcase(os.path.normpath(path))
@@ -0,0 +1,430 @@
+import json
+import os
+import re
+import sys
+
+from favorites_facets import parse_query
+from favorites_index import SearchIndex, fuzzy_pattern, fuzzy_query, search_text_for
+from favorites_merge import merge_order, plan_merge
+from favorites_records import FavoriteRecord, FavoritesStore
+from favorites_stats import LaunchStats
+from favorites_storage import WriteBehindQueue, open_storage, write_file_atomic
+from favorites_trace import span, tracer
+
+FAVORITES_FILE = 'favorites.json'
+SETTINGS_FILE = 'settings.json'
+DATABASE_FILE = 'favorites.db'
+LAUNCH_STATS_FILE = 'launch_stats.json'
+ICON_CACHE_DIR = 'icon_cache'
+LINK_CACHE_FILE = 'link_cache.json'
+
+DEFAULT_SETTINGS = {
+    "start_on_boot": False,
+    "start_in_tray": False,
+    "search_mode": "substring",
+    "storage_backend": "json",
+    "fetch_favicons": False,
+    "check_links": False,
+}
+
+FAVORITE_TYPES = ("File", "Folder", "URL", "App")
+APP_EXTENSIONS = ('.exe', '.lnk', '.bat', '.cmd')
+
+def load_settings(path=SETTINGS_FILE):
+    if not os.path.exists(path):
+        return dict(DEFAULT_SETTINGS)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+            for key, value in DEFAULT_SETTINGS.items():
+                settings.setdefault(key, value)
+            return settings
+    except json.JSONDecodeError:
+        print(f"Warning: Could not decode {path}. Returning default settings.")
+        return dict(DEFAULT_SETTINGS)
+    except Exception as e:
+        print(f"Error loading settings: {e}. Returning default settings.")
+        return dict(DEFAULT_SETTINGS)
+
+def save_settings(settings, path=SETTINGS_FILE):
+    try:
+        write_file_atomic(path, json.dumps(settings, indent=4, ensure_ascii=False).encode('utf-8'))
+    except Exception as e:
+        print(f"Error saving settings: {e}")
+
+def format_favorite(item_data):
+    tags_str = f" [{', '.join(item_data['tags'])}]" if item_data.get('tags') else ""
+    return f"{item_data['label']} ({item_data['type']}){tags_str}"
+
+def is_url(path):
+    return re.match(r'[A-Za-z][A-Za-z0-9+.-]*://', path) is not None
+
+def guess_type(path, is_dir=None):
+    # Pass is_dir when it is already known (or must not be looked up on the
+    # calling thread).
+    if is_url(path):
+        return "URL"
+    if os.path.isdir(path) if is_dir is None else is_dir:
+        return "Folder"
+    if path.lower().endswith(APP_EXTENSIONS):
+        return "App"
+    return "File"
+
+def new_favorite(label, path, f_type=None, tags=()):
+    label = label.strip()
+    path = path.strip()
+    if not label or not path:
+        raise ValueError("A favorite needs a name and a path or URL.")
+    f_type = f_type or guess_type(path)
+    if f_type not in FAVORITE_TYPES:
+        raise ValueError(f"Unknown type '{f_type}'. Expected one of: {', '.join(FAVORITE_TYPES)}.")
+    return {"label": label, "path": path, "type": f_type, "tags": [tag.strip() for tag in tags if tag.strip()]}
+
+def favorite_from_request(args, options):
+    if len(args) != 2:
+        raise ValueError("add needs a name and a path or URL.")
+    return new_favorite(args[0], args[1], options.get("type"), options.get("tags", ()))
+
+def open_target(item_data):
+    # Hands a favorite to the operating system. Types other than the four
+    # known ones are left alone, as they always have been.
+    path = item_data['path']
+    if item_data['type'] == 'URL':
+        import webbrowser
+        webbrowser.open(path)
+    elif item_data['type'] in ('File', 'Folder', 'App'):
+        if hasattr(os, 'startfile'):
+            os.startfile(path)
+        else:
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            import subprocess
+
+            command = "open" if sys.platform == 'darwin' else "xdg-open"
+            try:
+                subprocess.Popen([command, path])
+            except FileNotFoundError:
+                raise OSError(f"'{command}' is not installed")
+
+
+class FavoritesCore:
+    # The favorites with their search index, launch statistics and storage,
+    # without any Qt. The CLI uses it directly; the GUI's model wraps the
+    # mutators below with its row signals. Favorites are FavoriteRecords in
+    # a FavoritesStore and are changed by id; every mutation keeps the store
+    # and the index in step and queues the matching storage change, which
+    # names the favorite by id too.
+    # Without an index (indexed=False), searches scan the list instead, which
+    # is cheaper for a one-shot lookup than building the index first.
+    # Favorites are opened through a Launcher with the given opener;
+    # on_launch_finished(item_data, error, future) is called from its worker
+    # threads. The launcher and the storage writer thread are made on first
+    # use, so a one-shot command that only reads starts neither (nor
+    # imports what they need).
+
+    def __init__(self, settings=None, indexed=True, on_save_state_changed=None,
+                 opener=open_target, on_launch_finished=None):
+        self.settings = load_settings() if settings is None else settings
+        self.storage = open_storage(self.settings.get("storage_backend"), FAVORITES_FILE, DATABASE_FILE)
+        self.favorites = FavoritesStore()
+        self.unsaved_ids = False
+        self.search_index = SearchIndex() if indexed else None
+        self.launch_stats = LaunchStats(LAUNCH_STATS_FILE)
+        self._on_save_state_changed = on_save_state_changed
+        self._save_queue = None
+        self._opener = opener
+        self._on_launch_finished = on_launch_finished
+        self._launcher = None
+
+    @property
+    def save_queue(self):
+        if self._save_queue is None:
+            self._save_queue = WriteBehindQueue(self.storage, on_state_changed=self._on_save_state_changed)
+        return self._save_queue
+
+    @property
+    def launcher(self):
+        if self._launcher is None:
+            from favorites_launcher import Launcher
+
+            self._launcher = Launcher(self._opener, on_result=self._on_launch_finished)
+        return self._launcher
+
+    def load_async(self):
+        # Runs on the storage writer thread; returns a future of the list.
+        return self.save_queue.load()
+
+    def load(self, save_ids=True):
+        # On this thread: nothing can have been queued for the storage yet.
+        with span("load.storage"):
+            favorites = self.storage.load()
+        self.launch_stats.load()
+        self.extend(favorites)
+        self.finish_load(save_ids)
+
+    def finish_load(self, save_ids=True):
+        # Favorites saved before they had ids get them when loaded; saving
+        # once makes the ids stick. A one-shot command that only reads
+        # passes save_ids=False and leaves the file as it is; ids it hands
+        # out are only needed while it runs.
+        if self.unsaved_ids and save_ids:
+            self.unsaved_ids = False
+            self.save_queue.submit_snapshot(list(self.favorites))
+
+    def check_external_change(self):
+        # A future of what another program changed in the stored favorites
+        # (a FavoritesDiff), or of None. Read on the writer thread.
+        return self.save_queue.call(self.storage.read_external_change)
+
+    def plan_external_merge(self, diff):
+        # What to remove, update and add here to take in diff without losing
+        # local edits (see plan_merge). Once applied, external_order() tells
+        # how to reorder the favorites, and save_external_merge() writes the
+        # result over the changed file.
+        return plan_merge(diff, self.favorites)
+
+    def external_order(self, plan):
+        # The ids of all favorites in the order the other program gave them,
+        # or None when it did not reorder them or they already come in it.
+        if plan.order is None:
+            return None
+        return merge_order(plan.order, [record.id for record in self.favorites])
+
+    def save_external_merge(self):
+        # Also when nothing changed here: the file may lack the ids kept in
+        # memory. The storage skips a write of what it holds.
+        self.save_queue.submit_snapshot(list(self.favorites))
+
+    def refresh_cache(self):
+        # Once loaded, writes a missing or stale snapshot cache from the index
+        # just built, in the background; for long-running processes, as a
+        # one-shot command would not live to finish it. While ids are being
+        # saved it is left to write_cache().
+        if self.search_index is not None and not self.save_queue.has_pending():
+            self.storage.write_cache(list(self.favorites), self.search_index, background=True)
+
+    def write_cache(self):
+        # After the storage is closed, so favorites.json is final.
+        if self.search_index is not None:
+            self.storage.write_cache(list(self.favorites), self.search_index)
+
+    def close(self):
+        if self._launcher is not None:
+            self._launcher.shutdown()
+        self.launch_stats.save()
+        if self._save_queue is not None:
+            self._save_queue.close()
+        else:
+            self.storage.close()
+        self.write_cache()
+
+    def extend(self, items):
+        # Appends already stored favorites, e.g. while loading. Returns them
+        # as records.
+        records, assigned = self._records(items)
+        if assigned:
+            self.unsaved_ids = True
+        cached_index, self.storage.cached_index = self.storage.cached_index, None
+        if cached_index is not None and self.search_index is not None and not self.favorites:
+            self.search_index.restore(cached_index)
+        self._append(records)
+        return records
+
+    def add(self, item_data):
+        return self.add_many([item_data])[0]
+
+    def add_many(self, items):
+        # New favorites, saved together in one write. Returns them as records.
+        records, _ = self._records(items)
+        self._append(records)
+        self.save_queue.submit([("add", record) for record in records])
+        return records
+
+    def update(self, record_id, item_data):
+        # Returns the row and the new record.
+        record = FavoriteRecord.from_dict(item_data, record_id)
+        row = self.favorites.row_of(record_id)
+        self.favorites.replace(record)
+        if self.search_index is not None:
+            self.search_index.update(row, record)
+        self.save_queue.submit([("update", record_id, record)])
+        return row, record
+
+    def remove(self, record_id):
+        record = self.favorites.get(record_id)
+        self.remove_many([record_id])
+        return record
+
+    def remove_many(self, record_ids):
+        # One index update and one write for all of them. Returns the rows
+        # they had, in the order of record_ids.
+        rows = self.favorites.remove_many(record_ids)
+        if self.search_index is not None:
+            self.search_index.remove_many(rows)
+        self.save_queue.submit([("delete", record_id) for record_id in record_ids])
+        return rows
+
+    def reorder(self, record_ids):
+        # Not saved here; save_external_merge() writes the new order with
+        # the rest.
+        if self.search_index is not None:
+            rows = {record.id: row for row, record in enumerate(self.favorites)}
+            self.search_index.reorder([rows[record_id] for record_id in record_ids])
+        self.favorites.reorder(record_ids)
+
+    def search(self, text, fuzzy=False):
+        if self.search_index is not None:
+            return self.search_index.fuzzy_search(text) if fuzzy else self.search_index.search(text)
+        facet_query = parse_query(text)
+        rows = enumerate(self.favorites)
+        if facet_query.has_facets:
+            rows = [(row, item_data) for row, item_data in rows if facet_query.matches(item_data)]
+            text = facet_query.text
+        if fuzzy:
+            # Unranked: ranking needs the launch statistics held by the index.
+            query = fuzzy_query(text)
+            pattern = fuzzy_pattern(query) if query else None
+            return [row for row, item_data in rows
+                    if pattern is None or pattern.search(search_text_for(item_data))]
+        search_text = text.lower()
+        return [row for row, item_data in rows if search_text in search_text_for(item_data)]
+
+    def find(self, text):
+        # An exact name wins, then the first substring match in list order,
+        # then the best fuzzy match.
+        if not text.strip():
+            return -1
+        wanted = text.strip().casefold()
+        for row, item_data in enumerate(self.favorites):
+            if item_data['label'].casefold() == wanted:
+                return row
+        rows = self.search(text) or self.search(text, fuzzy=True)
+        return rows[0] if rows else -1
+
+    def record_with_label(self, label):
+        # Destructive commands only act on an exact, unambiguous name.
+        wanted = label.strip().casefold()
+        records = [record for record in self.favorites if record['label'].casefold() == wanted]
+        if not records:
+            raise ValueError(f"No favorite is named '{label}'.")
+        if len(records) > 1:
+            raise ValueError(f"{len(records)} favorites are named '{label}'.")
+        return records[0]
+
+    def record_launch(self, item_data):
+        count, last_opened = self.launch_stats.record(item_data['path'])
+        if self.search_index is not None:
+            row = self.favorites.row_of(item_data['id'])
+            if row >= 0:
+                self.search_index.record_launch(row, count, last_opened)
+
+    def rows_with_tag(self, tag):
+        wanted = tag.strip().casefold()
+        if self.search_index is not None:
+            return self.search_index.facet_positions("tag", wanted)
+        return [row for row, item_data in enumerate(self.favorites)
+                if any(t.casefold() == wanted for t in item_data.get('tags', []))]
+
+    def tags(self):
+        return sorted({tag for item_data in self.favorites for tag in item_data.get('tags', [])}, key=str.casefold)
+
+    def launch(self, item_data):
+        # Returns a future that settles once the favorite was handed over,
+        # failed to open or timed out.
+        self.record_launch(item_data)
+        return self.launcher.submit(item_data)
+
+    def launch_entry(self, item_data):
+        # For paths that are not favorites, such as the contents of a
+        # browsed folder: opened the same way, without launch statistics.
+        return self.launcher.submit(item_data)
+
+    def launch_many(self, items):
+        for item_data in items:
+            self.record_launch(item_data)
+        return self.launcher.submit_many(items)
+
+    def run_command(self, command, args=(), options=None):
+        # Commands shared by the CLI and the single-instance server (see
+        # favorites_ipc). Problems the user can fix raise ValueError.
+        options = options or {}
+        text = " ".join(str(arg) for arg in args)
+        if command == "list":
+            return list(self.favorites)
+        if command == "search":
+            return self.favorites.records_at(self.search(text, options.get("fuzzy", False)))
+        if command == "open":
+            row = self.find(text)
+            if row < 0:
+                raise ValueError(f"No favorite matches '{text}'.")
+            item_data = self.favorites[row]
+            try:
+                self.launch(item_data).result()
+            except FileNotFoundError:
+                raise ValueError(f"Target not found: '{item_data['path']}'")
+            except Exception as e:
+                raise ValueError(f"Could not open '{item_data['path']}': {e}")
+            return item_data
+        if command == "add":
+            return self.add(favorite_from_request(args, options))
+        if command == "remove":
+            return self.remove(self.record_with_label(text).id)
+        if command == "import":
+            from favorites_import import import_file
+
+            try:
+                items, stats = import_file(text, [item_data['path'] for item_data in self.favorites],
+                                           options.get("format"))
+            except (OSError, ValueError) as e:
+                raise ValueError(f"Could not import '{text}': {e}")
+            self.add_many(items)
+            return stats
+        if command == "export":
+            from favorites_import import export_file
+
+            try:
+                count = export_file(self.favorites, text, options.get("format"))
+            except (OSError, ValueError) as e:
+                raise ValueError(f"Could not export to '{text}': {e}")
+            return {"exported": count, "path": text}
+        if command == "stats":
+            # Timings are only collected once something asks for them.
+            if options.get("enable"):
+                tracer.enable()
+            return tracer.snapshot()
+        raise ValueError(f"Unknown command '{command}'.")
+
+    def _records(self, items):
+        # Favorites that were stored with an id keep it; new ones, and copies
+        # of an id already taken, get a fresh one. Returns the records and
+        # how many ids were handed out.
+        records = []
+        taken = set()
+        assigned = 0
+        for item_data in items:
+            record_id = item_data.get('id')
+            if type(record_id) is not int or record_id in taken or self.favorites.has_id(record_id):
+                record_id = self.favorites.new_id()
+                while record_id in taken:
+                    record_id = self.favorites.new_id()
+                assigned += 1
+            elif isinstance(item_data, FavoriteRecord):
+                records.append(item_data)
+                taken.add(record_id)
+                continue
+            records.append(FavoriteRecord.from_dict(item_data, record_id))
+            taken.add(record_id)
+        return records, assigned
+
+    def _append(self, records):
+        first = len(self.favorites)
+        self.favorites.extend(records)
+        if self.search_index is not None:
+            self.search_index.extend(records)
+            for row, record in enumerate(records, first):
+                self._apply_launch_stats(row, record)
+
+    def _apply_launch_stats(self, row, record):
+        count, last_opened = self.launch_stats.get(record['path'])
+        if count:
+            self.search_index.record_launch(row, count, last_opened)
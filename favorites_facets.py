@@ -0,0 +1,201 @@
+import re
+from array import array
+from functools import lru_cache
+
+FACET_FIELDS = ("tag", "type")
+
+_FACET_TERM = re.compile(r'(?<!\S)(-?)(tag|type):(?:"([^"]*)"|(\S+))', re.IGNORECASE)
+
+
+class FacetQuery:
+    # A parsed search: "tag:work tag:urgent type:url -tag:old docs" needs
+    # both tags, one of the types and not the excluded tag, and leaves
+    # "docs" to the text search. Values are casefolded. Queries come from
+    # parse_query's cache, so they are shared and must not be changed.
+
+    def __init__(self, text, tags=(), exclude_tags=(), types=(), exclude_types=()):
+        self.text = text
+        self.tags = tags
+        self.exclude_tags = exclude_tags
+        self.types = types
+        self.exclude_types = exclude_types
+        self.has_facets = bool(tags or exclude_tags or types or exclude_types)
+
+    def matches(self, item_data):
+        # For favorites that are not in a FacetIndex.
+        f_type = item_data['type'].casefold()
+        tags = {tag.casefold() for tag in item_data.get('tags', [])}
+        return (all(tag in tags for tag in self.tags)
+                and not any(tag in tags for tag in self.exclude_tags)
+                and (not self.types or f_type in self.types)
+                and f_type not in self.exclude_types)
+
+
+@lru_cache(maxsize=64)
+def parse_query(text):
+    # Facet terms may start anywhere a word starts; a value with spaces is
+    # quoted: tag:"long name". Text without terms is left exactly as typed.
+    terms = {("", "tag"): [], ("-", "tag"): [], ("", "type"): [], ("-", "type"): []}
+    for m in _FACET_TERM.finditer(text):
+        value = m.group(3) if m.group(3) is not None else m.group(4)
+        if value.strip():
+            terms[(m.group(1), m.group(2).lower())].append(value.strip().casefold())
+    if not any(terms.values()):
+        return FacetQuery(text)
+    return FacetQuery(" ".join(_FACET_TERM.sub(" ", text).split()),
+                      tuple(terms[("", "tag")]), tuple(terms[("-", "tag")]),
+                      frozenset(terms[("", "type")]), frozenset(terms[("-", "type")]))
+
+
+def facet_term(field, value):
+    # The query term that selects value, e.g. for a dropdown entry.
+    value = value.replace('"', '')
+    if any(c.isspace() for c in value):
+        return f'{field}:"{value}"'
+    return f"{field}:{value}"
+
+
+class FacetIndex:
+    # Tag and type postings: for every casefolded value the set of document
+    # keys that have it, so a query is a few set intersections instead of a
+    # scan, and the size of a set is the live count shown next to the value.
+    # Each key's own values are kept as well, which lets a removal or an edit
+    # touch only that key's sets. The first spelling seen is the one shown.
+    # Keys without any tag are kept in a set of their own, untagged.
+
+    def __init__(self):
+        self.postings = {field: {} for field in FACET_FIELDS}
+        self.names = {field: {} for field in FACET_FIELDS}
+        self.untagged = set()
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, key, item_data):
+        f_type, tags = self.remember(key, item_data)
+        self._add_value("type", f_type.casefold(), f_type, key)
+        for value, name in tags.items():
+            self._add_value("tag", value, name, key)
+        if not tags:
+            self.untagged.add(key)
+
+    def remember(self, key, item_data):
+        # Keeps key's values without adding it to the postings, for keys
+        # whose postings are restored with install().
+        f_type = item_data['type']
+        tags = {tag.casefold(): tag for tag in item_data.get('tags', [])}
+        self._values[key] = (f_type.casefold(), tuple(tags))
+        return f_type, tags
+
+    def remember_values(self, key, values):
+        # The same with the values pack() kept for the key.
+        self._values[key] = values
+
+    def reindex(self, names):
+        # Adds every remembered key to the postings; names are the shown
+        # spellings by field and value, as kept by pack().
+        for key, (f_type, tags) in self._values.items():
+            self._add_value("type", f_type, names["type"].get(f_type, f_type), key)
+            for value in tags:
+                self._add_value("tag", value, names["tag"].get(value, value), key)
+            if not tags:
+                self.untagged.add(key)
+
+    def pack(self, keys):
+        # The postings as arrays of 64-bit keys, which marshal reads and
+        # writes far faster than sets, and the values of the given keys in
+        # that order. unpack_facets() turns the arrays back into sets.
+        return {"postings": {field: {value: array('q', keys).tobytes() for value, keys in postings.items()}
+                             for field, postings in self.postings.items()},
+                "names": self.names,
+                "untagged": array('q', self.untagged).tobytes(),
+                "values": [self._values[key] for key in keys]}
+
+    def install(self, postings, names, untagged):
+        self.postings = postings
+        self.names = names
+        self.untagged = untagged
+
+    def rekey(self, new_keys):
+        # new_keys maps every key to the one it is known by from now on.
+        self.postings = {field: {value: {new_keys[key] for key in keys} for value, keys in postings.items()}
+                         for field, postings in self.postings.items()}
+        self.untagged = {new_keys[key] for key in self.untagged}
+        self._values = {new_keys[key]: values for key, values in self._values.items()}
+
+    def remove(self, key):
+        f_type, tags = self._values.pop(key)
+        self._remove_value("type", f_type, key)
+        for value in tags:
+            self._remove_value("tag", value, key)
+        if not tags:
+            self.untagged.discard(key)
+
+    def keys_with(self, field, value):
+        return self.postings[field].get(value, frozenset())
+
+    def counts(self, field):
+        # [(name, count)] sorted by name.
+        names = self.names[field]
+        return sorted(((names[value], len(keys)) for value, keys in self.postings[field].items()),
+                      key=lambda entry: entry[0].casefold())
+
+    def select(self, query, all_keys):
+        # The set of keys whose facets match; all_keys is only read for a
+        # query that excludes without including anything. The result may be
+        # one of the index's own sets, so it must not be changed.
+        included = [self.keys_with("tag", tag) for tag in query.tags]
+        if len(query.types) == 1:
+            included.append(self.keys_with("type", next(iter(query.types))))
+        elif query.types:
+            included.append(set().union(*(self.keys_with("type", f_type) for f_type in query.types)))
+        if included:
+            # Smallest first: every intersection only probes what is left.
+            included.sort(key=len)
+            keys = included[0]
+            for other in included[1:]:
+                keys = keys.intersection(other)
+        else:
+            keys = set(all_keys)
+        excluded = [self.keys_with("tag", tag) for tag in query.exclude_tags]
+        excluded.extend(self.keys_with("type", f_type) for f_type in query.exclude_types)
+        for other in excluded:
+            keys = keys.difference(other)
+        return keys
+
+    def matches(self, key, query):
+        f_type, tags = self._values[key]
+        return (all(tag in tags for tag in query.tags)
+                and not any(tag in tags for tag in query.exclude_tags)
+                and (not query.types or f_type in query.types)
+                and f_type not in query.exclude_types)
+
+    def _add_value(self, field, value, name, key):
+        keys = self.postings[field].get(value)
+        if keys is None:
+            self.postings[field][value] = {key}
+            self.names[field][value] = name
+        else:
+            keys.add(key)
+
+    def _remove_value(self, field, value, key):
+        keys = self.postings[field][value]
+        keys.discard(key)
+        if not keys:
+            del self.postings[field][value]
+            del self.names[field][value]
+
+
+def unpack_keys(data):
+    keys = array('q')
+    keys.frombytes(data)
+    return keys
+
+
+def unpack_facets(packed):
+    # (postings, names, untagged) for FacetIndex.install(), and the packed
+    # values.
+    return ({field: {value: set(unpack_keys(data)) for value, data in postings.items()}
+             for field, postings in packed["postings"].items()},
+            packed["names"], set(unpack_keys(packed["untagged"])), packed["values"])
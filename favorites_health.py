@@ -0,0 +1,114 @@
+import os
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from favorites_trace import tracer
+
+HEALTH_WORKERS = 16
+HEALTH_FILE = "file"
+HEALTH_FOLDER = "folder"
+HEALTH_MISSING = "missing"
+LOCAL_TYPES = ("File", "Folder", "App")
+
+
+def is_local(item_data):
+    return item_data['type'] in LOCAL_TYPES
+
+
+class PathHealth:
+    # Cached status (file, folder or missing) of local favorite paths. check()
+    # stats paths on a pool of threads, which also hides the latency of slow
+    # network shares, and remembers for every path the nearest existing
+    # directory whose changes can affect it, so a watcher can re-check only
+    # the paths under a directory that changed.
+
+    def __init__(self, max_workers=HEALTH_WORKERS):
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.status = {}
+        self.watch_dirs = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="favorites-health")
+
+    def get(self, path):
+        return self.status.get(path)
+
+    def is_missing(self, path):
+        return self.status.get(path) == HEALTH_MISSING
+
+    def directories(self):
+        with self.lock:
+            return set(self.watch_dirs)
+
+    def paths_in(self, directory):
+        with self.lock:
+            return list(self.watch_dirs.get(directory, ()))
+
+    def check(self, paths):
+        # Blocks until every path is stat'ed; meant for a worker thread.
+        # Returns {path: status} for the paths whose status changed, and the
+        # statistics of this check.
+        started = time.perf_counter()
+        paths = list(dict.fromkeys(paths))
+        directory_cache = {}
+        chunk = max(1, -(-len(paths) // self.max_workers))
+        futures = [self._executor.submit(self._check_many, paths[i:i + chunk], directory_cache)
+                   for i in range(0, len(paths), chunk)]
+        results = [result for future in futures for result in future.result()]
+
+        changed = {}
+        with self.lock:
+            for path, (status, watch_dir) in zip(paths, results):
+                if self.status.get(path) != status:
+                    changed[path] = status
+                self.status[path] = status
+                if watch_dir is not None:
+                    self.watch_dirs.setdefault(watch_dir, set()).add(path)
+        seconds = time.perf_counter() - started
+        if tracer.enabled:
+            tracer.record("health.check", started, started + seconds)
+        stats = {
+            "paths": len(paths),
+            "missing": sum(1 for status, _ in results if status == HEALTH_MISSING),
+            "seconds": seconds,
+            "per_second": len(paths) / seconds if seconds > 0 else 0.0,
+        }
+        return changed, stats
+
+    def mark_missing(self, path):
+        # For a launch that just failed with FileNotFoundError.
+        with self.lock:
+            if self.status.get(path) == HEALTH_MISSING:
+                return False
+            self.status[path] = HEALTH_MISSING
+            return True
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _check_many(self, paths, directory_cache):
+        return [self._check_one(path, directory_cache) for path in paths]
+
+    def _check_one(self, path, directory_cache):
+        try:
+            mode = os.stat(path).st_mode
+        except (OSError, ValueError):
+            status = HEALTH_MISSING
+        else:
+            status = HEALTH_FOLDER if stat.S_ISDIR(mode) else HEALTH_FILE
+        return status, self._watch_dir(os.path.dirname(os.path.abspath(path)), directory_cache)
+
+    def _watch_dir(self, directory, directory_cache):
+        # The shared cache is only ever filled with the same answers, so the
+        # workers can use it without a lock.
+        while True:
+            exists = directory_cache.get(directory)
+            if exists is None:
+                exists = directory_cache[directory] = os.path.isdir(directory)
+            if exists:
+                return directory
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None
+            directory = parent
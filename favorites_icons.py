@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from favorites_storage import write_file_atomic
+
+FAVICON_TIMEOUT = 5.0
+FAVICON_MAX_BYTES = 256 * 1024
+ICON_RETRY_SECONDS = 24 * 3600
+ICON_INDEX_FILE = 'index.json'
+
+
+def favicon_site(url):
+    # "scheme://host" of a web favorite, or None for anything else.
+    parts = urlsplit(url)
+    if parts.scheme.lower() not in ('http', 'https') or not parts.hostname:
+        return None
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+
+
+def icon_key(item_data):
+    # Favorites that look the same share a key: every folder, every file
+    # with the same extension, every page of a site. Apps carry their own
+    # icons, so each gets a key of its own.
+    f_type = item_data['type']
+    path = item_data['path']
+    if f_type == 'URL':
+        site = favicon_site(path)
+        return f"url:{site}" if site else "url:"
+    if f_type == 'Folder':
+        return "folder"
+    if f_type == 'App':
+        return f"app:{os.path.normcase(path)}"
+    return f"file:{os.path.splitext(path)[1].lower()}"
+
+
+class LruCache:
+    # Drops the least recently used entries once their sizes add up to more
+    # than max_size. Not thread-safe.
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, size):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self._entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_size and len(self._entries) > 1:
+            _, (_, dropped_size) = self._entries.popitem(last=False)
+            self.size -= dropped_size
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        self.size -= entry[1]
+        return entry[0]
+
+
+class IconDiskCache:
+    # Icon images in a directory, each in a file named after the SHA-256 of
+    # its bytes, so an icon shared by many keys is stored once and a damaged
+    # file is noticed on reading. An index maps each key to its hash, or to
+    # None when nothing was found; such keys are looked up again after
+    # retry_seconds. The index is written by save().
+
+    def __init__(self, directory, retry_seconds=ICON_RETRY_SECONDS):
+        self.directory = directory
+        self.retry_seconds = retry_seconds
+        self.lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._index = None
+        self._dirty = False
+
+    def lookup(self, key):
+        # Returns (found, data). found is False when the key has to be
+        # resolved again; data is None when the key is known to have no icon.
+        with self.lock:
+            entry = self._load_index().get(key)
+        if entry is None:
+            return False, None
+        digest, stored_at = entry
+        if digest is None:
+            return time.time() - stored_at < self.retry_seconds, None
+        try:
+            with open(self._blob_path(digest), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False, None
+        if hashlib.sha256(data).hexdigest() != digest:
+            return False, None
+        return True, data
+
+    def store(self, key, data):
+        digest = None
+        if data is not None:
+            digest = hashlib.sha256(data).hexdigest()
+            path = self._blob_path(digest)
+            with self._write_lock:
+                if not os.path.exists(path):
+                    os.makedirs(self.directory, exist_ok=True)
+                    write_file_atomic(path, data)
+        with self.lock:
+            self._load_index()[key] = [digest, time.time()]
+            self._dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._index).encode('utf-8')
+            self._dirty = False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_file_atomic(os.path.join(self.directory, ICON_INDEX_FILE), data)
+        except OSError as e:
+            print(f"Error saving icon cache index: {e}")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, f"{digest}.png")
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = {}
+            path = os.path.join(self.directory, ICON_INDEX_FILE)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if isinstance(index, dict):
+                    self._index = index
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read {path}: {e}. Icons will be looked up again.")
+        return self._index
+
+
+class FaviconFetcher:
+    # Where favicons come from. fetch(site) gets a "scheme://host" as
+    # returned by favicon_site() and returns the raw image bytes, or None.
+    # Called from worker threads.
+
+    def fetch(self, site):
+        raise NotImplementedError
+
+
+class HttpFaviconFetcher(FaviconFetcher):
+    # Asks the site for /favicon.ico. url_template can point elsewhere, e.g.
+    # at a local stand-in server: "http://127.0.0.1:8000/{host}.ico".
+
+    def __init__(self, url_template="{site}/favicon.ico", timeout=FAVICON_TIMEOUT, max_bytes=FAVICON_MAX_BYTES):
+        self.url_template = url_template
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+
+    def fetch(self, site):
+        import urllib.request
+
+        url = self.url_template.format(site=site, host=urlsplit(site).netloc)
+        request = urllib.request.Request(url, headers={"User-Agent": "QuickFavs"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read(self.max_bytes + 1)
+        except (OSError, ValueError):
+            return None
+        if not data or len(data) > self.max_bytes:
+            return None
+        return data
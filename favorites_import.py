@@ -0,0 +1,554 @@
+import codecs
+import csv
+import html
+import json
+import os
+import re
+import time
+from html.parser import HTMLParser
+from json.decoder import scanstring
+from urllib.parse import urlsplit, urlunsplit
+
+from favorites_core import FAVORITE_TYPES, guess_type, is_url
+
+IMPORT_FORMATS = ("html", "json", "csv")
+IMPORT_CHUNK_SIZE = 64 * 1024
+IMPORT_PROGRESS_EVERY = 1000
+JSON_MAX_TOKEN = 16 * 1024 * 1024
+FORMAT_EXTENSIONS = {".html": "html", ".htm": "html", ".json": "json", ".csv": "csv"}
+DEFAULT_PORTS = {"http": 80, "https": 443, "ftp": 21}
+
+_TOKEN = re.compile(r'[ \t\r\n]*(?:([{}\[\]:,])|"([^"\\]*(?:\\.[^"\\]*)*)"'
+                    r'|(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)|(true|false|null))')
+_LITERALS = {'true': True, 'false': False, 'null': None}
+_SCHEME = re.compile(r'([A-Za-z][A-Za-z0-9+.-]*):')
+
+
+def detect_format(path):
+    fmt = FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt is not None:
+        return fmt
+    with open(path, 'rb') as f:
+        head = f.read(1024).lstrip(b'\xef\xbb\xbf \t\r\n')
+    if head[:1] in (b'{', b'['):
+        return "json"
+    if head[:1] == b'<':
+        return "html"
+    return "csv"
+
+
+def normalize_target(path):
+    # Spellings of the same target get the same key: URL schemes and hosts
+    # are case-insensitive and default ports and an empty path add nothing;
+    # local paths are compared the way the operating system does.
+    path = path.strip()
+    if not is_url(path):
+        return os.path.normcase(os.path.normpath(os.path.expanduser(path))) if path else path
+    parts = urlsplit(path)
+    scheme = parts.scheme.lower()
+    try:
+        port = parts.port
+    except ValueError:
+        return path
+    host = parts.hostname or ''
+    userinfo = parts.netloc.rpartition('@')[0]
+    netloc = host if port in (None, DEFAULT_PORTS.get(scheme)) else f"{host}:{port}"
+    if userinfo:
+        netloc = f"{userinfo}@{netloc}"
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, parts.fragment))
+
+
+def path_from_file_uri(uri):
+    from urllib.request import url2pathname
+
+    parts = urlsplit(uri)
+    path = url2pathname(parts.path)
+    if parts.netloc and parts.netloc.lower() != 'localhost':
+        # A share on another machine.
+        return f"\\\\{parts.netloc}{path}" if os.name == 'nt' else f"//{parts.netloc}{path}"
+    return path
+
+
+def file_uri_for(path):
+    from pathlib import Path
+
+    try:
+        return Path(path).as_uri()
+    except ValueError:
+        # Relative paths have no file URI.
+        return path
+
+
+def favorite_from_bookmark(label, target, tags=(), f_type=None):
+    # Returns None for targets a favorite cannot open, such as javascript:
+    # bookmarklets and Firefox's place: queries.
+    target = target.strip()
+    if not target:
+        return None
+    scheme = _SCHEME.match(target)
+    if scheme and scheme.group(1).lower() == 'file':
+        target = path_from_file_uri(target)
+    elif scheme and len(scheme.group(1)) > 1 and not is_url(target):
+        return None
+    if f_type not in FAVORITE_TYPES:
+        f_type = guess_type(target)
+    return {
+        "label": label.strip() or target,
+        "path": target,
+        "type": f_type,
+        "tags": list(dict.fromkeys(tag.strip() for tag in tags if tag and tag.strip())),
+    }
+
+
+def split_tags(value):
+    # Comma-separated, with tags holding a comma quoted the CSV way (see
+    # join_tags).
+    if isinstance(value, list):
+        return [str(tag) for tag in value]
+    return next(csv.reader([str(value)], skipinitialspace=True), []) if value else []
+
+
+def join_tags(tags):
+    return ",".join('"' + tag.replace('"', '""') + '"' if ',' in tag or '"' in tag else tag for tag in tags)
+
+
+def read_text_chunks(path, on_bytes=None, chunk_size=IMPORT_CHUNK_SIZE):
+    # Decoded text in chunks; on_bytes(total) reports how far the file has
+    # been read.
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    done = 0
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            done += len(data)
+            if on_bytes is not None:
+                on_bytes(done)
+            text = decoder.decode(data, final=not data)
+            if text:
+                yield text
+            if not data:
+                return
+
+
+def iter_json_events(chunks):
+    # A pull parser for JSON arriving in text chunks, so only the current
+    # chunk and the token being read are held in memory. Yields
+    # ("start_map" | "end_map" | "start_array" | "end_array", None),
+    # ("key", name) and ("value", scalar).
+    buffer = ""
+    pos = 0
+    stack = []
+    expect_key = False
+    for chunk in _chain_end(chunks):
+        eof = chunk is None
+        buffer = buffer[pos:] + (chunk or "")
+        pos = 0
+        while True:
+            match = _TOKEN.match(buffer, pos)
+            # A token running into the end of the chunk may go on in the
+            # next one.
+            if match is None or (match.end() == len(buffer) and not eof):
+                if len(buffer) - pos > JSON_MAX_TOKEN:
+                    raise ValueError("Not valid JSON, or a value is too long")
+                break
+            pos = match.end()
+            kind = match.lastindex
+            if kind == 1:
+                ch = match.group(1)
+                if ch == ',':
+                    expect_key = bool(stack) and stack[-1]
+                elif ch == ':':
+                    expect_key = False
+                elif ch == '{':
+                    stack.append(True)
+                    expect_key = True
+                    yield "start_map", None
+                elif ch == '[':
+                    stack.append(False)
+                    expect_key = False
+                    yield "start_array", None
+                else:
+                    if not stack or stack.pop() != (ch == '}'):
+                        raise ValueError(f"Unexpected '{ch}' in JSON")
+                    expect_key = False
+                    yield ("end_map" if ch == '}' else "end_array"), None
+            elif kind == 2:
+                value = match.group(2)
+                if '\\' in value:
+                    value = scanstring(buffer, match.start(2))[0]
+                yield ("key" if expect_key else "value"), value
+            elif kind == 3:
+                text = match.group(3)
+                yield "value", float(text) if any(c in text for c in '.eE') else int(text)
+            else:
+                yield "value", _LITERALS[match.group(4)]
+    rest = buffer[pos:].strip()
+    if rest:
+        raise ValueError(f"Unexpected '{rest[:20]}' in JSON")
+    if stack:
+        raise ValueError("JSON ends before all objects and arrays are closed")
+
+
+def _chain_end(chunks):
+    yield from chunks
+    yield None
+
+
+class _JsonNode:
+    # An object seen by iter_json_bookmarks: its scalar fields of interest,
+    # the enclosing object, and for folders the bookmarks waiting for the
+    # folder's name.
+    __slots__ = ("fields", "parent", "listed", "in_folder", "is_folder", "closed", "key", "waiting")
+
+    def __init__(self, parent, listed, in_folder):
+        self.fields = {}
+        self.parent = parent
+        self.listed = listed
+        self.in_folder = in_folder
+        self.is_folder = False
+        self.closed = False
+        self.key = None
+        self.waiting = []
+
+    def names_tag(self):
+        # Folders directly under the file's roots (Chrome's "Bookmarks bar",
+        # Firefox's "Bookmarks Menu", ...) are not tags.
+        return self.is_folder and self.in_folder and not self.fields.get("root")
+
+    def name(self):
+        return self.fields.get("name") or self.fields.get("title") or ""
+
+
+_JSON_FIELDS = ("name", "title", "label", "url", "uri", "path", "type", "quickfavs_type", "tags", "root")
+
+
+def iter_json_bookmarks(chunks):
+    # Chrome's Bookmarks file, a Firefox bookmarks backup, or a QuickFavs
+    # favorites list. Folders are read as tags. Chrome writes a folder's name
+    # after its children, so bookmarks in a folder wait until its name is
+    # known: memory is bounded by the largest folder, not by the file.
+    stack = []
+    for event, value in iter_json_events(chunks):
+        top = stack[-1] if stack else None
+        if event == "key":
+            top.key = value
+        elif event == "value":
+            if isinstance(top, _JsonNode):
+                if top.key in _JSON_FIELDS:
+                    top.fields[top.key] = value
+            elif top is not None and top[0] == "tags" and top[1] is not None:
+                top[1].fields.setdefault("tags", []).append(value)
+        elif event == "start_map":
+            if isinstance(top, _JsonNode):
+                stack.append(_JsonNode(top, False, False))
+            elif top is None:
+                stack.append(_JsonNode(None, False, False))
+            else:
+                key, owner = top
+                listed = key == "children" or (key is None and len(stack) == 1)
+                stack.append(_JsonNode(owner, listed, key == "children"))
+        elif event == "start_array":
+            if isinstance(top, _JsonNode):
+                if top.key == "children":
+                    top.is_folder = True
+                stack.append((top.key, top))
+            else:
+                stack.append((None, None))
+        elif event == "end_array":
+            stack.pop()
+        elif event == "end_map":
+            node = stack.pop()
+            node.closed = True
+            fields = node.fields
+            if node.listed and (fields.get("url") or fields.get("uri") or fields.get("path")):
+                yield from _release([node])
+            if node.is_folder:
+                waiting, node.waiting = node.waiting, []
+                yield from _release(waiting)
+
+
+def _release(leaves):
+    # Yields the bookmarks whose folders all have names by now, and parks
+    # each of the others with its innermost folder still missing one.
+    for leaf in leaves:
+        tags = []
+        folder = leaf.parent
+        blocked = None
+        while folder is not None:
+            if folder.names_tag():
+                if not folder.closed and not folder.name():
+                    blocked = folder
+                    break
+                tags.append(folder.name())
+            folder = folder.parent
+        if blocked is not None:
+            blocked.waiting.append(leaf)
+            continue
+        fields = leaf.fields
+        target = fields.get("url") or fields.get("uri") or fields.get("path")
+        label = fields.get("name") or fields.get("title") or fields.get("label") or ""
+        # In browser files "type" is the node kind; only a QuickFavs list
+        # (with "path") or a QuickFavs export ("quickfavs_type") names the
+        # favorite's type.
+        f_type = fields.get("quickfavs_type") or (fields.get("type") if "path" in fields else None)
+        yield str(label), str(target), tags[::-1] + split_tags(fields.get("tags")), f_type
+
+
+class _NetscapeParser(HTMLParser):
+    # The bookmark file format every browser exports: <DT><H3>folder</H3>
+    # names the <DL> list that follows; <DT><A HREF=...>label</A> is a
+    # bookmark, with optional TAGS="a,b" and, from QuickFavs,
+    # QUICKFAVS_TYPE="App".
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.folders = []
+        self.next_folder = None
+        self.collecting = None
+        self.text = []
+        self.attrs = {}
+        self.bookmarks = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'h3' or (tag == 'a' and dict(attrs).get('href')):
+            self.collecting = tag
+            self.text = []
+            self.attrs = dict(attrs)
+        elif tag == 'dl':
+            self.folders.append(self.next_folder)
+            self.next_folder = None
+
+    def handle_endtag(self, tag):
+        if tag == 'h3' and self.collecting == 'h3':
+            root = 'personal_toolbar_folder' in self.attrs or 'unfiled_bookmarks_folder' in self.attrs
+            self.next_folder = None if root else ''.join(self.text).strip()
+            self.collecting = None
+        elif tag == 'a' and self.collecting == 'a':
+            tags = [folder for folder in self.folders if folder] + split_tags(self.attrs.get('tags'))
+            self.bookmarks.append((''.join(self.text), self.attrs['href'], tags, self.attrs.get('quickfavs_type')))
+            self.collecting = None
+        elif tag == 'dl' and self.folders:
+            self.folders.pop()
+
+    def handle_data(self, data):
+        if self.collecting:
+            self.text.append(data)
+
+
+def iter_html_bookmarks(chunks):
+    parser = _NetscapeParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.bookmarks
+        parser.bookmarks = []
+    parser.close()
+    yield from parser.bookmarks
+
+
+def _lines(chunks):
+    rest = ""
+    for chunk in chunks:
+        lines = (rest + chunk).split('\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if rest:
+        yield rest
+
+
+def iter_csv_bookmarks(chunks):
+    # Columns are found by their header (label/name/title, path/url, type,
+    # tags/folder); without a header they are label, path, type, tags.
+    rows = csv.reader(_lines(chunks))
+    first = next(rows, None)
+    if first is None:
+        return
+    header = [cell.strip().lower() for cell in first]
+
+    def column(*names):
+        return next((header.index(name) for name in names if name in header), None)
+
+    label_column = column("label", "name", "title")
+    target_column = column("path", "url", "uri", "href")
+    if target_column is None:
+        label_column, target_column, type_column, tags_column = 0, 1, 2, 3
+        rows = _chain_row(first, rows)
+    else:
+        type_column = column("type")
+        tags_column = column("tags", "folder")
+
+    def cell(row, i):
+        return row[i] if i is not None and i < len(row) else ""
+
+    for row in rows:
+        target = cell(row, target_column)
+        if target.strip():
+            yield cell(row, label_column), target, split_tags(cell(row, tags_column)), cell(row, type_column) or None
+
+
+def _chain_row(row, rows):
+    yield row
+    yield from rows
+
+
+_PARSERS = {"html": iter_html_bookmarks, "json": iter_json_bookmarks, "csv": iter_csv_bookmarks}
+
+
+def import_file(path, existing_paths=(), fmt=None, on_progress=None):
+    # Reads bookmarks from path as a stream and returns (favorites, stats):
+    # the new favorites, in file order, and counts of what was read. Targets
+    # already among existing_paths, or earlier in the file, are skipped;
+    # they are matched on normalize_target() through a set. on_progress
+    # (stats) is called from the calling thread every IMPORT_PROGRESS_EVERY
+    # bookmarks.
+    fmt = fmt or detect_format(path)
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Expected one of: {', '.join(IMPORT_FORMATS)}.")
+    started = time.perf_counter()
+    stats = {
+        "format": fmt, "bytes": 0, "total_bytes": os.path.getsize(path),
+        "read": 0, "added": 0, "duplicates": 0, "skipped": 0, "seconds": 0.0,
+    }
+    seen = {normalize_target(existing) for existing in existing_paths}
+    favorites = []
+
+    def on_bytes(done):
+        stats["bytes"] = done
+
+    for label, target, tags, f_type in _PARSERS[fmt](read_text_chunks(path, on_bytes)):
+        stats["read"] += 1
+        item_data = favorite_from_bookmark(label, target, tags, f_type)
+        if item_data is None:
+            stats["skipped"] += 1
+        else:
+            key = normalize_target(item_data['path'])
+            if key in seen:
+                stats["duplicates"] += 1
+            else:
+                seen.add(key)
+                favorites.append(item_data)
+                stats["added"] += 1
+        if on_progress is not None and stats["read"] % IMPORT_PROGRESS_EVERY == 0:
+            on_progress(dict(stats))
+    stats["seconds"] = time.perf_counter() - started
+    return favorites, stats
+
+
+def dropped_favorite(target, is_local):
+    # The favorite for one dropped item, named like a single drop always
+    # was: a file by its name, a link by its host.
+    if is_local:
+        path = target
+        label = os.path.basename(path.rstrip('/\\')) or path
+        return {"label": label, "path": path, "type": guess_type(path), "tags": []}
+    return {"label": urlsplit(target).hostname or "Web Link", "path": target, "type": "URL", "tags": []}
+
+
+def classify_dropped(targets, existing_paths=()):
+    # Favorites for dropped (target, is_local) pairs. guess_type() stats
+    # every local path, so this is meant for a worker thread. Returns
+    # (favorites, stats) like import_file(), skipping targets already among
+    # existing_paths or dropped twice.
+    started = time.perf_counter()
+    seen = {normalize_target(existing) for existing in existing_paths}
+    favorites = []
+    duplicates = 0
+    for target, is_local in targets:
+        key = normalize_target(target)
+        if not key or key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        favorites.append(dropped_favorite(target, is_local))
+    stats = {"read": len(targets), "added": len(favorites), "duplicates": duplicates,
+             "seconds": time.perf_counter() - started}
+    return favorites, stats
+
+
+def _bookmark_target(item_data):
+    return item_data['path'] if item_data['type'] == 'URL' else file_uri_for(item_data['path'])
+
+
+def _folders(favorites):
+    # Favorites grouped by their first tag, which becomes their folder; the
+    # other tags travel along in a format's tags field.
+    folders = {}
+    for item_data in favorites:
+        tags = item_data.get('tags') or [""]
+        folders.setdefault(tags[0], []).append(item_data)
+    untagged = folders.pop("", [])
+    return list(folders.items()), untagged
+
+
+def write_html(f, favorites):
+    f.write('<!DOCTYPE NETSCAPE-Bookmark-file-1>\n'
+            '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+            '<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n')
+
+    def write_bookmark(item_data, indent):
+        extra_tags = item_data.get('tags', [])[1:]
+        tags = f' TAGS="{html.escape(join_tags(extra_tags))}"' if extra_tags else ""
+        f.write(f'{indent}<DT><A HREF="{html.escape(_bookmark_target(item_data))}"{tags} '
+                f'QUICKFAVS_TYPE="{html.escape(item_data["type"])}">'
+                f'{html.escape(item_data["label"], quote=False)}</A>\n')
+
+    folders, untagged = _folders(favorites)
+    for name, items in folders:
+        f.write(f'    <DT><H3>{html.escape(name, quote=False)}</H3>\n    <DL><p>\n')
+        for item_data in items:
+            write_bookmark(item_data, "        ")
+        f.write('    </DL><p>\n')
+    for item_data in untagged:
+        write_bookmark(item_data, "    ")
+    f.write('</DL><p>\n')
+
+
+def write_json(f, favorites):
+    # Chrome's Bookmarks layout, with everything in the bookmarks bar. The
+    # favorite's own type goes in quickfavs_type, as "type" is Chrome's.
+    def bookmark_node(item_data):
+        node = {"name": item_data['label'], "type": "url", "url": _bookmark_target(item_data),
+                "quickfavs_type": item_data['type']}
+        if len(item_data.get('tags', [])) > 1:
+            node["tags"] = item_data['tags'][1:]
+        return json.dumps(node, ensure_ascii=False)
+
+    f.write('{"roots": {"bookmark_bar": {"name": "Bookmarks bar", "type": "folder", "children": [\n')
+    first = True
+    folders, untagged = _folders(favorites)
+    for name, items in folders:
+        f.write(("" if first else ",\n") + f'{{"name": {json.dumps(name, ensure_ascii=False)}, '
+                                           f'"type": "folder", "children": [\n')
+        for i, item_data in enumerate(items):
+            f.write(("" if i == 0 else ",\n") + bookmark_node(item_data))
+        f.write('\n]}')
+        first = False
+    for item_data in untagged:
+        f.write(("" if first else ",\n") + bookmark_node(item_data))
+        first = False
+    f.write('\n]}, "other": {"name": "Other bookmarks", "type": "folder", "children": []}}, "version": 1}\n')
+
+
+def write_csv(f, favorites):
+    writer = csv.writer(f)
+    writer.writerow(["label", "path", "type", "tags"])
+    for item_data in favorites:
+        writer.writerow([item_data['label'], item_data['path'], item_data['type'], join_tags(item_data.get('tags', []))])
+
+
+_WRITERS = {"html": write_html, "json": write_json, "csv": write_csv}
+
+
+def export_file(favorites, path, fmt=None):
+    # Writes the favorites one at a time to a temporary file that replaces
+    # path once complete. Returns how many were written.
+    fmt = fmt or FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Cannot tell the format of '{path}'. Expected one of: {', '.join(IMPORT_FORMATS)}.")
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+        _WRITERS[fmt](f, favorites)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return len(favorites)
@@ -0,0 +1,488 @@
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from itertools import accumulate
+
+from favorites_facets import FacetIndex, parse_query, unpack_facets, unpack_keys
+from favorites_records import Tombstones
+from favorites_stats import frecency_score
+from favorites_trace import span
+
+FUZZY_MATCH_SCORE = 100
+FUZZY_GAP_PENALTY = 3
+FUZZY_POSITION_PENALTY = 0.1
+FUZZY_BOUNDARY_BONUS = 20
+FUZZY_CONTIGUOUS_BONUS = 30
+FRECENCY_WEIGHT = 25
+FUZZY_RESULT_LIMIT = 1000
+WORD_BOUNDARY_CHARS = " /\\-_.([:"
+
+
+def search_text_for(item_data):
+    tags_lower = " ".join([t.lower() for t in item_data.get('tags', [])])
+    return f"{item_data['label'].lower()} {item_data['type'].lower()} {tags_lower}"
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def fuzzy_query(text):
+    return "".join(text.lower().split())
+
+
+@lru_cache(maxsize=64)
+def fuzzy_pattern(query):
+    # fzf-style subsequence: every query character in order, never crossing
+    # into the next document of the joined corpus. Each character is taken
+    # at its first occurrence after the previous one, which finds a match
+    # whenever there is one, so the regex has nothing to backtrack into.
+    return re.compile(re.escape(query[0]) + "".join(f"[^{re.escape(c)}\n]*{re.escape(c)}" for c in query[1:]))
+
+
+class SearchIndex:
+    # Trigram postings over the same "label type tags" text that the list
+    # filter has always matched against, so results stay identical to a
+    # plain substring test. Documents get increasing keys, which keeps the
+    # key list sorted in list order and lets positions be found by bisect.
+    # A removed document's key stays in the list, marked as removed (see
+    # Tombstones), until half of them are; positions count past them.
+    # Tag and type facets are indexed by the same keys, so "tag:work -tag:old
+    # docs" narrows the text matches by set lookups (see favorites_facets).
+    # The lock lets the background search worker query while the GUI thread
+    # applies edits.
+    #
+    # pack() turns the index into plain values for the snapshot cache, and
+    # restore() takes it back before the same favorites are appended again:
+    # each append then only takes over its precomputed text, and the
+    # postings are swapped in with the last one. Until then searches scan
+    # the texts, so a list that is still being filled can be searched.
+
+    def __init__(self, favorites=()):
+        self.lock = threading.RLock()
+        self.rebuild(favorites)
+
+    def rebuild(self, favorites):
+        with self.lock:
+            self._keys = []
+            self._removed = Tombstones()
+            self._texts = {}
+            self._postings = {}
+            self._next_key = 0
+            self._last_query = None
+            self._last_result = []
+            self._launches = {}
+            self._restoring = None
+            self.version = 0
+            self.facets = FacetIndex()
+            self._invalidate_fuzzy()
+            for item_data in favorites:
+                self._insert(item_data)
+
+    def __len__(self):
+        return len(self._keys) - self._removed.count
+
+    def _insert(self, item_data):
+        if self._restoring is not None:
+            key = self._insert_restored(item_data)
+            if key is not None:
+                return key
+        key = self._next_key
+        self._next_key += 1
+        self._keys.append(key)
+        self._index_text(key, search_text_for(item_data))
+        self.facets.add(key, item_data)
+        return key
+
+    def _insert_restored(self, item_data):
+        # The next favorite takes the next packed key and text; returns None
+        # after settling the restore when it is not the favorite expected.
+        state = self._restoring
+        position = len(self._keys)
+        key = state["keys"][position]
+        if state["favorites"][position] is item_data:
+            self.facets.remember_values(key, state["facets"][3][position])
+        elif state["texts"][position] == search_text_for(item_data):
+            self.facets.remember(key, item_data)
+        else:
+            self._settle_restore()
+            return None
+        self._keys.append(key)
+        self._texts[key] = state["texts"][position]
+        if position + 1 == len(state["keys"]):
+            self._postings = state["postings"]
+            self.facets.install(*state["facets"][:3])
+            self._next_key = key + 1
+            self._restoring = None
+        return key
+
+    def restore(self, state):
+        # state is from unpack_index(); its favorites are to be appended
+        # next, in the same order.
+        with self.lock:
+            self.rebuild(())
+            if state["keys"]:
+                self._restoring = state
+
+    def _settle_restore(self):
+        # Indexes the favorites restored so far the regular way, for an
+        # edit or an unexpected favorite before the restore completed.
+        state = self._restoring
+        self._restoring = None
+        for key in self._keys:
+            self._index_text(key, self._texts[key])
+        self.facets.reindex(state["facets"][1])
+        self._next_key = state["keys"][-1] + 1
+
+    def pack(self, version=None):
+        # None while a restore is under way, or when the index changed since
+        # it had the given version.
+        with self.lock:
+            if self._restoring is not None or version not in (None, self.version):
+                return None
+            keys = self._live_keys()
+            return {
+                "keys": array('q', keys).tobytes(),
+                "texts": [self._texts[key] for key in keys],
+                "postings": {gram: array('q', postings).tobytes() for gram, postings in self._postings.items()},
+                "facets": self.facets.pack(keys),
+            }
+
+    def _index_text(self, key, text):
+        self._texts[key] = text
+        for gram in trigrams(text):
+            postings = self._postings.get(gram)
+            if postings is None:
+                self._postings[gram] = {key}
+            else:
+                postings.add(key)
+
+    def _unindex_text(self, key):
+        text = self._texts.pop(key)
+        for gram in trigrams(text):
+            postings = self._postings[gram]
+            postings.discard(key)
+            if not postings:
+                del self._postings[gram]
+
+    def _invalidate_fuzzy(self):
+        self._corpus = None
+        self._last_fuzzy = None
+
+    def append(self, item_data):
+        self.extend((item_data,))
+
+    def extend(self, favorites):
+        with self.lock:
+            self.version += 1
+            self._invalidate_fuzzy()
+            last_query = self._last_query
+            texts = self._texts
+            for item_data in favorites:
+                key = self._insert(item_data)
+                if last_query is not None and last_query in texts[key]:
+                    self._last_result.append(key)
+
+    def update(self, position, item_data):
+        with self.lock:
+            if self._restoring is not None:
+                self._settle_restore()
+            self.version += 1
+            self._invalidate_fuzzy()
+            key = self._key_at(position)
+            self._unindex_text(key)
+            self._index_text(key, search_text_for(item_data))
+            self.facets.remove(key)
+            self.facets.add(key, item_data)
+            if self._last_query is not None:
+                i = bisect_left(self._last_result, key)
+                was_match = i < len(self._last_result) and self._last_result[i] == key
+                is_match = self._last_query in self._texts[key]
+                if was_match and not is_match:
+                    del self._last_result[i]
+                elif is_match and not was_match:
+                    self._last_result.insert(i, key)
+
+    def remove(self, position):
+        self.remove_many([position])
+
+    def remove_many(self, positions):
+        # positions are taken before any of them is removed.
+        with self.lock:
+            if self._restoring is not None:
+                self._settle_restore()
+            self.version += 1
+            self._invalidate_fuzzy()
+            slots = [self._removed.slot(position) for position in positions]
+            keys = [self._keys[slot] for slot in slots]
+            for slot, key in zip(slots, keys):
+                self._launches.pop(key, None)
+                self._unindex_text(key)
+                self.facets.remove(key)
+                self._removed.mark(slot)
+            if self._removed.should_compact(len(self._keys)):
+                self._keys = self._live_keys()
+                self._removed.clear()
+            if self._last_query is None:
+                return
+            if len(keys) == 1:
+                i = bisect_left(self._last_result, keys[0])
+                if i < len(self._last_result) and self._last_result[i] == keys[0]:
+                    del self._last_result[i]
+            else:
+                gone = set(keys)
+                self._last_result = [key for key in self._last_result if key not in gone]
+
+    def reorder(self, positions):
+        # positions lists every position once, in the new order. Keys are
+        # handed out again in that order, so they stay sorted in list order;
+        # the texts and facets are carried over rather than indexed again.
+        with self.lock:
+            if self._restoring is not None:
+                self._settle_restore()
+            self.version += 1
+            self._invalidate_fuzzy()
+            live = self._live_keys()
+            new_keys = {live[position]: key for key, position in enumerate(positions)}
+            self._keys = list(range(len(positions)))
+            self._removed.clear()
+            self._next_key = len(positions)
+            self._texts = {new_keys[key]: text for key, text in self._texts.items()}
+            self._postings = {gram: {new_keys[key] for key in keys} for gram, keys in self._postings.items()}
+            self._launches = {new_keys[key]: launch for key, launch in self._launches.items()}
+            self.facets.rekey(new_keys)
+            self._last_query = None
+            self._last_result = []
+
+    def record_launch(self, position, count, last_opened):
+        with self.lock:
+            self._launches[self._key_at(position)] = (count, last_opened)
+
+    def facet_counts(self, field):
+        with self.lock:
+            return self.facets.counts(field)
+
+    def facet_positions(self, field, value):
+        # Positions, in list order, of the favorites with the casefolded
+        # value; for the tag field, None stands for having no tags.
+        with self.lock:
+            if self._restoring is not None:
+                self._settle_restore()
+            return self._positions(self.facets.untagged if value is None else self.facets.keys_with(field, value))
+
+    def matches(self, position, text, fuzzy=False):
+        query = parse_query(text)
+        with self.lock:
+            key = self._key_at(position)
+            if query.has_facets:
+                if not self.facets.matches(key, query):
+                    return False
+                text = query.text
+            item_text = self._texts[key]
+            if fuzzy:
+                query = fuzzy_query(text)
+                return not query or fuzzy_pattern(query).search(item_text) is not None
+            return text.lower() in item_text
+
+    def search(self, text):
+        with span("search"):
+            return self._search(text)
+
+    def _search(self, text):
+        query = parse_query(text)
+        if not query.has_facets:
+            return self._text_search(text)
+        with self.lock:
+            found = self._facet_keys(query)
+            if not query.text:
+                return self._positions(found)
+            if len(found) * 4 < len(self):
+                # Few enough facet matches to test the text on each of them.
+                search_text = query.text.lower()
+                texts = self._texts
+                return self._positions({key for key in found if search_text in texts[key]})
+            return self._positions([key for key in self._text_search_keys(query.text) if key in found])
+
+    def _text_search(self, text):
+        with self.lock:
+            if not text:
+                return list(range(len(self)))
+            return self._positions(self._text_search_keys(text))
+
+    def _text_search_keys(self, text):
+        # The keys of the matches, in list order.
+        search_text = text.lower()
+        with self.lock:
+
+            if self._last_query is not None and self._last_query in search_text:
+                # Narrowing the previous query can only drop matches.
+                candidates = self._last_result
+            elif len(search_text) >= 3 and self._restoring is None:
+                candidates = self._trigram_candidates(search_text)
+            else:
+                candidates = self._live_keys()
+
+            texts = self._texts
+            result = [key for key in candidates if search_text in texts[key]]
+            self._last_query = search_text
+            self._last_result = result
+            return result
+
+    def fuzzy_search(self, text, now=None):
+        with span("search.fuzzy"):
+            return self._facet_fuzzy_search(text, now)
+
+    def _facet_fuzzy_search(self, text, now=None):
+        # Facets filter the ranked matches of the remaining text.
+        facet_query = parse_query(text)
+        if not facet_query.has_facets:
+            return self._fuzzy_search(text, now)
+        with self.lock:
+            found = self._facet_keys(facet_query)
+            if not fuzzy_query(facet_query.text):
+                return self._positions(found)
+        return self._fuzzy_search(facet_query.text, now, allowed=found)
+
+    def _fuzzy_search(self, text, now=None, allowed=None):
+        # Subsequence matches ranked best first, among the keys in allowed
+        # when given. Runs on a snapshot of the documents joined into one
+        # string, without the lock, so edits on the GUI thread never wait
+        # for it. Ranking every match of a short query in a big list takes
+        # longer than a frame, so at most FUZZY_RESULT_LIMIT matches are
+        # ranked and returned: launched favorites, then those holding the
+        # query as one piece, then the rest, each in list order. A query
+        # that only grew at the end looks again at the previous matches
+        # when they were all there were.
+        query = fuzzy_query(text)
+        if not query:
+            return list(range(len(self)))
+        corpus, launches, last = self._corpus_snapshot()
+        documents, offsets, keys = corpus
+        pattern = fuzzy_pattern(query)
+
+        found = {}
+        complete = True
+        if last is not None and allowed is None and query.startswith(last[0]):
+            for position in last[1]:
+                m = pattern.search(documents, offsets[position], offsets[position + 1] - 1)
+                if m:
+                    found[position] = m
+        else:
+            launched = sorted(bisect_left(keys, key) for key in launches)
+            contiguous = (bisect_right(offsets, m.start()) - 1 for m in re.finditer(re.escape(query), documents))
+            subsequence = (bisect_right(offsets, m.start()) - 1 for m in pattern.finditer(documents))
+            for candidates in (launched, contiguous, subsequence):
+                for position in candidates:
+                    if position in found or (allowed is not None and keys[position] not in allowed):
+                        continue
+                    m = pattern.search(documents, offsets[position], offsets[position + 1] - 1)
+                    if m:
+                        found[position] = m
+                        if len(found) >= FUZZY_RESULT_LIMIT:
+                            complete = False
+                            break
+                if not complete:
+                    break
+
+        query_length = len(query)
+        ranked = []
+        for position, m in found.items():
+            start = m.start() - offsets[position]
+            score = (FUZZY_MATCH_SCORE
+                     - (m.end() - m.start() - query_length) * FUZZY_GAP_PENALTY
+                     - start * FUZZY_POSITION_PENALTY)
+            if start == 0 or documents[m.start() - 1] in WORD_BOUNDARY_CHARS:
+                score += FUZZY_BOUNDARY_BONUS
+            if query_length > 1 and documents.find(query, offsets[position], offsets[position + 1] - 1) >= 0:
+                score += FUZZY_CONTIGUOUS_BONUS
+            launch = launches.get(keys[position])
+            if launch:
+                score += FRECENCY_WEIGHT * math.log2(1 + frecency_score(*launch, now=now))
+            ranked.append((-score, position))
+        ranked.sort()
+
+        if complete and allowed is None:
+            with self.lock:
+                if self._corpus is corpus:
+                    self._last_fuzzy = (query, sorted(found))
+        return [position for _, position in ranked]
+
+    def _corpus_snapshot(self):
+        # ((documents, offsets, keys), launches, last fuzzy matches) as they
+        # are now. After an edit the documents are joined again outside the
+        # lock, from a copy of the texts.
+        with self.lock:
+            corpus = self._corpus
+            launches = dict(self._launches)
+            if corpus is not None:
+                return corpus, launches, self._last_fuzzy
+            version = self.version
+            keys = list(self._live_keys())
+            texts = list(map(self._texts.__getitem__, keys))
+        offsets = [0]
+        offsets.extend(accumulate(len(text) + 1 for text in texts))
+        corpus = ("\n".join(texts) + "\n", offsets, keys)
+        with self.lock:
+            if self.version == version:
+                self._corpus = corpus
+        return corpus, launches, None
+
+    def _facet_keys(self, query):
+        if self._restoring is not None:
+            return {key for key in self._keys if self.facets.matches(key, query)}
+        # The texts are keyed by exactly the keys of the favorites there are.
+        return self.facets.select(query, self._texts)
+
+    def _key_at(self, position):
+        return self._keys[self._removed.slot(position)]
+
+    def _live_keys(self):
+        # The keys in list order, without those of removed favorites.
+        if not self._removed.count:
+            return self._keys
+        texts = self._texts
+        return [key for key in self._keys if key in texts]
+
+    def _positions(self, found):
+        # Positions of a collection of keys, in list order. Until a favorite
+        # is removed the keys are consecutive and a position is just an
+        # offset; after that, bisecting (and counting past removed keys) is
+        # cheaper for a few keys and one pass over all keys for many.
+        keys = self._keys
+        if not keys:
+            return []
+        first = keys[0]
+        if not self._removed.count and keys[-1] - first == len(keys) - 1:
+            return [key - first for key in sorted(found)]
+        if len(found) * 16 < len(self):
+            removed = self._removed
+            return [removed.row(bisect_left(keys, key)) for key in sorted(found)]
+        if not isinstance(found, (set, frozenset)):
+            found = set(found)
+        return [position for position, key in enumerate(self._live_keys()) if key in found]
+
+    def _trigram_candidates(self, search_text):
+        postings = []
+        for gram in trigrams(search_text):
+            keys = self._postings.get(gram)
+            if not keys:
+                return []
+            postings.append(keys)
+        postings.sort(key=len)
+        return sorted(postings[0].intersection(*postings[1:]))
+
+
+def unpack_index(packed, favorites):
+    # Turns SearchIndex.pack() back into the sets restore() takes; favorites
+    # are the ones it was packed from. This is most of the work of a
+    # restore, so it is done where the cache is read.
+    return {
+        "favorites": favorites,
+        "keys": list(unpack_keys(packed["keys"])),
+        "texts": packed["texts"],
+        "postings": {gram: set(unpack_keys(data)) for gram, data in packed["postings"].items()},
+        "facets": unpack_facets(packed["facets"]),
+    }
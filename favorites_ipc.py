@@ -0,0 +1,207 @@
+import getpass
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+# Commands a running instance answers. Each request is one JSON line,
+# {"command": ..., "args": [...], "options": {...}}, answered by one JSON
+# line, {"ok": true, "result": ...} or {"ok": false, "error": "..."}.
+IPC_COMMANDS = ("show", "open", "search", "list", "add", "remove", "import", "export", "stats")
+IPC_TIMEOUT = 5.0
+# How long a later invocation waits for an instance that holds the lock
+# but is not listening yet, i.e. one that is still starting up.
+IPC_START_TIMEOUT = 10.0
+
+
+def server_name(data_dir=None):
+    # One instance per user and favorites directory.
+    data_dir = os.path.abspath(data_dir or os.getcwd())
+    digest = hashlib.sha1(data_dir.encode('utf-8')).hexdigest()[:8]
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = "user"
+    return f"quickfavs-{re.sub(r'[^A-Za-z0-9_.-]', '_', user)}-{digest}"
+
+
+def temp_dir():
+    # What tempfile.gettempdir() finds in practice, without importing
+    # tempfile (and shutil with it) on every command.
+    for name in ('TMPDIR', 'TEMP', 'TMP'):
+        directory = os.environ.get(name)
+        if directory:
+            return os.path.abspath(directory)
+    if sys.platform == 'win32':
+        import tempfile
+
+        return tempfile.gettempdir()
+    return '/tmp'
+
+
+def server_address(data_dir=None):
+    # What QLocalServer listens on: a pipe name on Windows, a socket path
+    # elsewhere (an absolute path, so the client does not depend on where Qt
+    # would put a bare name).
+    name = server_name(data_dir)
+    if sys.platform == 'win32':
+        return name
+    return os.path.join(temp_dir(), name)
+
+
+def lock_path(data_dir=None):
+    return os.path.join(temp_dir(), server_name(data_dir) + ".lock")
+
+
+class InstanceLock:
+    # An exclusive lock on a file next to the socket, held for as long as
+    # the instance that owns the socket runs. The operating system drops it
+    # when that process dies, so two instances starting at the same time
+    # cannot both go on to listen.
+
+    def __init__(self, path=None):
+        self.path = path or lock_path()
+        self.file = None
+
+    def acquire(self):
+        # Does not wait; False while another process holds the lock.
+        if self.file is not None:
+            return True
+        lock_file = open(self.path, 'a+b')
+        try:
+            if sys.platform == 'win32':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.file = lock_file
+        return True
+
+    def release(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def encode_message(message):
+    return (json.dumps(message, ensure_ascii=False, default=dict) + "\n").encode('utf-8')
+
+
+def decode_message(line):
+    message = json.loads(line.decode('utf-8'))
+    if not isinstance(message, dict):
+        raise ValueError("message is not a JSON object")
+    return message
+
+
+def _connect(address, timeout):
+    if sys.platform == 'win32':
+        return open(r'\\.\pipe' + '\\' + address, 'r+b', buffering=0)
+    if not os.path.exists(address):
+        # Nobody listening, found without importing socket, which a command
+        # run with QuickFavs closed would only pay for.
+        raise FileNotFoundError(address)
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock.makefile('rwb')
+
+
+def send_command(command, args=(), options=None, address=None, timeout=IPC_TIMEOUT):
+    # Returns the decoded response, or None when no instance is listening.
+    if address is None:
+        address = server_address()
+    try:
+        connection = _connect(address, timeout)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    with connection:
+        connection.write(encode_message({"command": command, "args": list(args), "options": options or {}}))
+        connection.flush()
+        line = connection.readline()
+    if not line:
+        raise ConnectionError("QuickFavs closed the connection without answering")
+    return decode_message(line)
+
+
+def instance_running(address=None, timeout=IPC_TIMEOUT):
+    # Whether an instance is listening on address; connects and hangs up
+    # without sending a command.
+    if address is None:
+        address = server_address()
+    try:
+        connection = _connect(address, timeout)
+    except OSError:
+        return False
+    connection.close()
+    return True
+
+
+def format_result_line(item_data):
+    return f"{item_data['label']}\t{item_data['type']}\t{item_data['path']}"
+
+
+def print_result(command, result):
+    if command == "open":
+        print(f"Opened: {result['label']}")
+    elif command == "add":
+        print(f"Added: {result['label']}")
+    elif command == "remove":
+        print(f"Removed: {result['label']}")
+    elif command == "import":
+        print(f"Imported {result['added']} of {result['read']} bookmarks "
+              f"({result['duplicates']} duplicates, {result['skipped']} skipped).")
+    elif command == "export":
+        print(f"Exported {result['exported']} favorites to {result['path']}")
+    elif command == "stats":
+        print(json.dumps(result, indent=4))
+    elif isinstance(result, list):
+        for item_data in result:
+            print(format_result_line(item_data))
+
+
+def forward_command_line(argv, address=None, lock=None):
+    # Hands the command line to a running instance. Returns the exit status
+    # when the command was dealt with here, or None when this process should
+    # start the GUI itself. With a lock, None also means this process now
+    # holds it; while another process holds it without listening yet, the
+    # command waits for that instance to finish starting.
+    if "-h" in argv or "--help" in argv:
+        return None
+    command = argv[0] if argv and argv[0] in IPC_COMMANDS else None
+    args = argv[1:] if command else []
+    try:
+        response = send_command(command or "show", args, address=address)
+        deadline = time.monotonic() + IPC_START_TIMEOUT
+        while response is None and lock is not None and not lock.acquire():
+            if time.monotonic() > deadline:
+                print("QuickFavs is starting here but does not answer.", file=sys.stderr)
+                return 1
+            time.sleep(0.05)
+            response = send_command(command or "show", args, address=address)
+    except (OSError, ValueError) as e:
+        print(f"Error talking to QuickFavs: {e}", file=sys.stderr)
+        return 1
+    if response is None:
+        if command in (None, "show"):
+            return None
+        print("QuickFavs is not running.", file=sys.stderr)
+        return 1
+    if not response.get("ok"):
+        print(f"Error: {response.get('error')}", file=sys.stderr)
+        return 1
+    print_result(command, response.get("result"))
+    return 0
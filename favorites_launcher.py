@@ -0,0 +1,87 @@
+import threading
+import time
+from concurrent.futures import CancelledError, Future, InvalidStateError, ThreadPoolExecutor
+
+from favorites_trace import count, tracer
+
+LAUNCH_WORKERS = 4
+LAUNCH_TIMEOUT = 10.0
+
+
+class Launcher:
+    # Opens favorites on a small pool of worker threads, so a slow browser
+    # hand-off or a hung network path never blocks the caller and a batch
+    # opens in parallel. opener(item_data) does the actual work and can be
+    # replaced, e.g. by a fake that only records what it was asked to open.
+    # on_result(item_data, error, future) is called from a worker or timer
+    # thread exactly once per launch, with the future submit() returned:
+    # error is None, the opener's exception, a TimeoutError, or a
+    # CancelledError for a launch still outstanding at shutdown().
+
+    def __init__(self, opener, max_workers=LAUNCH_WORKERS, timeout=LAUNCH_TIMEOUT, on_result=None):
+        self.opener = opener
+        self.timeout = timeout
+        self.on_result = on_result
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="favorites-launcher")
+        self._lock = threading.Lock()
+        self._timers = {}
+
+    def submit(self, item_data):
+        # The returned future settles when the opener returns or raises, or
+        # fails with TimeoutError once the timeout has passed since submit(),
+        # also while the launch waits behind workers taken by hung openers;
+        # it is then not opened at all. A hung opener cannot be interrupted;
+        # it keeps its worker until it returns, and its late result is
+        # dropped.
+        future = Future()
+        future.set_running_or_notify_cancel()
+        timer = threading.Timer(self.timeout, self._settle,
+                                (future, item_data, TimeoutError(f"timed out after {self.timeout:g} s")))
+        timer.daemon = True
+        with self._lock:
+            self._timers[future] = (timer, item_data)
+        timer.start()
+        self._executor.submit(self._run, future, item_data)
+        return future
+
+    def submit_many(self, items):
+        return [self.submit(item_data) for item_data in items]
+
+    def shutdown(self):
+        # Launches that have not finished are settled with CancelledError,
+        # so nothing waits on them forever.
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            outstanding = list(self._timers.items())
+        for future, (timer, item_data) in outstanding:
+            self._settle(future, item_data, CancelledError("QuickFavs is shutting down"))
+
+    def _run(self, future, item_data):
+        if future.done():
+            return
+        started = time.perf_counter()
+        try:
+            self.opener(item_data)
+        except Exception as e:
+            self._settle(future, item_data, e)
+        else:
+            self._settle(future, item_data, None)
+        finally:
+            if tracer.enabled:
+                tracer.record("launch", started, time.perf_counter())
+
+    def _settle(self, future, item_data, error):
+        try:
+            if error is None:
+                future.set_result(item_data)
+            else:
+                future.set_exception(error)
+        except InvalidStateError:
+            return
+        with self._lock:
+            timer, _ = self._timers.pop(future)
+        timer.cancel()
+        if error is not None:
+            count("launch.errors")
+        if self.on_result is not None:
+            self.on_result(item_data, error, future)
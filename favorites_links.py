@@ -0,0 +1,410 @@
+import asyncio
+import json
+import socket
+import ssl
+import threading
+import time
+from itertools import zip_longest
+from urllib.parse import quote, urljoin, urlsplit
+
+from favorites_storage import write_file_atomic
+from favorites_trace import count, span
+
+LINK_CONCURRENCY = 64
+LINK_HOST_CONNECTIONS = 4
+LINK_TIMEOUT = 10.0
+LINK_MAX_REDIRECTS = 5
+LINK_MAX_HEADER_LINES = 100
+LINK_MAX_DRAIN_BYTES = 64 * 1024
+LINK_TTL_SECONDS = 24 * 3600
+LINK_RETRY_SECONDS = 3600
+LINK_USER_AGENT = "QuickFavs"
+LINK_OK = "ok"
+LINK_BROKEN = "broken"
+LINK_UNREACHABLE = "unreachable"
+# Refusals that still show the page is there: many sites answer automated
+# clients like this.
+REACHABLE_CODES = (401, 403, 429)
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class LinkStatus:
+    # The outcome of checking one URL: state is LINK_OK, LINK_BROKEN (the
+    # server answered with an error) or LINK_UNREACHABLE (no usable answer),
+    # code the final HTTP status if there was one, and checked the
+    # time.time() of the check.
+    __slots__ = ("state", "code", "reason", "checked")
+
+    def __init__(self, state, code=None, reason="", checked=None):
+        self.state = state
+        self.code = code
+        self.reason = reason
+        self.checked = time.time() if checked is None else checked
+
+    @property
+    def broken(self):
+        return self.state != LINK_OK
+
+    def describe(self):
+        if self.code is not None:
+            return f"{self.code} {self.reason}".strip()
+        return self.reason
+
+    def same_outcome(self, other):
+        return other is not None and self.state == other.state and self.code == other.code
+
+    def to_json(self):
+        return [self.state, self.code, self.reason, self.checked]
+
+    @classmethod
+    def from_json(cls, data):
+        state, code, reason, checked = data
+        return cls(str(state), None if code is None else int(code), str(reason), float(checked))
+
+
+def is_checkable(url):
+    try:
+        parts = urlsplit(url)
+        return parts.scheme.lower() in ('http', 'https') and bool(parts.hostname)
+    except ValueError:
+        return False
+
+
+def interleave_hosts(urls):
+    # One URL per host in turn, so a host with many links does not take
+    # every check slot while the others wait for their connections.
+    by_host = {}
+    for url in urls:
+        by_host.setdefault(urlsplit(url).hostname, []).append(url)
+    return [url for batch in zip_longest(*by_host.values()) for url in batch if url is not None]
+
+
+class LinkCache:
+    # Link statuses by URL, kept in a JSON file. A status is fresh for ttl
+    # seconds when the link worked and for retry_seconds when it did not,
+    # so dead links are tried again sooner. Safe to use from any thread.
+
+    def __init__(self, path, ttl=LINK_TTL_SECONDS, retry_seconds=LINK_RETRY_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.retry_seconds = retry_seconds
+        self.lock = threading.Lock()
+        self.statuses = {}
+        self.dirty = False
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            statuses = {url: LinkStatus.from_json(entry) for url, entry in data.items()}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"Warning: Could not read {self.path}: {e}. Links will be checked again.")
+            return
+        with self.lock:
+            self.statuses = statuses
+
+    def get(self, url):
+        return self.statuses.get(url)
+
+    def is_fresh(self, status, now=None):
+        if status is None:
+            return False
+        age = (time.time() if now is None else now) - status.checked
+        return 0 <= age < (self.retry_seconds if status.broken else self.ttl)
+
+    def put(self, url, status):
+        # Returns the status it replaced.
+        with self.lock:
+            previous = self.statuses.get(url)
+            self.statuses[url] = status
+            self.dirty = True
+        return previous
+
+    def retain(self, urls):
+        # Forgets the links that are no longer favorites.
+        urls = set(urls)
+        with self.lock:
+            gone = [url for url in self.statuses if url not in urls]
+            for url in gone:
+                del self.statuses[url]
+            self.dirty = self.dirty or bool(gone)
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps({url: status.to_json() for url, status in self.statuses.items()}, ensure_ascii=False)
+            self.dirty = False
+        try:
+            write_file_atomic(self.path, data.encode('utf-8'))
+        except OSError as e:
+            print(f"Error saving link statuses: {e}")
+
+
+class LinkProtocolError(Exception):
+    pass
+
+
+class _HostPool:
+    # Idle keep-alive connections to one host, and the cap on how many
+    # connections to it are in use.
+
+    def __init__(self, limit):
+        self.slots = asyncio.Semaphore(limit)
+        self.idle = []
+
+
+class HttpLinkChecker:
+    # Checks URLs with plain HTTP/1.1 over asyncio streams: HEAD first, then
+    # GET when HEAD fails or is refused, since plenty of servers get HEAD
+    # wrong. Redirects are followed. Each host (scheme, name and port) gets
+    # at most host_connections connections, kept open and reused between
+    # requests, and at most concurrency checks run at once. timeout applies
+    # to each request, not to the time spent waiting for a connection.
+    # Belongs to one event loop.
+
+    def __init__(self, concurrency=LINK_CONCURRENCY, host_connections=LINK_HOST_CONNECTIONS,
+                 timeout=LINK_TIMEOUT, max_redirects=LINK_MAX_REDIRECTS, ssl_context=None):
+        self.concurrency = concurrency
+        self.host_connections = host_connections
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.ssl_context = ssl_context
+        self.pools = {}
+
+    async def check_many(self, urls, on_result):
+        # on_result(url, status) as each check finishes, in no set order.
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def run(url):
+            async with slots:
+                status = await self.check(url)
+            on_result(url, status)
+        await asyncio.gather(*(run(url) for url in interleave_hosts(urls)))
+
+    async def check(self, url):
+        with span("link.check"):
+            try:
+                code, reason = await self._follow(url)
+            except asyncio.TimeoutError:
+                return LinkStatus(LINK_UNREACHABLE, reason="Timed out")
+            except ssl.SSLError as e:
+                return LinkStatus(LINK_UNREACHABLE, reason=f"TLS error: {e.reason or e}")
+            except socket.gaierror:
+                return LinkStatus(LINK_UNREACHABLE, reason="Host not found")
+            except (OSError, ValueError, LinkProtocolError, asyncio.IncompleteReadError) as e:
+                return LinkStatus(LINK_UNREACHABLE, reason=str(e) or type(e).__name__)
+        if code < 400 or code in REACHABLE_CODES:
+            return LinkStatus(LINK_OK, code, reason)
+        count("link.broken")
+        return LinkStatus(LINK_BROKEN, code, reason)
+
+    def close(self):
+        for pool in self.pools.values():
+            for _, writer in pool.idle:
+                writer.close()
+        self.pools = {}
+
+    async def _follow(self, url):
+        # (code, reason) of the last answer.
+        for _ in range(self.max_redirects + 1):
+            try:
+                code, reason, headers = await self._request("HEAD", url)
+            except (ConnectionError, LinkProtocolError, asyncio.IncompleteReadError):
+                code = None
+            if code is None or code >= 400:
+                code, reason, headers = await self._request("GET", url)
+            location = headers.get("location")
+            if code not in REDIRECT_CODES or not location:
+                return code, reason
+            url = urljoin(url, location.strip())
+            if not is_checkable(url):
+                # Somewhere a browser can go but this checker cannot.
+                return code, reason
+        raise LinkProtocolError("Too many redirects")
+
+    async def _request(self, method, url):
+        # (code, reason, headers); headers are lower-cased.
+        parts = urlsplit(url)
+        https = parts.scheme.lower() == 'https'
+        host = parts.hostname
+        port = parts.port or (443 if https else 80)
+        try:
+            host_name = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            raise ValueError(f"Bad host name '{host}'")
+        if ':' in host_name:
+            host_name = f"[{host_name}]"
+        target = quote(parts.path or "/", safe="/%:@!$&'()*+,;=~")
+        if parts.query:
+            target += "?" + quote(parts.query, safe="/%:@!$&'()*+,;=~?")
+        request = (f"{method} {target} HTTP/1.1\r\n"
+                   f"Host: {host_name}{f':{parts.port}' if parts.port else ''}\r\n"
+                   f"User-Agent: {LINK_USER_AGENT}\r\nAccept: */*\r\n\r\n").encode('ascii')
+
+        pool = self.pools.get((https, host, port))
+        if pool is None:
+            pool = self.pools[(https, host, port)] = _HostPool(self.host_connections)
+        async with pool.slots:
+            while True:
+                reader, writer, reused = await self._connect(pool, https, host, port)
+                try:
+                    code, reason, headers, keep_alive = await asyncio.wait_for(
+                        self._exchange(reader, writer, request, method), self.timeout)
+                except (ConnectionError, LinkProtocolError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        # The server closed the idle connection; try a new one.
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if keep_alive:
+                    pool.idle.append((reader, writer))
+                else:
+                    writer.close()
+                return code, reason, headers
+
+    async def _connect(self, pool, https, host, port):
+        while pool.idle:
+            reader, writer = pool.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        if https and self.ssl_context is None:
+            self.ssl_context = ssl.create_default_context()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=self.ssl_context if https else None), self.timeout)
+        return reader, writer, False
+
+    async def _exchange(self, reader, writer, request, method):
+        writer.write(request)
+        await writer.drain()
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise LinkProtocolError("Connection closed")
+            fields = line.decode('latin-1').split(None, 2)
+            if len(fields) < 2 or not fields[0].startswith("HTTP/") or not fields[1].isdigit():
+                raise LinkProtocolError("Not an HTTP response")
+            headers = await self._read_headers(reader)
+            code = int(fields[1])
+            if not 100 <= code < 200:
+                break
+        keep_alive = fields[0] == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if keep_alive and method != "HEAD" and code not in (204, 304):
+            # A short body with a known length is read so the connection
+            # can be used again; anything else costs less to drop.
+            length = headers.get("content-length", "")
+            if "transfer-encoding" in headers or not length.isdigit() or int(length) > LINK_MAX_DRAIN_BYTES:
+                keep_alive = False
+            else:
+                await reader.readexactly(int(length))
+        return code, fields[2].strip() if len(fields) > 2 else "", headers, keep_alive
+
+    async def _read_headers(self, reader):
+        headers = {}
+        for _ in range(LINK_MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n"):
+                return headers
+            if not line:
+                raise LinkProtocolError("Connection closed")
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise LinkProtocolError("Too many headers")
+
+
+class LinkChecker:
+    # Runs an HttpLinkChecker on an event loop in a thread of its own and
+    # keeps its answers in a LinkCache, which is read on that thread before
+    # the first check and saved after each one. check() returns at once;
+    # the callbacks are called on the loop's thread.
+
+    def __init__(self, cache, http=None):
+        self.cache = cache
+        self.http = http or HttpLinkChecker()
+        self.loaded = False
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def check(self, urls, on_result, on_done=None, full_scan=False):
+        # on_result(url, status) for every URL whose outcome changed, and
+        # for the ones already known to be broken when the cache was read;
+        # then on_done(stats). URLs checked within the cache's TTL are not
+        # checked again. A full scan drops the statuses of other URLs.
+        urls = [url for url in dict.fromkeys(urls) if is_checkable(url)]
+        asyncio.run_coroutine_threadsafe(self._run(urls, on_result, on_done, full_scan), self._event_loop())
+
+    def shutdown(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(self._stop, loop)
+
+    def _event_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="favorites-links", daemon=True).start()
+            return self._loop
+
+    def _stop(self, loop):
+        self.http.close()
+        loop.stop()
+
+    async def _run(self, urls, on_result, on_done, full_scan):
+        started = time.perf_counter()
+        if not self.loaded:
+            self.loaded = True
+            self.cache.load()
+            for url in urls:
+                status = self.cache.get(url)
+                if status is not None and status.broken:
+                    on_result(url, status)
+        if full_scan:
+            self.cache.retain(urls)
+        now = time.time()
+        stale = [url for url in urls if not self.cache.is_fresh(self.cache.get(url), now)]
+        # Unreachable links are held back until some site answers: when
+        # none does, the network is down rather than every link dead, and
+        # their statuses are left unknown so they are checked next time.
+        held = {}
+
+        def record(url, status):
+            if not status.same_outcome(self.cache.put(url, status)):
+                on_result(url, status)
+
+        def report(url, status):
+            nonlocal held
+            if held is not None:
+                if status.state == LINK_UNREACHABLE:
+                    held[url] = status
+                    return
+                waiting, held = held, None
+                for waiting_url, waiting_status in waiting.items():
+                    record(waiting_url, waiting_status)
+            record(url, status)
+        try:
+            await self.http.check_many(stale, report)
+            if held:
+                print(f"Warning: None of {len(held)} link(s) could be reached. "
+                      "The network looks down; they will be checked again later.")
+        except Exception as e:
+            print(f"Error checking links: {e}")
+            return
+        finally:
+            self.cache.save()
+        if on_done is not None:
+            seconds = time.perf_counter() - started
+            statuses = [self.cache.get(url) for url in urls]
+            on_done({
+                "links": len(urls),
+                "checked": len(stale),
+                "broken": sum(1 for status in statuses if status is not None and status.broken),
+                "seconds": seconds,
+                "per_second": len(stale) / seconds if seconds > 0 else 0.0,
+            })
@@ -0,0 +1,163 @@
+from favorites_records import RECORD_FIELDS, FavoriteRecord
+
+MERGE_FIELDS = tuple(field for field in RECORD_FIELDS if field != "id")
+
+
+def same_favorite(a, b):
+    # a and b are records or dicts; tags compare in order, as they are shown.
+    return (a['label'] == b['label'] and a['path'] == b['path'] and a['type'] == b['type']
+            and tuple(a.get('tags') or ()) == tuple(b.get('tags') or ()))
+
+
+class FavoritesDiff:
+    # What another program changed in the favorites file, by id: the
+    # records it added (in file order; records without a usable id have id
+    # None), {id: base} for the ones it removed and {id: (base, theirs)}
+    # for the ones it edited, where base is the record as the file held it
+    # before. reordered says the favorites kept on both sides no longer
+    # come in the same order; order then holds the ids of theirs in file
+    # order.
+
+    def __init__(self, added, removed, updated, reordered, order=None):
+        self.added = added
+        self.removed = removed
+        self.updated = updated
+        self.reordered = reordered
+        self.order = order
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.updated or self.reordered)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.updated)
+
+
+def diff_favorites(base, theirs):
+    # base and theirs are lists of records. Linear in their length; the
+    # result is as big as the change.
+    base_by_id = {record.id: record for record in base if record.id is not None}
+    added = []
+    updated = {}
+    seen = set()
+    kept_order = []
+    order = []
+    for record in theirs:
+        record_id = record.id
+        if record_id in seen:
+            # A copy of a favorite listed before it: a new favorite.
+            record = FavoriteRecord(None, record.label, record.path, record.type, record.tags)
+            record_id = None
+        elif record_id is not None:
+            seen.add(record_id)
+            order.append(record_id)
+        old = base_by_id.get(record_id)
+        if old is None:
+            added.append(record)
+            continue
+        kept_order.append(record_id)
+        if not same_favorite(old, record):
+            updated[record_id] = (old, record)
+    removed = {record_id: record for record_id, record in base_by_id.items() if record_id not in seen}
+    reordered = kept_order != [record.id for record in base if record.id in seen]
+    return FavoritesDiff(added, removed, updated, reordered, order if reordered else None)
+
+
+def merge_order(theirs, ours):
+    # ours (ids in the local order) rearranged to follow theirs: the ids
+    # both list come in their order, and each of the others stays right
+    # after the id it follows here, or first when it leads. None when that
+    # is the order ours already has.
+    theirs_set = set(theirs)
+    following = {}
+    anchor = None
+    for record_id in ours:
+        if record_id in theirs_set:
+            anchor = record_id
+        else:
+            following.setdefault(anchor, []).append(record_id)
+    ours_set = set(ours)
+    merged = list(following.get(None, ()))
+    for record_id in theirs:
+        if record_id in ours_set:
+            merged.append(record_id)
+            merged.extend(following.get(record_id, ()))
+    return None if merged == ours else merged
+
+
+def merge_tags(base, ours, theirs):
+    # Both sides' additions and removals; ours keeps its order.
+    base = set(base)
+    theirs_set = set(theirs)
+    merged = [tag for tag in ours if tag in theirs_set or tag not in base]
+    merged.extend(tag for tag in theirs if tag not in base and tag not in merged)
+    return merged
+
+
+def merge_favorite(base, ours, theirs):
+    # Field by field: a field only one side changed takes that change; a
+    # field both changed keeps ours. Returns a dict without the id.
+    merged = {}
+    for field in MERGE_FIELDS:
+        if field == "tags":
+            merged[field] = merge_tags(base['tags'], ours['tags'], theirs['tags'])
+        elif ours[field] == base[field]:
+            merged[field] = theirs[field]
+        else:
+            merged[field] = ours[field]
+    return merged
+
+
+class MergePlan:
+    # The changes that bring the favorites in memory up to date with a
+    # FavoritesDiff: ids to remove, {id: item} to update, records to add,
+    # and the other side's order of ids when it reordered them (see
+    # merge_order). conflicts counts the favorites both sides changed; local
+    # edits win over the other side's (field by field) and edits over
+    # removals.
+
+    def __init__(self):
+        self.removed = []
+        self.updated = {}
+        self.added = []
+        self.order = None
+        self.conflicts = 0
+
+    def __len__(self):
+        return len(self.removed) + len(self.updated) + len(self.added)
+
+
+def plan_merge(diff, ours):
+    # ours looks records up by id (a FavoritesStore). Only the ids in the
+    # diff are looked at, so this costs as much as the change.
+    plan = MergePlan()
+    plan.order = diff.order
+    for record_id, base in diff.removed.items():
+        current = ours.get(record_id)
+        if current is None:
+            continue
+        if same_favorite(current, base):
+            plan.removed.append(record_id)
+        else:
+            # Edited here, removed there: the edit wins.
+            plan.conflicts += 1
+    for record_id, (base, theirs) in diff.updated.items():
+        current = ours.get(record_id)
+        if current is None:
+            # Removed here, edited there: the edit wins.
+            plan.added.append(theirs)
+            plan.conflicts += 1
+        elif same_favorite(current, base):
+            plan.updated[record_id] = dict(theirs)
+        elif not same_favorite(current, theirs):
+            plan.conflicts += 1
+            merged = merge_favorite(base, current, theirs)
+            if not same_favorite(current, merged):
+                plan.updated[record_id] = merged
+    for record in diff.added:
+        current = ours.get(record.id) if record.id is not None else None
+        if current is None:
+            plan.added.append(record)
+        elif not same_favorite(current, record):
+            # Added here and there under the same id; ours stays.
+            plan.conflicts += 1
+    return plan
@@ -0,0 +1,247 @@
+import random
+import sys
+from collections.abc import Mapping
+from operator import attrgetter
+
+RECORD_FIELDS = ("label", "path", "type", "tags", "id")
+RECORD_ID_BITS = 53
+
+_GETTERS = {field: attrgetter(field) for field in RECORD_FIELDS}
+
+
+class FavoriteRecord(Mapping):
+    # One favorite. It reads like the dicts favorites used to be
+    # (record['label'], record.get('tags', []), dict(record)), but keeps its
+    # fields in slots, with the type and tags interned, so a million
+    # favorites share a handful of type and tag strings. Records are never
+    # changed: an edit replaces the record with a new one with the same id.
+    __slots__ = ("id", "label", "path", "type", "tags")
+
+    def __init__(self, record_id, label, path, f_type, tags=()):
+        self.id = record_id
+        self.label = label
+        self.path = path
+        self.type = sys.intern(f_type)
+        self.tags = tuple(sys.intern(tag) for tag in tags) if tags else ()
+
+    @classmethod
+    def from_dict(cls, item_data, record_id):
+        return cls(record_id, item_data['label'], item_data['path'], item_data['type'], item_data.get('tags'))
+
+    def __getitem__(self, field):
+        return _GETTERS[field](self)
+
+    def get(self, field, default=None):
+        getter = _GETTERS.get(field)
+        return default if getter is None else getter(self)
+
+    def __iter__(self):
+        return iter(RECORD_FIELDS)
+
+    def __len__(self):
+        return len(RECORD_FIELDS)
+
+    def __repr__(self):
+        return f"FavoriteRecord({self.id!r}, {self.label!r}, {self.path!r}, {self.type!r}, {list(self.tags)!r})"
+
+
+class Tombstones:
+    # The removed slots of a list that is only ever appended to: removing an
+    # item marks its slot instead of shifting every item after it. A Fenwick
+    # tree counts the removed slots below any slot, so a slot's row and a
+    # row's slot take O(log n). The owner drops the marked slots from its
+    # list in one pass (and calls clear()) once half of them are removed,
+    # which keeps that at O(1) per removal on average.
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self._tree = None
+        self._capacity = 0
+
+    def should_compact(self, slots):
+        return self.count * 2 > slots
+
+    def mark(self, slot):
+        if self._tree is None:
+            self._capacity = 1 << max(slot, 1).bit_length()
+            self._tree = [0] * (self._capacity + 1)
+        while slot >= self._capacity:
+            # Doubling leaves every existing node as it was; of the new ones
+            # only the last covers old slots, all of them.
+            self._tree.extend([0] * self._capacity)
+            self._capacity *= 2
+            self._tree[self._capacity] = self.count
+        self.count += 1
+        tree = self._tree
+        i = slot + 1
+        while i <= self._capacity:
+            tree[i] += 1
+            i += i & -i
+
+    def is_marked(self, slot):
+        return bool(self.count) and self._before(slot + 1) > self._before(slot)
+
+    def row(self, slot):
+        # The row of a slot that is not removed.
+        if not self.count:
+            return slot
+        return slot - self._before(slot)
+
+    def slot(self, row):
+        if not self.count:
+            return row
+        tree = self._tree
+        position = 0
+        remaining = row + 1
+        step = self._capacity
+        while step:
+            following = position + step
+            if following <= self._capacity:
+                kept = step - tree[following]
+                if kept < remaining:
+                    position = following
+                    remaining -= kept
+            step >>= 1
+        # Slots past the tree are all still there.
+        return position + remaining - 1
+
+    def _before(self, slot):
+        # How many slots below slot are removed.
+        tree = self._tree
+        removed = 0
+        i = min(slot, self._capacity)
+        while i:
+            removed += tree[i]
+            i -= i & -i
+        return removed
+
+
+class FavoritesStore:
+    # The favorites in order, as a list of records by slot, and the slot of
+    # each id. Looking up and replacing a favorite by id are dict
+    # operations; removing one marks its slot (see Tombstones), so rows,
+    # which only the list view needs, are found in O(log n) once anything
+    # was removed and by indexing before. Ids are random, so favorites added
+    # by two instances (or on two machines) do not share one.
+    # The ids of each path are mapped on the first rows_with_paths() call,
+    # which the GUI makes per file-system event and link result; after that
+    # every mutation keeps the map in step. It holds ids, not slots, so
+    # compacting and reordering leave it as it is.
+
+    def __init__(self):
+        self._slots = []
+        self._slot_of = {}
+        self._removed = Tombstones()
+        self._ids_by_path = None
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __iter__(self):
+        if not self._removed.count:
+            return iter(self._slots)
+        return (record for record in self._slots if record is not None)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self._slot_of)
+        if not 0 <= row < len(self._slot_of):
+            raise IndexError("favorite row out of range")
+        return self._slots[self._removed.slot(row)]
+
+    def records_at(self, rows):
+        # The records of many rows at once: past removed slots, one pass
+        # over the slots beats looking up each row.
+        if not self._removed.count or len(rows) * 16 < len(self._slot_of):
+            return [self[row] for row in rows]
+        records = [record for record in self._slots if record is not None]
+        return [records[row] for row in rows]
+
+    def get(self, record_id):
+        slot = self._slot_of.get(record_id)
+        return None if slot is None else self._slots[slot]
+
+    def has_id(self, record_id):
+        return record_id in self._slot_of
+
+    def row_of(self, record_id):
+        slot = self._slot_of.get(record_id)
+        return -1 if slot is None else self._removed.row(slot)
+
+    def rows_with_paths(self, paths):
+        # (row, record) of every favorite with one of the paths.
+        if self._ids_by_path is None:
+            self._ids_by_path = {}
+            self._map_paths(self)
+        found = []
+        for path in paths:
+            for record_id in self._ids_by_path.get(path, ()):
+                found.append((self.row_of(record_id), self._slots[self._slot_of[record_id]]))
+        return found
+
+    def new_id(self):
+        while True:
+            record_id = random.getrandbits(RECORD_ID_BITS)
+            if record_id and record_id not in self._slot_of:
+                return record_id
+
+    def extend(self, records):
+        first = len(self._slots)
+        self._slots.extend(records)
+        self._slot_of.update(zip([record.id for record in records], range(first, len(self._slots))))
+        if self._ids_by_path is not None:
+            self._map_paths(records)
+
+    def replace(self, record):
+        slot = self._slot_of[record.id]
+        if self._ids_by_path is not None and self._slots[slot].path != record.path:
+            self._unmap_path(self._slots[slot])
+            self._map_paths([record])
+        self._slots[slot] = record
+
+    def remove(self, record_id):
+        # Returns the row the favorite had.
+        return self.remove_many([record_id])[0]
+
+    def remove_many(self, record_ids):
+        # Returns the rows the favorites had before any of them was removed,
+        # in the order of record_ids.
+        slots = [self._slot_of.pop(record_id) for record_id in record_ids]
+        rows = [self._removed.row(slot) for slot in slots]
+        for slot in slots:
+            if self._ids_by_path is not None:
+                self._unmap_path(self._slots[slot])
+            self._slots[slot] = None
+            self._removed.mark(slot)
+        if self._removed.should_compact(len(self._slots)):
+            self._compact(self._slots)
+        return rows
+
+    def reorder(self, record_ids):
+        # record_ids lists every favorite, in its new order.
+        if len(record_ids) != len(self._slot_of):
+            raise ValueError("a new order must list every favorite once")
+        self._compact([self._slots[self._slot_of[record_id]] for record_id in record_ids])
+
+    def _map_paths(self, records):
+        ids_by_path = self._ids_by_path
+        for record in records:
+            ids = ids_by_path.get(record.path)
+            if ids is None:
+                ids_by_path[record.path] = [record.id]
+            else:
+                ids.append(record.id)
+
+    def _unmap_path(self, record):
+        ids = self._ids_by_path[record.path]
+        ids.remove(record.id)
+        if not ids:
+            del self._ids_by_path[record.path]
+
+    def _compact(self, records):
+        self._slots = [record for record in records if record is not None]
+        self._slot_of = {record.id: slot for slot, record in enumerate(self._slots)}
+        self._removed.clear()
@@ -0,0 +1,61 @@
+import json
+import os
+import time
+
+FRECENCY_HALF_LIFE_DAYS = 14
+
+
+def frecency_score(count, last_opened, now=None):
+    if not count:
+        return 0.0
+    if now is None:
+        now = time.time()
+    age_days = max(0.0, now - last_opened) / 86400
+    return count * 0.5 ** (age_days / FRECENCY_HALF_LIFE_DAYS)
+
+
+class LaunchStats:
+    # Launch counts and last-opened times, keyed by favorite path. Kept in
+    # their own small file so opening a favorite never rewrites favorites.json.
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = {target: (int(count), float(last_opened))
+                            for target, (count, last_opened) in data.items()}
+        except (json.JSONDecodeError, ValueError, TypeError):
+            print(f"Warning: Could not decode {self.path}. Launch statistics reset.")
+            self.entries = {}
+        except Exception as e:
+            print(f"Error loading launch statistics: {e}")
+            self.entries = {}
+
+    def get(self, target):
+        return self.entries.get(target, (0, 0.0))
+
+    def record(self, target, when=None):
+        count, _ = self.get(target)
+        entry = (count + 1, time.time() if when is None else when)
+        self.entries[target] = entry
+        self.dirty = True
+        return entry
+
+    def save(self):
+        if not self.dirty:
+            return
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+        except Exception as e:
+            print(f"Error saving launch statistics: {e}")
@@ -0,0 +1,887 @@
+import gc
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from bisect import bisect_left
+from operator import is_not
+
+from favorites_index import search_text_for, unpack_index
+from favorites_merge import diff_favorites
+from favorites_records import FavoriteRecord, Tombstones
+from favorites_trace import count, span
+
+JOURNAL_COMPACT_RECORDS = 500
+JOURNAL_COMPACT_BYTES = 256 * 1024
+SAVE_QUIET_PERIOD = 0.5
+CACHE_MAGIC = b"QFCACHE2"
+
+# Magic, the Python version that wrote the marshal data, and the mtime,
+# size and SHA-256 of the favorites file the cache was made from.
+_CACHE_HEADER = struct.Struct("<8sBBqq32s")
+
+
+def write_file_atomic(path, *chunks):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        for data in chunks:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def dump_favorites(favorites):
+    # Favorites are FavoriteRecords, which json writes through dict().
+    return json.dumps(favorites, indent=4, ensure_ascii=False, default=dict).encode('utf-8')
+
+
+def read_favorites_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    favorites_data = json.loads(data.decode('utf-8'))
+    if not isinstance(favorites_data, list):
+        raise ValueError(f"{path} does not contain a list of favorites")
+    for item in favorites_data:
+        item.setdefault('tags', [])
+    return favorites_data, hashlib.sha256(data).hexdigest()
+
+
+def file_signature(path):
+    # (mtime, size) of path, or None when it does not exist; a cheap way to
+    # tell that a file was written since it was last looked at.
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FavoritesFileChanged(Exception):
+    pass
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def read_snapshot_cache(cache_path, path):
+    # Returns (records, SHA-256 of path, packed search index) when the cache
+    # was made from path as it is now, or None. A changed size rules the
+    # cache out at once, a matching mtime is trusted, and otherwise the file
+    # is hashed, so a save that left the content as it was keeps the cache.
+    # The payload is unmarshalled straight from the mapped file, with the
+    # garbage collector paused: none of the new objects is garbage, and
+    # scanning them as they pile up would double the time.
+    gc_enabled = gc.isenabled()
+    try:
+        stat = os.stat(path)
+        with open(cache_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, major, minor, mtime_ns, size, digest = _CACHE_HEADER.unpack_from(data)
+            if magic != CACHE_MAGIC or (major, minor) != sys.version_info[:2] or size != stat.st_size:
+                return None
+            if mtime_ns != stat.st_mtime_ns and file_digest(path) != digest:
+                return None
+            gc.disable()
+            with memoryview(data) as view:
+                payload = marshal.loads(view[_CACHE_HEADER.size:])
+        records = [FavoriteRecord(*fields) for fields in zip(payload["ids"], payload["labels"], payload["paths"],
+                                                             payload["types"], payload["tags"])]
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, EOFError, TypeError, KeyError, struct.error) as e:
+        print(f"Warning: Ignoring unreadable cache {cache_path}: {e}")
+        return None
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return records, digest.hex(), payload["index"]
+
+
+def write_snapshot_cache(cache_path, stat, digest_hex, items, packed_index):
+    # stat and digest_hex describe the favorites file that holds items.
+    payload = {
+        "ids": [item.get('id') for item in items],
+        "labels": [item['label'] for item in items],
+        "paths": [item['path'] for item in items],
+        "types": [item['type'] for item in items],
+        "tags": [tuple(item.get('tags', ())) for item in items],
+        "index": packed_index,
+    }
+    header = _CACHE_HEADER.pack(CACHE_MAGIC, *sys.version_info[:2], stat.st_mtime_ns, stat.st_size,
+                                bytes.fromhex(digest_hex))
+    write_file_atomic(cache_path, header, marshal.dumps(payload))
+
+
+def as_record(item):
+    if isinstance(item, FavoriteRecord):
+        return item
+    return FavoriteRecord.from_dict(item, item.get('id'))
+
+
+def read_journal(path):
+    records = []
+    valid_length = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A torn last line from a crash mid-append; everything
+                # before it was fsync'd and is still valid.
+                print(f"Warning: Ignoring damaged record at the end of {path}.")
+                break
+            valid_length += len(line)
+    return records, valid_length
+
+
+def is_compaction_marker(record, snapshot_hash):
+    return record["op"] == "compacted" and record["sha256"] == snapshot_hash
+
+
+def keyed_favorites(items):
+    # The favorites by id, in list order, which is what changes apply to. An
+    # item without an id, or with one taken already, is keyed by a new
+    # object that no change names; the core gives it an id and saves them
+    # all once loaded.
+    favorites = {}
+    for item in items:
+        record_id = item.get('id')
+        if type(record_id) is not int or record_id in favorites:
+            record_id = object()
+        favorites[record_id] = item
+    return favorites
+
+
+def apply_change(favorites, change):
+    # favorites are keyed as by keyed_favorites(). Updating an id that is
+    # not there appends the favorite and deleting one is a no-op.
+    op = change[0]
+    if op == "add":
+        favorites[change[1]['id']] = change[1]
+    elif op == "update":
+        favorites[change[1]] = change[2]
+    elif op == "delete":
+        favorites.pop(change[1], None)
+    elif op in ("update_row", "delete_row"):
+        # Read from a journal written while changes named rows.
+        record_id = list(favorites)[change[1]]
+        if op == "update_row":
+            favorites[record_id] = change[2]
+        else:
+            del favorites[record_id]
+    else:
+        raise ValueError(f"Unknown favorites change: {op!r}")
+
+
+def change_to_record(change):
+    op = change[0]
+    if op == "add":
+        return {"op": op, "item": change[1]}
+    if op == "update":
+        return {"op": op, "id": change[1], "item": change[2]}
+    return {"op": op, "id": change[1]}
+
+
+def record_to_change(record):
+    op = record["op"]
+    if op == "add":
+        return (op, record["item"])
+    if "index" in record:
+        if op == "update":
+            return ("update_row", record["index"], record["item"])
+        return ("delete_row", record["index"])
+    if op == "update":
+        return (op, record["id"], record["item"])
+    return (op, record["id"])
+
+
+class FavoritesStorage:
+    # Backends persist the ordered favorites list. Changes are the tuples
+    # ("add", item), ("update", id, item) and ("delete", id), naming the
+    # favorite by its stable "id", which items carry and backends store
+    # with the rest; an update keeps the favorite's place in the list.
+    supports_search = False
+    # Set by load() when it restored the search index of the loaded list,
+    # for the caller to take (see SearchIndex.restore).
+    cached_index = None
+    # A file other programs may write to; see read_external_change().
+    watch_path = None
+
+    def load(self):
+        raise NotImplementedError
+
+    def apply_changes(self, changes):
+        raise NotImplementedError
+
+    def save_all(self, favorites):
+        raise NotImplementedError
+
+    def search(self, text):
+        raise NotImplementedError
+
+    def write_cache(self, favorites, index, background=False):
+        pass
+
+    def read_external_change(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class JournalStorage(FavoritesStorage):
+    # favorites.json stays a plain snapshot in the original format. Every
+    # change is appended to favorites.json.journal as one compact JSON line
+    # and fsync'd; load replays the journal over the snapshot. Once the
+    # journal grows past a threshold it is renamed to a numbered generation
+    # (favorites.json.journal.1, .2, ...) and folded into a new snapshot on a
+    # background thread, while new changes go to a fresh journal.
+    #
+    # Before the new snapshot replaces the old one, a "compacted" record with
+    # the snapshot's hash is appended to the newest generation. On load the
+    # newest generation whose marker matches the snapshot on disk tells which
+    # generations the snapshot already contains, so a crash at any point
+    # loses nothing and applies nothing twice.
+    #
+    # favorites.json.cache holds the snapshot once more, as marshal data
+    # with the favorites in columns and the packed search index, valid for
+    # one exact favorites.json (see read_snapshot_cache). With it a start
+    # neither parses the JSON nor re-indexes. It is written at exit from the
+    # index in memory, and in the background once a start that found it
+    # missing or stale has built the index; favorites.json stays the source
+    # of truth.
+    #
+    # Other programs (an editor, a sync client) may replace favorites.json
+    # too. The records it held when last read or written are kept, so
+    # read_external_change() can tell what such a program changed, and a
+    # snapshot is never written over a file that changed since then (the
+    # write fails with FavoritesFileChanged until the change was read).
+    # Once read, the change is only in memory until the caller saves the
+    # merged favorites, so until save_all() the journal is not compacted:
+    # a snapshot of the items from before the merge would be written over
+    # the other program's file.
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.cache_path = f"{path}.cache"
+        self.lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self.watch_path = path
+        self._snapshot_hash = None
+        self._snapshot_items = []
+        self._snapshot_signature = None
+        self._merge_pending = False
+        self._cache_current = False
+        # The favorites as loaded or saved, keyed (see keyed_favorites) once
+        # a change has to find one by id.
+        self._items = []
+        self._journal = None
+        self._journal_records = 0
+        self._journal_bytes = 0
+        self._compaction = None
+
+    def load(self):
+        packed_index = None
+        # Taken before reading, so a write that comes in meanwhile shows.
+        signature = file_signature(self.path)
+        if os.path.exists(self.path):
+            with span("load.cache"):
+                cached = read_snapshot_cache(self.cache_path, self.path)
+            if cached is not None:
+                items, snapshot_hash, packed_index = cached
+                count("load.cache_hits")
+            else:
+                items, snapshot_hash = read_favorites_file(self.path)
+                count("load.cache_misses")
+        else:
+            items, snapshot_hash = [], None
+        items = [as_record(item) for item in items]
+        snapshot_items = list(items)
+
+        generations = self._generations()
+        generation_records = {}
+        compacted_through = 0
+        for generation in generations:
+            records, _ = read_journal(self._generation_path(generation))
+            generation_records[generation] = records
+            if records and is_compaction_marker(records[-1], snapshot_hash):
+                compacted_through = generation
+        replay = []
+        for generation in generations:
+            if generation > compacted_through:
+                replay.extend(record for record in generation_records[generation] if record["op"] != "compacted")
+
+        journal_records = []
+        valid_length = 0
+        if os.path.exists(self.journal_path):
+            journal_records, valid_length = read_journal(self.journal_path)
+            replay.extend(journal_records)
+
+        replayed = bool(replay)
+        if replayed:
+            # Changes name favorites by id, so a journal left by a crash
+            # replays right over a favorites.json another program changed
+            # since; an edit of a favorite it removed brings it back, as an
+            # edit wins over a removal in a merge. Only journals from before
+            # ids name rows, and those can point past the end.
+            favorites = keyed_favorites(items)
+            for record in replay:
+                try:
+                    apply_change(favorites, record_to_change(record))
+                except IndexError:
+                    print(f"Warning: Ignoring a journal change to row {record['index']}, "
+                          f"which {self.path} no longer has.")
+            items = [as_record(item) for item in favorites.values()]
+        # The cached index is only of use for the list exactly as cached.
+        self.cached_index = unpack_index(packed_index, items) if packed_index is not None and not replayed else None
+        with self.lock:
+            self._snapshot_hash = snapshot_hash
+            self._snapshot_items = snapshot_items
+            self._snapshot_signature = signature
+            self._cache_current = packed_index is not None
+            self._items = items
+            # Opened here only to cut off a torn last record; the first
+            # change opens it otherwise, so loading alone creates nothing.
+            if os.path.exists(self.journal_path):
+                self._open_journal()
+                if self._journal.tell() != valid_length:
+                    self._journal.truncate(valid_length)
+            self._journal_records = len(journal_records)
+            self._journal_bytes = valid_length
+
+        if generations:
+            # Settle an interrupted compaction in the background.
+            self.compact()
+        return list(items)
+
+    def apply_changes(self, changes):
+        with self.lock:
+            data = b"".join(
+                (json.dumps(change_to_record(change), ensure_ascii=False, separators=(',', ':'), default=dict) + "\n").encode('utf-8')
+                for change in changes
+            )
+            if self._journal is None:
+                self._open_journal()
+                if self._journal.tell() != self._journal_bytes:
+                    # Left behind by a write that failed part way.
+                    self._journal.truncate(self._journal_bytes)
+            try:
+                self._journal.write(data)
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            except BaseException:
+                # A partial record would end the journal for the next load
+                # and hide the retry and everything after it, so the file
+                # is cut back to the last whole record.
+                self._drop_torn_journal()
+                raise
+            if not isinstance(self._items, dict):
+                self._items = keyed_favorites(self._items)
+            for change in changes:
+                apply_change(self._items, change)
+            self._journal_records += len(changes)
+            self._journal_bytes += len(data)
+            needs_compaction = (self._journal_records >= JOURNAL_COMPACT_RECORDS
+                                or self._journal_bytes >= JOURNAL_COMPACT_BYTES)
+        if needs_compaction:
+            self.compact()
+
+    def save_all(self, favorites):
+        self.wait_for_compaction()
+        with self.lock:
+            self._items = list(favorites)
+            self._merge_pending = False
+            generations = self._rotate_journal(force=True)
+            self._write_compacted(self._items, generations)
+
+    def compact(self, wait=False):
+        with self.lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                compaction = self._compaction
+            elif self._merge_pending:
+                compaction = None
+            else:
+                generations = self._rotate_journal()
+                compaction = None
+                if generations:
+                    compaction = threading.Thread(target=self._run_compaction,
+                                                  args=(self._item_list(), generations),
+                                                  name="favorites-compaction")
+                    self._compaction = compaction
+                    compaction.start()
+        if wait and compaction is not None:
+            compaction.join()
+
+    def wait_for_compaction(self):
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def close(self):
+        self.wait_for_compaction()
+        self.compact(wait=True)
+        with self.lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def write_cache(self, favorites, index, background=False):
+        # favorites are the records in memory and index their search index,
+        # as they stand on the calling thread; nothing is written unless
+        # they are the very records favorites.json holds, as they are after
+        # loading or a clean close. In the background, an edit made before
+        # the index is packed cancels the write.
+        version = index.version
+        with self.lock:
+            source = self._cache_source()
+            if source is None:
+                return
+            items, stat, snapshot_hash = source
+            if len(items) != len(favorites) or any(map(is_not, items, favorites)):
+                return
+        if background:
+            threading.Thread(target=self._pack_and_write_cache, args=(index, version, items, stat, snapshot_hash),
+                             name="favorites-cache", daemon=True).start()
+        else:
+            self._pack_and_write_cache(index, version, items, stat, snapshot_hash)
+
+    def read_external_change(self):
+        # For the writer thread, when favorites.json may have been written by
+        # another program: the FavoritesDiff from what it held before to what
+        # it holds now, or None when it is unchanged (or unreadable, e.g.
+        # half-written, in which case the next look tries again). From then
+        # on the new contents are the snapshot; the caller merges the diff
+        # into its favorites and saves them with save_all().
+        self.wait_for_compaction()
+        signature = file_signature(self.path)
+        if signature is None or signature == self._snapshot_signature:
+            return None
+        try:
+            items, snapshot_hash = read_favorites_file(self.path)
+            theirs = [FavoriteRecord.from_dict(item, item.get('id') if type(item.get('id')) is int else None)
+                      for item in items]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Warning: Ignoring a change to {self.path} made by another program: {e}")
+            return None
+        with self.lock:
+            self._snapshot_signature = signature
+            if snapshot_hash == self._snapshot_hash:
+                return None
+            diff = diff_favorites(self._snapshot_items, theirs)
+            self._snapshot_items = theirs
+            self._snapshot_hash = snapshot_hash
+            self._merge_pending = True
+            self._cache_current = False
+        return diff
+
+    def _cache_source(self):
+        # (items, stat, hash) of favorites.json when it holds exactly the
+        # current items and the cache is out of date; called with the lock.
+        if (self._cache_current or self._snapshot_hash is None or self._journal_records or self._merge_pending
+                or (self._compaction is not None and self._compaction.is_alive()) or self._generations()):
+            return None
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return self._item_list(), stat, self._snapshot_hash
+
+    def _item_list(self):
+        return list(self._items.values() if isinstance(self._items, dict) else self._items)
+
+    def _pack_and_write_cache(self, index, version, items, stat, snapshot_hash):
+        packed_index = index.pack(version)
+        if packed_index is None:
+            return
+        with self._cache_lock:
+            if snapshot_hash != self._snapshot_hash:
+                # favorites.json was saved again meanwhile.
+                return
+            try:
+                write_snapshot_cache(self.cache_path, stat, snapshot_hash, items, packed_index)
+            except (OSError, ValueError) as e:
+                print(f"Error writing favorites cache: {e}")
+                return
+            self._cache_current = snapshot_hash == self._snapshot_hash
+
+    def _run_compaction(self, snapshot, generations):
+        try:
+            self._write_compacted(snapshot, generations)
+        except Exception as e:
+            # The journal generations are still on disk and are replayed
+            # on the next load.
+            print(f"Error compacting favorites journal: {e}")
+
+    def _write_compacted(self, snapshot, generations):
+        if self._merge_pending or file_signature(self.path) != self._snapshot_signature:
+            raise FavoritesFileChanged(f"{self.path} was changed by another program; "
+                                       f"it is saved again once the changes are merged")
+        data = dump_favorites(snapshot)
+        marker = {"op": "compacted", "sha256": hashlib.sha256(data).hexdigest()}
+        with open(self._generation_path(generations[-1]), 'ab') as f:
+            f.write((json.dumps(marker) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        # The file may already hold exactly this, e.g. after a merge.
+        if marker["sha256"] != self._snapshot_hash:
+            write_file_atomic(self.path, data)
+            self._snapshot_signature = file_signature(self.path)
+        self._snapshot_hash = marker["sha256"]
+        self._snapshot_items = list(snapshot)
+        self._cache_current = False
+        for generation in generations:
+            os.remove(self._generation_path(generation))
+
+    def _rotate_journal(self, force=False):
+        generations = self._generations()
+        if self._journal_records or force:
+            generation = generations[-1] + 1 if generations else 1
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self._generation_path(generation))
+            generations.append(generation)
+            self._open_journal(truncate=True)
+        return generations
+
+    def _generations(self):
+        directory = os.path.dirname(self.journal_path) or '.'
+        prefix = os.path.basename(self.journal_path) + '.'
+        generations = []
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                generations.append(int(name[len(prefix):]))
+        return sorted(generations)
+
+    def _generation_path(self, generation):
+        return f"{self.journal_path}.{generation}"
+
+    def _drop_torn_journal(self):
+        # Called with the lock; the next change opens the journal again and
+        # cuts it back there if this could not.
+        journal, self._journal = self._journal, None
+        try:
+            journal.close()
+        except OSError:
+            pass
+        try:
+            os.truncate(self.journal_path, self._journal_bytes)
+        except OSError:
+            pass
+
+    def _open_journal(self, truncate=False):
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, 'wb' if truncate else 'ab')
+        if truncate:
+            self._journal_records = 0
+            self._journal_bytes = 0
+
+
+class SqliteStorage(FavoritesStorage):
+    # One row per favorite, ordered by rowid, with the favorite's stable id
+    # in uid (databases from before ids get the column added), which changes
+    # find through an index. The rowids in list order map search results to
+    # positions; a deleted row's rowid stays there, marked as removed (see
+    # Tombstones), until half of them are. An FTS5 table with the trigram
+    # tokenizer indexes the same "label type tags" text as the in-memory
+    # search index, so substring search can run inside the database. On first
+    # use an existing favorites.json is imported; the JSON file is left as is.
+    supports_search = True
+
+    def __init__(self, path, import_path=None):
+        self.path = path
+        self.import_path = import_path
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = []
+        self._removed = Tombstones()
+        self._has_fts = True
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            import sqlite3
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _create_schema(self, connection):
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS favorites (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                label TEXT NOT NULL,
+                path TEXT NOT NULL,
+                type TEXT NOT NULL,
+                tags TEXT NOT NULL DEFAULT '[]',
+                search_text TEXT NOT NULL,
+                uid INTEGER
+            );
+        """)
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(favorites)")]
+        if 'uid' not in columns:
+            connection.execute("ALTER TABLE favorites ADD COLUMN uid INTEGER")
+        connection.execute("CREATE INDEX IF NOT EXISTS favorites_uid ON favorites (uid)")
+        try:
+            connection.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS favorites_fts USING fts5(
+                    search_text, content='favorites', content_rowid='id', tokenize='trigram'
+                );
+                CREATE TRIGGER IF NOT EXISTS favorites_ai AFTER INSERT ON favorites BEGIN
+                    INSERT INTO favorites_fts(rowid, search_text) VALUES (new.id, new.search_text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS favorites_ad AFTER DELETE ON favorites BEGIN
+                    INSERT INTO favorites_fts(favorites_fts, rowid, search_text)
+                    VALUES ('delete', old.id, old.search_text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS favorites_au AFTER UPDATE ON favorites BEGIN
+                    INSERT INTO favorites_fts(favorites_fts, rowid, search_text)
+                    VALUES ('delete', old.id, old.search_text);
+                    INSERT INTO favorites_fts(rowid, search_text) VALUES (new.id, new.search_text);
+                END;
+            """)
+        except Exception as e:
+            # SQLite builds without FTS5 or the trigram tokenizer (< 3.34)
+            # still work; search falls back to a table scan.
+            print(f"Warning: SQLite full-text search unavailable ({e}). Using table scans.")
+            self._has_fts = False
+
+    def load(self):
+        connection = self._connection()
+        self._create_schema(connection)
+        migrated = connection.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone()
+        if not migrated:
+            favorites = []
+            if self.import_path and os.path.exists(self.import_path):
+                favorites, _ = read_favorites_file(self.import_path)
+            with connection:
+                self._insert_all(connection, favorites)
+                connection.execute("INSERT OR REPLACE INTO meta VALUES ('migrated', '1')")
+
+        favorites = []
+        ids = []
+        for row_id, label, path, f_type, tags, uid in connection.execute(
+                "SELECT id, label, path, type, tags, uid FROM favorites ORDER BY id"):
+            ids.append(row_id)
+            item = {"label": label, "path": path, "type": f_type, "tags": json.loads(tags)}
+            if uid is not None:
+                item["id"] = uid
+            favorites.append(item)
+        with self.lock:
+            self._ids = ids
+            self._removed.clear()
+        return favorites
+
+    def _insert_all(self, connection, favorites):
+        connection.execute("DELETE FROM favorites")
+        connection.executemany(
+            "INSERT INTO favorites (label, path, type, tags, search_text, uid) VALUES (?, ?, ?, ?, ?, ?)",
+            [self._row_values(item) for item in favorites]
+        )
+
+    def _row_values(self, item):
+        return (item['label'], item['path'], item['type'],
+                json.dumps(item.get('tags', []), ensure_ascii=False), search_text_for(item), item.get('id'))
+
+    def apply_changes(self, changes):
+        connection = self._connection()
+        with self.lock, connection:
+            for change in changes:
+                op = change[0]
+                if op in ("add", "update"):
+                    # Like apply_change(): an update of an id that is not
+                    # there adds the favorite at the end.
+                    item = change[-1]
+                    cursor = connection.execute(
+                        "UPDATE favorites SET label = ?, path = ?, type = ?, tags = ?, search_text = ? WHERE uid = ?",
+                        self._row_values(item))
+                    if not cursor.rowcount:
+                        cursor = connection.execute(
+                            "INSERT INTO favorites (label, path, type, tags, search_text, uid) VALUES (?, ?, ?, ?, ?, ?)",
+                            self._row_values(item))
+                        self._ids.append(cursor.lastrowid)
+                elif op == "delete":
+                    row = connection.execute("SELECT id FROM favorites WHERE uid = ?", (change[1],)).fetchone()
+                    if row is not None:
+                        connection.execute("DELETE FROM favorites WHERE id = ?", row)
+                        self._removed.mark(bisect_left(self._ids, row[0]))
+                else:
+                    raise ValueError(f"Unknown favorites change: {op!r}")
+            if self._removed.should_compact(len(self._ids)):
+                self._ids = [row_id for row_id, in connection.execute("SELECT id FROM favorites ORDER BY id")]
+                self._removed.clear()
+
+    def save_all(self, favorites):
+        connection = self._connection()
+        with self.lock, connection:
+            self._insert_all(connection, favorites)
+            self._ids = [row_id for row_id, in connection.execute("SELECT id FROM favorites ORDER BY id")]
+            self._removed.clear()
+
+    def search(self, text):
+        with span("search.sqlite"):
+            return self._search(text)
+
+    def _search(self, text):
+        search_text = text.lower()
+        connection = self._connection()
+        if not search_text:
+            cursor = connection.execute("SELECT id FROM favorites ORDER BY id")
+        elif self._has_fts and len(search_text) >= 3:
+            phrase = '"' + search_text.replace('"', '""') + '"'
+            cursor = connection.execute(
+                "SELECT rowid FROM favorites_fts WHERE favorites_fts MATCH ? ORDER BY rowid", (phrase,))
+        else:
+            cursor = connection.execute(
+                "SELECT id FROM favorites WHERE instr(search_text, ?) > 0 ORDER BY id", (search_text,))
+        row_ids = [row_id for row_id, in cursor]
+        positions = []
+        with self.lock:
+            ids = self._ids
+            removed = self._removed
+            for row_id in row_ids:
+                i = bisect_left(ids, row_id)
+                # A row deleted since the query ran is skipped.
+                if i < len(ids) and ids[i] == row_id and not removed.is_marked(i):
+                    positions.append(removed.row(i))
+        return positions
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class WriteBehindQueue:
+    # Collects changes from the GUI thread and writes them on a single
+    # background thread once no new change has arrived for the quiet period,
+    # so a burst of edits costs one journal append (or one transaction).
+    # on_state_changed(pending, last_flushed, error) is called from whichever
+    # thread changed the state.
+
+    def __init__(self, storage, quiet_period=SAVE_QUIET_PERIOD, on_state_changed=None):
+        self.storage = storage
+        self.quiet_period = quiet_period
+        self.on_state_changed = on_state_changed
+        self.lock = threading.Lock()
+        self.last_flushed = None
+        self.last_error = None
+        self._pending = []
+        self._snapshot = None
+        self._timer = None
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="favorites-writer")
+
+    def pending_count(self):
+        with self.lock:
+            return len(self._pending) + (1 if self._snapshot is not None else 0)
+
+    def has_pending(self):
+        return self.pending_count() > 0
+
+    def submit(self, changes):
+        with self.lock:
+            self._pending.extend(changes)
+            self._restart_timer()
+        self._notify()
+
+    def submit_snapshot(self, favorites):
+        # A full snapshot supersedes every change queued before it.
+        with self.lock:
+            self._snapshot = list(favorites)
+            self._pending = []
+            self._restart_timer()
+        self._notify()
+
+    def load(self):
+        # Loading goes through the writer thread too, so it always finishes
+        # before any later write or close() touches the storage.
+        return self._executor.submit(self._load)
+
+    def call(self, function, *args):
+        # Runs function on the writer thread after everything handed to it
+        # before; returns a future.
+        return self._executor.submit(function, *args)
+
+    def flush(self, wait=False):
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        future = self._executor.submit(self._write_pending)
+        if wait:
+            future.result()
+
+    def close(self):
+        self.flush(wait=True)
+        self._executor.submit(self.storage.close).result()
+        self._executor.shutdown()
+
+    def _load(self):
+        with span("load.storage"):
+            return self.storage.load()
+
+    def _restart_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.quiet_period, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _write_pending(self):
+        with self.lock:
+            snapshot, changes = self._snapshot, self._pending
+            self._snapshot, self._pending = None, []
+        if snapshot is None and not changes:
+            return
+        try:
+            with span("save"):
+                if snapshot is not None:
+                    self.storage.save_all(snapshot)
+                    snapshot = None
+                    count("save.snapshots")
+                if changes:
+                    self.storage.apply_changes(changes)
+                    count("save.changes", len(changes))
+            self.last_flushed = time.time()
+            self.last_error = None
+        except Exception as e:
+            print(f"Error saving favorites: {e}")
+            count("save.errors")
+            self.last_error = str(e)
+            with self.lock:
+                # What was not written goes back in front of what was queued
+                # meanwhile, to be retried with the next flush; backends
+                # write a batch as a single append or transaction, so
+                # nothing lands twice. A snapshot submitted meanwhile
+                # already holds all of it.
+                if self._snapshot is None:
+                    self._snapshot = snapshot
+                    self._pending[:0] = changes
+        self._notify()
+
+    def _notify(self):
+        if self.on_state_changed is not None:
+            self.on_state_changed(self.pending_count(), self.last_flushed, self.last_error)
+
+
+def open_storage(backend, favorites_path, database_path):
+    if backend == "sqlite":
+        return SqliteStorage(database_path, import_path=favorites_path)
+    if backend != "json":
+        print(f"Warning: Unknown storage backend '{backend}'. Using JSON.")
+    return JournalStorage(favorites_path)
@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+TRACE_SAMPLES = 1024
+TRACE_MAX_EVENTS = 500_000
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33, 66, 125, 250, 500, 1000)
+
+
+class LatencyHistogram:
+    # The last TRACE_SAMPLES durations of one span, plus running totals over
+    # every sample. Percentiles and buckets are computed from the recent
+    # samples, so they follow what the app is doing now.
+
+    def __init__(self, size=TRACE_SAMPLES):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.samples.append(ms)
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, fraction, ordered=None):
+        ordered = ordered or sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def buckets(self):
+        # Sample counts per HISTOGRAM_BOUNDS_MS bucket; the last one counts
+        # everything slower than the last bound.
+        counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        for ms in self.samples:
+            counts[bisect_left(HISTOGRAM_BOUNDS_MS, ms)] += 1
+        return counts
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5, ordered),
+            "p90_ms": self.percentile(0.9, ordered),
+            "p99_ms": self.percentile(0.99, ordered),
+            "max_ms": self.max_ms,
+            "buckets": self.buckets(),
+        }
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "started")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.started, time.perf_counter())
+        return False
+
+
+class Tracer:
+    # Times named spans ("search", "save", ...) into rolling histograms and
+    # keeps named counters. Until enable() is called, span() hands out one
+    # shared do-nothing context manager and count() returns at once, so the
+    # instrumentation left in the hot paths costs a flag check. With
+    # events=True every span is also kept as a Chrome trace event (up to
+    # TRACE_MAX_EVENTS) for write_chrome_trace(). Safe to use from any
+    # thread.
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.events = None
+        self.started = time.perf_counter()
+        self._thread_names = {}
+
+    def enable(self, events=False):
+        with self.lock:
+            self.enabled = True
+            if events and self.events is None:
+                self.events = []
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            if self.events is not None:
+                self.events = []
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name, started, finished):
+        # started and finished are time.perf_counter() values.
+        ms = (finished - started) * 1000
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(ms)
+            if self.events is not None and len(self.events) < TRACE_MAX_EVENTS:
+                thread = threading.current_thread()
+                self._thread_names.setdefault(thread.ident, thread.name)
+                self.events.append((name, started, ms, thread.ident))
+
+    def snapshot(self):
+        # Everything measured so far as plain data, e.g. for the "stats"
+        # command.
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "spans": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def chrome_trace(self):
+        # The trace-event format read by chrome://tracing and Perfetto:
+        # complete ("X") events in microseconds, plus thread names.
+        pid = os.getpid()
+        with self.lock:
+            events = list(self.events or ())
+            thread_names = dict(self._thread_names)
+            counters = dict(self.counters)
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                 for tid, name in thread_names.items()]
+        trace.extend({"name": name, "cat": "quickfavs", "ph": "X", "pid": pid, "tid": tid,
+                      "ts": (started - self.started) * 1e6, "dur": ms * 1000}
+                     for name, started, ms, tid in events)
+        if counters:
+            trace.append({"name": "counters", "ph": "C", "pid": pid, "tid": 0,
+                          "ts": (time.perf_counter() - self.started) * 1e6, "args": counters})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        from favorites_storage import write_file_atomic
+
+        write_file_atomic(path, json.dumps(self.chrome_trace()).encode('utf-8'))
+
+
+# The one tracer the app and its modules report to.
+tracer = Tracer()
+span = tracer.span
+count = tracer.count
@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+
+from favorites_ipc import print_result, send_command
+
+# Commands that must leave the stored favorites untouched.
+READ_ONLY_COMMANDS = ("list", "search", "open", "export")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="quickfavs",
+        description="List, query, add, remove and open QuickFavs favorites without starting the GUI. "
+                    "When QuickFavs is running, it carries out the command instead.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="print all favorites")
+
+    query_parser = commands.add_parser("query", help="print favorites matching TEXT, e.g. -- tag:work -tag:old type:url docs")
+    query_parser.add_argument("text", nargs="+")
+    query_parser.add_argument("--fuzzy", action="store_true", help="match characters in order and rank the results")
+
+    add_parser = commands.add_parser("add", help="add a favorite")
+    add_parser.add_argument("label")
+    add_parser.add_argument("path")
+    add_parser.add_argument("--type", choices=["File", "Folder", "URL", "App"],
+                            help="guessed from the path when left out")
+    add_parser.add_argument("--tags", default="", help="comma-separated")
+
+    remove_parser = commands.add_parser("remove", help="remove the favorite with this exact name")
+    remove_parser.add_argument("label", nargs="+")
+
+    open_parser = commands.add_parser("open", help="open a favorite by name (or best match)")
+    open_parser.add_argument("name", nargs="+")
+
+    import_parser = commands.add_parser("import", help="add the bookmarks in FILE, skipping ones already there")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=["html", "json", "csv"],
+                               help="guessed from the file name when left out")
+
+    export_parser = commands.add_parser("export", help="write all favorites to FILE")
+    export_parser.add_argument("file")
+    export_parser.add_argument("--format", choices=["html", "json", "csv"],
+                               help="taken from the file name when left out")
+
+    stats_parser = commands.add_parser("stats", help="print the timings and counters of the running QuickFavs as JSON")
+    stats_parser.add_argument("--enable", action="store_true", help="start collecting them if QuickFavs is not already")
+    return parser
+
+
+def request_for(args):
+    if args.command == "query":
+        return "search", args.text, {"fuzzy": args.fuzzy}
+    if args.command == "add":
+        return "add", [args.label, args.path], {"type": args.type, "tags": args.tags.split(',')}
+    if args.command == "remove":
+        return "remove", args.label, {}
+    if args.command == "open":
+        return "open", args.name, {}
+    if args.command in ("import", "export"):
+        return args.command, [os.path.abspath(args.file)], {"format": args.format}
+    if args.command == "stats":
+        return "stats", [], {"enable": args.enable}
+    return "list", [], {}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    command, command_args, options = request_for(args)
+
+    # A running QuickFavs owns the favorites, so it has to make the change.
+    try:
+        response = send_command(command, command_args, options)
+    except (OSError, ValueError) as e:
+        print(f"Error talking to QuickFavs: {e}", file=sys.stderr)
+        return 1
+    if response is not None:
+        if not response.get("ok"):
+            print(f"Error: {response.get('error')}", file=sys.stderr)
+            return 1
+        print_result(command, response.get("result"))
+        return 0
+    if command == "stats":
+        print("QuickFavs is not running.", file=sys.stderr)
+        return 1
+
+    from favorites_core import FavoritesCore
+
+    # Ranking is the only thing a one-shot command needs the index for.
+    core = FavoritesCore(indexed=options.get("fuzzy", False))
+    try:
+        core.load(save_ids=command not in READ_ONLY_COMMANDS)
+        result = core.run_command(command, command_args, options)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        core.close()
+    print_result(command, result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
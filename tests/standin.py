@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInServer(ThreadingHTTPServer):
+    # A local HTTP/1.1 server that answers after latency seconds and fails
+    # fail_rate of all requests with a 503. The first part of a URL's path
+    # says how it answers (see StandInHandler). It records each request,
+    # counts the connections it was opened and the most it had open at
+    # once. Used by the tests and benchmarks/link_check.py; as a context
+    # manager it serves from a thread of its own.
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, fail_rate=0.0, seed=1):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.connections = 0
+        self.open_connections = 0
+        self.most_open_connections = 0
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up waiting close their end; that is expected.
+        pass
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # /ok/... answers 200, /missing/... 404, /forbidden/... 403 and
+    # /no-head/... 405 to HEAD only. /redirect/<rest> redirects with a 301
+    # to /<rest>, so /redirect/redirect/ok/1 takes two hops; any other
+    # first part answers 200. /gone-after-redirect/... redirects to a 404
+    # and /drop/... closes the connection without an answer.
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+            self.server.open_connections += 1
+            self.server.most_open_connections = max(self.server.most_open_connections,
+                                                    self.server.open_connections)
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            with self.server.lock:
+                self.server.open_connections -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._answer(head=True)
+
+    def do_GET(self):
+        self._answer(head=False)
+
+    def _answer(self, head):
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path))
+            failed = self.server.random.random() < self.server.fail_rate
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        kind = self.path.split("/")[1]
+        if kind == "drop":
+            self.close_connection = True
+            return
+        if failed:
+            self._reply(503)
+        elif kind == "missing":
+            self._reply(404)
+        elif kind == "no-head" and head:
+            self._reply(405)
+        elif kind == "redirect":
+            self._reply(301, location=self.path[len("/redirect"):])
+        elif kind == "gone-after-redirect":
+            self._reply(302, location=self.path.replace("/gone-after-redirect/", "/missing/"))
+        elif kind == "forbidden":
+            self._reply(403)
+        else:
+            self._reply(200, body=b"" if head else b"<html></html>")
+
+    def _reply(self, code, location=None, body=b""):
+        self.send_response(code)
+        if location:
+            self.send_header("Location", location)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
@@ -0,0 +1,136 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from favorites_icons import HttpFaviconFetcher, IconDiskCache, LruCache
+
+
+class FaviconServer:
+    # A local stand-in for the sites: answers /<host>.ico with the icon
+    # given for that host, or 404, and counts the requests per path.
+
+    def __init__(self, icons):
+        self.icons = icons
+        self.requests = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests[self.path] = server.requests.get(self.path, 0) + 1
+                data = server.icons.get(self.path[1:].removesuffix(".ico"))
+                if data is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def fetcher(self):
+        return HttpFaviconFetcher(f"http://127.0.0.1:{self.httpd.server_port}/{{host}}.ico", timeout=2)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def test_lru_cache_stays_within_its_byte_bound():
+    cache = LruCache(100)
+    for key in "abcd":
+        cache.put(key, key.upper(), 30)
+    assert cache.size == 90 and len(cache) == 3
+    cache.get("b")
+    cache.put("e", "E", 40)
+    # "a" went when "d" came; "c" is now the least recently used, as "b"
+    # was just read, and dropping it is enough to make room.
+    assert "a" not in cache and "c" not in cache
+    assert cache.size == 100 and [cache.get(key) for key in "bde"] == ["B", "D", "E"]
+    cache.put("f", "F", 250)
+    # A single entry over the bound is kept rather than nothing.
+    assert len(cache) == 1 and cache.size == 250
+
+
+def test_fetcher_reads_the_stand_in_and_misses_cleanly():
+    with FaviconServer({"a.test": b"icon bytes"}) as server:
+        fetcher = server.fetcher()
+        assert fetcher.fetch("https://a.test") == b"icon bytes"
+        assert fetcher.fetch("https://b.test") is None
+        fetcher.max_bytes = 4
+        assert fetcher.fetch("https://a.test") is None
+
+
+def png(qt_app, color):
+    from PyQt6.QtGui import QColor, QImage
+
+    from QuickFavs import encode_png
+
+    image = QImage(16, 16, QImage.Format.Format_ARGB32)
+    image.fill(QColor(color))
+    return encode_png(image)
+
+
+def load_icons(qt_app, loader, urls):
+    # Asks for the icons of urls and runs the GUI thread's events until
+    # the workers have answered every one.
+    for url in urls:
+        loader.icon_for({"label": url, "path": url, "type": "URL"})
+    deadline = time.monotonic() + 5
+    while loader.pending and time.monotonic() < deadline:
+        qt_app.processEvents()
+        time.sleep(0.005)
+    assert not loader.pending
+
+
+def test_favicons_are_fetched_once_and_then_read_from_the_disk_cache(qt_app, tmp_path):
+    from QuickFavs import IconLoader
+
+    icons = {"a.test": png(qt_app, "red"), "b.test": png(qt_app, "blue")}
+    with FaviconServer(icons) as server:
+        loader = IconLoader(IconDiskCache(str(tmp_path)), server.fetcher())
+        load_icons(qt_app, loader, ["https://a.test/x", "https://a.test/y", "https://b.test/", "https://c.test/"])
+        assert server.requests == {"/a.test.ico": 1, "/b.test.ico": 1, "/c.test.ico": 1}
+        assert "url:https://a.test" in loader.memory_cache
+        loader.shutdown()
+
+        # A new loader, as after a restart, has only the disk cache to go on.
+        # The site without an icon is not asked again before the retry time.
+        reloaded = IconLoader(IconDiskCache(str(tmp_path)), server.fetcher())
+        load_icons(qt_app, reloaded, ["https://a.test/z", "https://b.test/", "https://c.test/"])
+        assert server.requests == {"/a.test.ico": 1, "/b.test.ico": 1, "/c.test.ico": 1}
+        assert "url:https://b.test" in reloaded.memory_cache
+        reloaded.shutdown()
+    # Each distinct image is stored once, under its hash.
+    assert len(list(tmp_path.glob("*.png"))) == 2
+
+
+def test_icon_memory_cache_evicts_to_its_byte_bound(qt_app, tmp_path):
+    from QuickFavs import IconLoader
+
+    hosts = [f"site{i}.test" for i in range(6)]
+    colors = ["red", "green", "blue", "cyan", "magenta", "yellow"]
+    icons = {host: png(qt_app, color) for host, color in zip(hosts, colors)}
+    icon_bytes = 16 * 16 * 4
+    with FaviconServer(icons) as server:
+        loader = IconLoader(IconDiskCache(str(tmp_path)), server.fetcher())
+        loader.memory_cache = LruCache(3 * icon_bytes)
+        for host in hosts:
+            load_icons(qt_app, loader, [f"https://{host}/"])
+            assert loader.memory_cache.size <= 3 * icon_bytes
+        assert [f"url:https://{host}" in loader.memory_cache for host in hosts] == [False] * 3 + [True] * 3
+        # An evicted icon comes back from the disk, not the site.
+        load_icons(qt_app, loader, [f"https://{hosts[0]}/"])
+        assert f"url:https://{hosts[0]}" in loader.memory_cache
+        assert server.requests[f"/{hosts[0]}.ico"] == 1
+        loader.shutdown()
+
@@ -0,0 +1,26 @@
+import pytest
+
+from favorites_import import export_file, import_file
+
+FAVORITES = [
+    {"label": "Editor", "path": "/usr/bin/true", "type": "App", "tags": ["tools", "a, b", 'say "hi"']},
+    {"label": "Notes", "path": "/etc/hostname", "type": "File", "tags": []},
+    {"label": "Docs", "path": "https://docs.example.com/", "type": "URL", "tags": ["work"]},
+]
+
+
+@pytest.mark.parametrize("fmt", ["html", "json", "csv"])
+def test_export_round_trips_types_and_tags(tmp_path, fmt):
+    path = str(tmp_path / f"favorites.{fmt}")
+    assert export_file(FAVORITES, path) == len(FAVORITES)
+    favorites, stats = import_file(path)
+    assert stats["added"] == len(FAVORITES)
+    assert sorted(favorites, key=lambda item_data: item_data["label"]) == \
+        sorted(FAVORITES, key=lambda item_data: item_data["label"])
+
+
+def test_plain_tag_lists_still_split_on_commas(tmp_path):
+    path = tmp_path / "bookmarks.csv"
+    path.write_text("label,path,tags\nDocs,https://docs.example.com/,\"work, docs\"\n", encoding="utf-8")
+    favorites, _ = import_file(str(path))
+    assert favorites[0]["tags"] == ["work", "docs"]
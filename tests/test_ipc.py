@@ -0,0 +1,136 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from favorites_ipc import InstanceLock, decode_message, encode_message, forward_command_line, send_command
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="drives the Unix socket directly")
+
+
+@pytest.fixture
+def address():
+    # Unix socket paths are limited to about 100 bytes, more than pytest's
+    # tmp_path leaves room for.
+    path = os.path.join(tempfile.gettempdir(), f"quickfavs-test-{uuid.uuid4().hex[:8]}")
+    yield path
+    for leftover in (path, path + ".lock"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+def answer_once(address, result, delay=0.0):
+    # A headless stand-in for a running instance that answers one command.
+    def serve():
+        time.sleep(delay)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(address)
+        listener.listen(1)
+        connection, _ = listener.accept()
+        with connection, connection.makefile('rwb') as stream:
+            request = decode_message(stream.readline())
+            stream.write(encode_message({"ok": True, "result": result(request)}))
+        listener.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_instance_lock_is_held_by_one_process_at_a_time(address):
+    first, second = InstanceLock(address + ".lock"), InstanceLock(address + ".lock")
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+def test_forward_takes_the_lock_when_nobody_is_running(address):
+    lock = InstanceLock(address + ".lock")
+    assert forward_command_line([], address=address, lock=lock) is None
+    assert not InstanceLock(address + ".lock").acquire()
+    lock.release()
+
+
+def test_forward_waits_for_an_instance_that_is_still_starting(address, capsys):
+    starting = InstanceLock(address + ".lock")
+    assert starting.acquire()
+    server = answer_once(address, lambda request: [{"label": request["command"], "type": "URL", "path": "x"}],
+                         delay=0.3)
+    lock = InstanceLock(address + ".lock")
+    assert forward_command_line(["list"], address=address, lock=lock) == 0
+    assert capsys.readouterr().out == "list\tURL\tx\n"
+    assert lock.file is None
+    server.join()
+    starting.release()
+
+
+def run_client(app, call):
+    # Sends from a worker thread while this thread runs the server's events.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(call)
+        deadline = time.monotonic() + 5
+        while not future.done() and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.005)
+        return future.result(timeout=0)
+
+
+def test_server_answers_a_headless_client(qt_app, address):
+    from QuickFavs import IpcServer
+
+    def handler(request, reply):
+        reply({"ok": True, "result": {"command": request["command"], "args": request["args"]}})
+
+    server = IpcServer(handler)
+    assert server.listen(address)
+    try:
+        response = run_client(qt_app, lambda: send_command("search", ["docs"], address=address))
+        assert response == {"ok": True, "result": {"command": "search", "args": ["docs"]}}
+        bad = run_client(qt_app, lambda: _send_raw(address, b"[1]\n"))
+        assert not bad["ok"]
+    finally:
+        server.close()
+
+
+def _send_raw(address, line):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client, client.makefile('rwb') as stream:
+        client.connect(address)
+        stream.write(line)
+        stream.flush()
+        return decode_message(stream.readline())
+
+
+def test_server_replaces_a_stale_socket(qt_app, address):
+    from QuickFavs import IpcServer
+
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(address)
+    stale.close()
+    server = IpcServer(lambda request, reply: reply({"ok": True, "result": None}))
+    assert server.listen(address)
+    assert run_client(qt_app, lambda: send_command("show", address=address)) == {"ok": True, "result": None}
+    server.close()
+
+
+def test_server_leaves_a_live_instance_alone(qt_app, address):
+    from QuickFavs import IpcServer
+
+    live = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    live.bind(address)
+    live.listen(1)
+    try:
+        server = IpcServer(lambda request, reply: None)
+        assert not server.listen(address)
+        assert os.path.exists(address)
+        connection, _ = live.accept()
+        connection.close()
+    finally:
+        live.close()
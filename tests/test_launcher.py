@@ -0,0 +1,84 @@
+import threading
+from concurrent.futures import CancelledError, wait
+
+import pytest
+
+from favorites_launcher import Launcher
+
+
+class FakeOpener:
+    # Records what it was asked to open; paths in hang block until release()
+    # and paths in fail raise FileNotFoundError.
+
+    def __init__(self, hang=(), fail=()):
+        self.opened = []
+        self.hang = set(hang)
+        self.fail = set(fail)
+        self.released = threading.Event()
+
+    def __call__(self, item_data):
+        if item_data["path"] in self.hang:
+            self.released.wait(5)
+        if item_data["path"] in self.fail:
+            raise FileNotFoundError(item_data["path"])
+        self.opened.append(item_data["path"])
+
+    def release(self):
+        self.released.set()
+
+
+def favorite(path):
+    return {"label": path, "path": path, "type": "URL"}
+
+
+def test_results_are_reported_once_per_launch():
+    opener = FakeOpener(fail={"b"})
+    results = []
+    launcher = Launcher(opener, on_result=lambda item_data, error, future: results.append((item_data["path"], error, future)))
+    futures = launcher.submit_many([favorite("a"), favorite("b")])
+    wait(futures, timeout=5)
+    assert futures[0].result() == favorite("a")
+    with pytest.raises(FileNotFoundError):
+        futures[1].result()
+    assert sorted((path, type(error), future in futures) for path, error, future in results) == [
+        ("a", type(None), True), ("b", FileNotFoundError, True)]
+    launcher.shutdown()
+
+
+def test_launches_queued_behind_hung_openers_time_out():
+    opener = FakeOpener(hang={"hung"})
+    launcher = Launcher(opener, max_workers=1, timeout=0.2)
+    hung = launcher.submit(favorite("hung"))
+    queued = launcher.submit(favorite("queued"))
+    wait([hung, queued], timeout=2)
+    assert isinstance(queued.exception(timeout=0), TimeoutError)
+    assert isinstance(hung.exception(timeout=0), TimeoutError)
+    opener.release()
+    launcher.shutdown()
+    # Given up on before a worker was free, so never opened late.
+    assert "queued" not in opener.opened
+
+
+def test_shutdown_settles_outstanding_launches():
+    opener = FakeOpener(hang={"hung", "queued"})
+    results = []
+    launcher = Launcher(opener, max_workers=1, timeout=60, on_result=lambda *result: results.append(result))
+    futures = launcher.submit_many([favorite("hung"), favorite("queued")])
+    launcher.shutdown()
+    for future in futures:
+        with pytest.raises(CancelledError):
+            future.result(timeout=1)
+    assert len(results) == 2
+    opener.release()
+
+
+def test_the_same_favorite_launched_twice_gets_two_results():
+    opener = FakeOpener()
+    results = []
+    launcher = Launcher(opener, on_result=lambda item_data, error, future: results.append(future))
+    item_data = favorite("a")
+    first, second = launcher.submit(item_data), launcher.submit(item_data)
+    wait([first, second], timeout=5)
+    assert set(results) == {first, second}
+    assert opener.opened == ["a", "a"]
+    launcher.shutdown()
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+from favorites_links import (
+    LINK_BROKEN, LINK_OK, LINK_UNREACHABLE, HttpLinkChecker, LinkCache, LinkChecker, LinkStatus
+)
+from standin import StandInServer
+
+
+class FakeHttp:
+    # Answers each URL with the state given for it.
+
+    def __init__(self, states):
+        self.states = states
+
+    async def check_many(self, urls, on_result):
+        for url in urls:
+            on_result(url, LinkStatus(self.states[url], reason=self.states[url]))
+
+    def close(self):
+        pass
+
+
+def run_check(tmp_path, states):
+    cache = LinkCache(str(tmp_path / "link_cache.json"))
+    checker = LinkChecker(cache, FakeHttp(states))
+    reported, done = {}, threading.Event()
+    checker.check(list(states), reported.__setitem__, lambda stats: done.set(), full_scan=True)
+    assert done.wait(5)
+    checker.shutdown()
+    return cache, reported
+
+
+def test_unreachable_links_are_not_recorded_while_offline(tmp_path):
+    urls = [f"https://site{i}.example/" for i in range(3)]
+    cache, reported = run_check(tmp_path, dict.fromkeys(urls, LINK_UNREACHABLE))
+    assert reported == {}
+    assert all(cache.get(url) is None for url in urls)
+
+
+def test_unreachable_links_are_recorded_once_a_site_answers(tmp_path):
+    states = {"https://a.example/": LINK_UNREACHABLE, "https://b.example/": LINK_OK,
+              "https://c.example/": LINK_UNREACHABLE, "https://d.example/": LINK_BROKEN}
+    cache, reported = run_check(tmp_path, states)
+    assert {url: status.state for url, status in reported.items()} == states
+    assert all(cache.get(url).state == state for url, state in states.items())
+
+
+def check_links(urls, **options):
+    # The HttpLinkChecker's statuses by URL.
+    results = {}
+
+    async def run():
+        checker = HttpLinkChecker(**options)
+        try:
+            await checker.check_many(urls, results.__setitem__)
+        finally:
+            checker.close()
+    asyncio.run(run())
+    return results
+
+
+def test_head_refused_falls_back_to_get():
+    with StandInServer() as server:
+        status = check_links([server.url("/no-head/1")])[server.url("/no-head/1")]
+    assert (status.state, status.code) == (LINK_OK, 200)
+    assert server.requests == [("HEAD", "/no-head/1"), ("GET", "/no-head/1")]
+
+
+def test_redirect_chains_are_followed_to_the_end():
+    with StandInServer() as server:
+        chain = server.url("/redirect/redirect/redirect/ok/1")
+        gone = server.url("/redirect/gone-after-redirect/2")
+        endless = server.url("/redirect" * 7 + "/ok/3")
+        results = check_links([chain, gone, endless], max_redirects=5)
+    assert (results[chain].state, results[chain].code) == (LINK_OK, 200)
+    assert [path for method, path in server.requests if path.endswith("/1")] == [
+        "/redirect/redirect/redirect/ok/1", "/redirect/redirect/ok/1", "/redirect/ok/1", "/ok/1"]
+    assert (results[gone].state, results[gone].code) == (LINK_BROKEN, 404)
+    assert (results[endless].state, results[endless].reason) == (LINK_UNREACHABLE, "Too many redirects")
+
+
+def test_server_errors_are_broken_links():
+    with StandInServer(fail_rate=1.0) as server:
+        status = check_links([server.url("/ok/1")])[server.url("/ok/1")]
+    assert (status.state, status.code) == (LINK_BROKEN, 503)
+
+
+def test_a_slow_server_times_out():
+    with StandInServer(latency=0.5) as server:
+        status = check_links([server.url("/ok/1")], timeout=0.1)[server.url("/ok/1")]
+    assert (status.state, status.reason) == (LINK_UNREACHABLE, "Timed out")
+
+
+def test_connections_per_host_are_capped_and_kept_alive():
+    with StandInServer(latency=0.02) as first, StandInServer(latency=0.02) as second:
+        urls = [server.url(f"/ok/{i}") for i in range(30) for server in (first, second)]
+        results = check_links(urls, concurrency=64, host_connections=3)
+    assert all(status.state == LINK_OK for status in results.values()) and len(results) == 60
+    for server in (first, second):
+        assert server.most_open_connections <= 3
+        # Every request after the first three reused a connection.
+        assert server.connections == 3 and len(server.requests) == 30
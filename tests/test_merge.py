@@ -0,0 +1,30 @@
+from favorites_merge import diff_favorites, merge_order, plan_merge
+from favorites_records import FavoriteRecord, FavoritesStore
+
+
+def records(labels):
+    # The same letter in either case is the same favorite.
+    return [FavoriteRecord(ord(label.lower()), label, f"https://{label.lower()}.test", "URL") for label in labels]
+
+
+def test_reorder_is_detected_and_followed():
+    diff = diff_favorites(records("abcd"), records("dBca"))
+    assert diff.reordered and diff.order == [ord(label) for label in "dbca"]
+    ours = FavoritesStore()
+    ours.extend(records("abcd"))
+    plan = plan_merge(diff, ours)
+    assert list(plan.updated) == [ord("b")]
+    assert merge_order(plan.order, [record.id for record in ours]) == diff.order
+
+
+def test_favorites_only_held_here_keep_their_neighbour():
+    # x and y were added here and are not in the file yet.
+    ours = [ord(label) for label in "xabycd"]
+    theirs = [ord(label) for label in "cadb"]
+    assert merge_order(theirs, ours) == [ord(label) for label in "xcadby"]
+    assert merge_order(ours, ours) is None
+
+
+def test_unchanged_order_needs_no_reorder():
+    diff = diff_favorites(records("abc"), records("aBcd"))
+    assert not diff.reordered and diff.order is None
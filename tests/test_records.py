@@ -0,0 +1,76 @@
+import random
+
+from favorites_records import FavoriteRecord, FavoritesStore
+
+
+def record(record_id):
+    return FavoriteRecord(record_id, f"favorite {record_id}", f"https://{record_id}.test", "URL")
+
+
+def test_rows_follow_removals_and_appends():
+    rng = random.Random(16)
+    store = FavoritesStore()
+    expected = []
+    next_id = 1
+    for _ in range(2000):
+        if not expected or rng.random() < 0.45:
+            records = [record(next_id + i) for i in range(rng.randint(1, 4))]
+            next_id += len(records)
+            store.extend(records)
+            expected.extend(r.id for r in records)
+        else:
+            record_id = rng.choice(expected)
+            assert store.remove(record_id) == expected.index(record_id)
+            expected.remove(record_id)
+        assert len(store) == len(expected)
+    assert [r.id for r in store] == expected
+    assert [store[row].id for row in range(len(store))] == expected
+    assert [r.id for r in store.records_at(range(0, len(store), 3))] == expected[::3]
+    assert all(store.row_of(record_id) == row for row, record_id in enumerate(expected))
+    assert store.row_of(next_id) == -1
+    assert store[-1].id == expected[-1]
+
+
+def test_replace_keeps_the_row():
+    store = FavoritesStore()
+    store.extend([record(1), record(2), record(3)])
+    store.remove(1)
+    store.replace(FavoriteRecord(3, "renamed", "p", "File"))
+    assert store.row_of(3) == 1
+    assert store[1]["label"] == "renamed"
+
+
+def test_remove_many_reports_rows_from_before_the_removal():
+    store = FavoritesStore()
+    store.extend([record(i) for i in range(1, 9)])
+    store.remove(2)
+    assert store.remove_many([8, 3, 5]) == [6, 1, 3]
+    assert [r.id for r in store] == [1, 4, 6, 7]
+    store.reorder([7, 1, 6, 4])
+    assert [store.row_of(record_id) for record_id in (1, 4, 6, 7)] == [1, 3, 2, 0]
+
+
+def test_rows_with_paths_follow_every_change():
+    rng = random.Random(13)
+    store = FavoritesStore()
+    paths = [f"/p{i}" for i in range(12)]
+    store.extend([FavoriteRecord(i, "f", rng.choice(paths), "File") for i in range(1, 41)])
+    next_id = 41
+    for step in range(600):
+        if step == 5:
+            store.rows_with_paths([])
+        ids = [r.id for r in store]
+        action = rng.random()
+        if action < 0.3 or len(ids) < 5:
+            store.extend([FavoriteRecord(next_id, "f", rng.choice(paths), "File")])
+            next_id += 1
+        elif action < 0.55:
+            store.replace(FavoriteRecord(rng.choice(ids), "g", rng.choice(paths), "File"))
+        elif action < 0.85:
+            store.remove_many(rng.sample(ids, rng.randint(1, 3)))
+        else:
+            rng.shuffle(ids)
+            store.reorder(ids)
+        wanted = set(rng.sample(paths, 3))
+        assert sorted(store.rows_with_paths(wanted), key=lambda found: found[0]) == \
+            [(row, r) for row, r in enumerate(store) if r.path in wanted]
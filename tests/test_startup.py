@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("PyQt6")
+
+from favorites_ipc import lock_path, server_address
+
+QUICKFAVS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "QuickFavs.py")
+# Generous next to the couple of hundred milliseconds a start takes, so only
+# a real regression trips it.
+STARTUP_BUDGET_MS = 2000
+
+
+@pytest.fixture
+def favorites_dir(tmp_path):
+    favorites = [{"label": f"favorite {i}", "path": f"https://site{i}.test", "type": "URL", "tags": ["web"]}
+                 for i in range(2000)]
+    (tmp_path / "favorites.json").write_text(json.dumps(favorites), encoding="utf-8")
+    (tmp_path / "settings.json").write_text(json.dumps({"fetch_favicons": False, "check_links": False}),
+                                            encoding="utf-8")
+    yield tmp_path
+    for leftover in (lock_path(str(tmp_path)), server_address(str(tmp_path))):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+def start(directory, budget_ms):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    return subprocess.run([sys.executable, QUICKFAVS, "--startup-budget-ms", str(budget_ms)],
+                          cwd=directory, env=env, capture_output=True, text=True, timeout=60)
+
+
+def test_first_paint_is_within_budget(favorites_dir):
+    result = start(favorites_dir, STARTUP_BUDGET_MS)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "within the" in result.stdout
+
+
+def test_a_missed_budget_fails(favorites_dir):
+    result = start(favorites_dir, 0.01)
+    assert result.returncode == 1
+    assert "over the" in result.stdout
@@ -0,0 +1,258 @@
+import errno
+import json
+import shutil
+
+import favorites_storage
+from favorites_records import FavoriteRecord
+from favorites_storage import FavoritesStorage, JournalStorage, SqliteStorage, WriteBehindQueue, apply_change, \
+    keyed_favorites
+
+
+class FailingStorage(FavoritesStorage):
+    # Holds the favorites in a list and fails the writes it is told to;
+    # on_write runs inside each write, where the GUI thread could queue more.
+
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.fail_save_all = 0
+        self.fail_apply_changes = 0
+        self.on_write = None
+
+    def save_all(self, favorites):
+        self._write()
+        if self.fail_save_all:
+            self.fail_save_all -= 1
+            raise OSError("disk full")
+        self.items = list(favorites)
+
+    def apply_changes(self, changes):
+        self._write()
+        if self.fail_apply_changes:
+            self.fail_apply_changes -= 1
+            raise OSError("disk full")
+        favorites = keyed_favorites(self.items)
+        for change in changes:
+            apply_change(favorites, change)
+        self.items = list(favorites.values())
+
+    def _write(self):
+        on_write, self.on_write = self.on_write, None
+        if on_write is not None:
+            on_write()
+
+
+def fav(label):
+    # The same letter in either case is the same favorite, before and after
+    # an edit.
+    return {"id": ord(label.lower()), "label": label, "path": f"https://{label}.test", "type": "URL", "tags": []}
+
+
+def favs(labels):
+    return [fav(label) for label in labels]
+
+
+def records(labels):
+    return [FavoriteRecord.from_dict(item, item["id"]) for item in favs(labels)]
+
+
+def labels(items):
+    return "".join(item["label"] for item in items)
+
+
+def make_queue(storage):
+    # A quiet period long enough that only flush() writes.
+    return WriteBehindQueue(storage, quiet_period=60)
+
+
+def test_failed_snapshot_is_retried_with_the_changes_queued_after_it():
+    storage = FailingStorage()
+    queue = make_queue(storage)
+    queue.submit_snapshot(favs("ab"))
+    queue.submit([("add", fav("c"))])
+    storage.fail_save_all = 1
+    queue.flush(wait=True)
+    assert storage.items == []
+    assert queue.pending_count() == 2
+    assert queue.last_error == "disk full"
+
+    queue.flush(wait=True)
+    assert labels(storage.items) == "abc"
+    assert not queue.has_pending()
+    assert queue.last_error is None
+    queue.close()
+
+
+def test_failed_changes_go_before_the_ones_queued_meanwhile():
+    storage = FailingStorage(favs("a"))
+    queue = make_queue(storage)
+    queue.submit([("add", fav("b"))])
+    storage.fail_apply_changes = 1
+    storage.on_write = lambda: queue.submit([("update", fav("b")["id"], fav("B"))])
+    queue.flush(wait=True)
+    assert labels(storage.items) == "a"
+
+    queue.flush(wait=True)
+    assert labels(storage.items) == "aB"
+    queue.close()
+
+
+def test_newer_snapshot_replaces_a_failed_snapshot():
+    storage = FailingStorage()
+    queue = make_queue(storage)
+    queue.submit_snapshot(favs("ab"))
+    queue.submit([("add", fav("c"))])
+    storage.fail_save_all = 1
+    storage.on_write = lambda: queue.submit_snapshot(favs("x"))
+    queue.flush(wait=True)
+    assert queue.pending_count() == 1
+
+    queue.flush(wait=True)
+    assert labels(storage.items) == "x"
+    queue.close()
+
+
+def test_changes_a_newer_snapshot_holds_are_not_applied_twice():
+    storage = FailingStorage(favs("a"))
+    queue = make_queue(storage)
+    queue.submit([("add", fav("b"))])
+    storage.fail_apply_changes = 1
+    storage.on_write = lambda: queue.submit_snapshot(favs("ab"))
+    queue.flush(wait=True)
+
+    queue.flush(wait=True)
+    assert labels(storage.items) == "ab"
+    assert not queue.has_pending()
+    queue.close()
+
+
+def test_journal_changes_name_favorites_by_id(tmp_path):
+    path = str(tmp_path / "favorites.json")
+    storage = JournalStorage(path)
+    storage.load()
+    storage.save_all(favs("abc"))
+    storage.apply_changes([("delete", fav("a")["id"]), ("update", fav("c")["id"], fav("C")), ("add", fav("d"))])
+    storage.close()
+
+    reloaded = JournalStorage(path)
+    assert labels(reloaded.load()) == "bCd"
+    reloaded.close()
+
+
+def test_journals_with_rows_still_replay(tmp_path):
+    path = tmp_path / "favorites.json"
+    path.write_text(json.dumps(favs("abc")), encoding="utf-8")
+    records = [{"op": "delete", "index": 0}, {"op": "update", "index": 1, "item": fav("C")}]
+    (tmp_path / "favorites.json.journal").write_text("".join(json.dumps(record) + "\n" for record in records),
+                                                     encoding="utf-8")
+    storage = JournalStorage(str(path))
+    assert labels(storage.load()) == "bC"
+    storage.close()
+
+
+class ShortWrite:
+    # Stands in for the journal file: writes half of what it is given, then
+    # fails as a full disk would.
+
+    def __init__(self, journal):
+        self.journal = journal
+
+    def write(self, data):
+        self.journal.write(data[:len(data) // 2])
+        self.journal.flush()
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    def __getattr__(self, name):
+        return getattr(self.journal, name)
+
+
+def test_retried_and_later_changes_survive_a_torn_journal_write(tmp_path):
+    path = str(tmp_path / "favorites.json")
+    storage = JournalStorage(path)
+    storage.load()
+    queue = make_queue(storage)
+    queue.submit([("add", fav("a"))])
+    queue.flush(wait=True)
+    storage._journal = ShortWrite(storage._journal)
+    queue.submit([("add", fav("b"))])
+    queue.flush(wait=True)
+    assert queue.last_error is not None
+    queue.flush(wait=True)
+    queue.submit([("add", fav("c"))])
+    queue.flush(wait=True)
+    assert queue.last_error is None
+    # A crash: the journal is not compacted into favorites.json.
+    storage._journal.close()
+
+    reloaded = JournalStorage(path)
+    assert labels(reloaded.load()) == "abc"
+    reloaded.close()
+
+
+def test_leftover_journal_replays_over_a_file_changed_since(tmp_path):
+    path = tmp_path / "favorites.json"
+    storage = JournalStorage(str(path))
+    storage.load()
+    storage.save_all(favs("abcd"))
+    storage.apply_changes([("update", fav("b")["id"], fav("B")), ("delete", fav("c")["id"]), ("add", fav("e"))])
+    # A crash: the journal stays, and a sync client then reorders the file,
+    # drops a and adds f at the top.
+    storage._journal.close()
+    path.write_text(json.dumps(favs("fdcb")), encoding="utf-8")
+
+    reloaded = JournalStorage(str(path))
+    assert labels(reloaded.load()) == "fdBe"
+    reloaded.close()
+
+
+def test_journal_is_not_compacted_over_an_external_change_until_the_merge_is_saved(tmp_path, monkeypatch):
+    monkeypatch.setattr(favorites_storage, "JOURNAL_COMPACT_RECORDS", 2)
+    path = tmp_path / "favorites.json"
+    storage = JournalStorage(str(path))
+    storage.load()
+    storage.save_all(records("abc"))
+    path.write_text(json.dumps(favs("abcx")), encoding="utf-8")
+    assert storage.read_external_change() is not None
+    storage.apply_changes([("add", fav("d")), ("add", fav("e"))])
+    storage.wait_for_compaction()
+    assert labels(json.loads(path.read_text(encoding="utf-8"))) == "abcx"
+
+    # A crash before the merge is saved loses neither side's favorites.
+    crashed = tmp_path / "crashed"
+    crashed.mkdir()
+    for name in ("favorites.json", "favorites.json.journal"):
+        shutil.copy(tmp_path / name, crashed / name)
+    reloaded = JournalStorage(str(crashed / "favorites.json"))
+    assert labels(reloaded.load()) == "abcxde"
+    reloaded.close()
+
+    # Once it is saved, compaction goes on as before.
+    storage.save_all(records("abcxde"))
+    storage.apply_changes([("delete", fav("a")["id"]), ("delete", fav("b")["id"])])
+    storage.wait_for_compaction()
+    assert labels(json.loads(path.read_text(encoding="utf-8"))) == "cxde"
+    storage.close()
+
+
+def test_rows_past_the_end_of_a_changed_file_are_skipped(tmp_path):
+    path = tmp_path / "favorites.json"
+    path.write_text(json.dumps(favs("a")), encoding="utf-8")
+    records = [{"op": "delete", "index": 2}, {"op": "update", "index": 0, "item": fav("A")}]
+    (tmp_path / "favorites.json.journal").write_text("".join(json.dumps(record) + "\n" for record in records),
+                                                     encoding="utf-8")
+    storage = JournalStorage(str(path))
+    assert labels(storage.load()) == "A"
+    storage.close()
+
+
+def test_sqlite_changes_and_search_after_deletes(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "favorites.db"))
+    storage.load()
+    storage.save_all(favs("abcdef"))
+    storage.apply_changes([("delete", fav("b")["id"]), ("delete", fav("d")["id"]), ("update", fav("e")["id"], fav("E"))])
+    # Rows in list order: a c E f.
+    assert storage.search("e url") == [2]
+    assert storage.search("url") == [0, 1, 2, 3]
+    storage.apply_changes([("delete", fav("a")["id"]), ("delete", fav("c")["id"])])
+    assert storage.search("f url") == [1]
+    assert labels(storage.load()) == "Ef"
+    storage.close()